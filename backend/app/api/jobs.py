@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal, get_db
+from app.models.domain import ProcessingJob
+from app.schemas import JobResponse
+from app.services.jobs import TERMINAL_JOB_STATUSES
+
+router = APIRouter()
+
+JOB_EVENT_POLL_SECONDS = 0.5
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(ProcessingJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+async def _load_job_snapshot(job_id: str) -> JobResponse | None:
+    async with AsyncSessionLocal() as db:
+        job = await db.get(ProcessingJob, job_id)
+        return JobResponse.model_validate(job) if job else None
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events stream that emits the job on every change until it finishes."""
+    if await _load_job_snapshot(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        last_payload = None
+        while True:
+            snapshot = await _load_job_snapshot(job_id)
+            if snapshot is None:
+                return
+            payload = json.dumps(snapshot.model_dump(mode="json"))
+            if payload != last_payload:
+                yield f"event: job\ndata: {payload}\n\n"
+                last_payload = payload
+            if snapshot.status in TERMINAL_JOB_STATUSES:
+                return
+            await asyncio.sleep(JOB_EVENT_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -1,38 +1,88 @@
-from fastapi import APIRouter, HTTPException
+import hmac
+from typing import Literal
+
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import Depends
-from app.services.vton_service import generate_vton_image
-from app.database import get_db
-from app.models.domain import User, ClothingItem, Outfit
-from app.schemas import TryOnRequest, TryOnResponse
+from app.services.vton_service import VtonUnavailableError, parse_prediction
 from app.core.config import settings
+from app.database import AsyncSessionLocal, get_async_db, get_db
+from app.models.domain import User, ClothingItem, Outfit, ProcessingJob
+from app.schemas import (
+    JobResponse,
+    TryOnAcceptedResponse,
+    TryOnPrefetchRequest,
+    TryOnPrefetchResponse,
+    TryOnRequest,
+    TryOnResponse,
+)
+from app.services.jobs import TERMINAL_JOB_STATUSES, create_job
+from app.services.tryon_cache import CachedTryOn, stored_tryon, tryon_cache, tryon_cache_key
+from app.services.tryon_pipeline import (
+    OUTFIT_SLOTS,
+    GarmentLayer,
+    build_layers,
+    layer_identity,
+    render_outfit,
+    rendered_layers,
+)
+from app.services.tryon_jobs import complete_tryon_prediction, run_tryon_job, webhook_token
+from app.services.tryon_prefetch import PrefetchOutcome, carousel_neighbours, tryon_prefetcher
+from app.services.storage import storage
 
 router = APIRouter()
 
-@router.post("/tryon/", response_model=TryOnResponse)
-async def create_tryon(request: TryOnRequest, db: Session = Depends(get_db)):
-    if not request.top_id and not request.bottom_id and not request.shoes_id and not request.accessory_id:
-        raise HTTPException(status_code=400, detail="Must provide at least one garment to try on.")
+TRYON_GENERATED_MESSAGE = "Try-on generated successfully"
+TRYON_CACHED_MESSAGE = "Try-on served from cache"
+DEFAULT_AVATAR_URL = "https://via.placeholder.com/400x600.png?text=Avatar"
+# Cache identity of the placeholder, which never changes.
+DEFAULT_AVATAR_HASH = "default-avatar"
 
-    user = db.get(User, request.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found.")
 
-    garment_id = request.top_id or request.bottom_id or request.shoes_id or request.accessory_id
-    garment = db.get(ClothingItem, garment_id) if garment_id else None
-    if not garment or garment.owner_id != request.user_id:
-        raise HTTPException(status_code=404, detail="Selected clothing item not found for user.")
+def _avatar(user: User) -> tuple[str, str | None]:
+    """
+    The avatar URL to send to the provider and the content hash to cache its
+    try-ons by; None for an external avatar URL, whose try-ons aren't cached.
+    """
+    if not user.avatar_image_url:
+        return DEFAULT_AVATAR_URL, DEFAULT_AVATAR_HASH
+    return storage.absolute_url(user.avatar_image_url), user.avatar_content_hash
 
-    avatar_url = user.avatar_image_url or "https://via.placeholder.com/400x600.png?text=Avatar"
-    garment_url = f"{settings.STATIC_BASE_URL}{garment.image_url}"
 
-    try:
-        result_url = await generate_vton_image(
-            user_avatar_url=avatar_url,
-            garment_url=garment_url,
-            category="upper_body"
+def _requested_slots(request: TryOnRequest) -> list[tuple[str, int]]:
+    slots = [(slot, getattr(request, f"{slot}_id")) for slot in OUTFIT_SLOTS]
+    return [(slot, item_id) for slot, item_id in slots if item_id]
+
+
+def _load_layers(db: Session, request: TryOnRequest, slots: list[tuple[str, int]]) -> list[GarmentLayer]:
+    """Validate every requested garment with a single query and turn them into outfit layers."""
+    items = {
+        item.id: item
+        for item in db.query(ClothingItem).filter(
+            ClothingItem.id.in_([item_id for _, item_id in slots]),
+            ClothingItem.owner_id == request.user_id,
+            ClothingItem.deleted_at.is_(None),
         )
+    }
+    for _, item_id in slots:
+        item = items.get(item_id)
+        if not item:
+            raise HTTPException(status_code=404, detail="Selected clothing item not found for user.")
+        if item.status != "ready":
+            raise HTTPException(status_code=409, detail=f"Clothing item {item_id} is not ready for try-on yet.")
+
+    layers = build_layers(slots, items)
+    if not rendered_layers(layers):
+        raise HTTPException(status_code=400, detail="None of the selected garments can be rendered by the try-on model.")
+    return layers
+
 
+async def _save_outfit(request: TryOnRequest, cache_key: str, result_url: str) -> CachedTryOn:
+    # Own session: the generation is shared by every coalesced request, not just this one.
+    async with AsyncSessionLocal() as db:
         outfit = Outfit(
             owner_id=request.user_id,
             top_id=request.top_id,
@@ -40,15 +90,213 @@ async def create_tryon(request: TryOnRequest, db: Session = Depends(get_db)):
             shoes_id=request.shoes_id,
             accessory_id=request.accessory_id,
             generated_image_url=result_url,
+            cache_key=cache_key,
         )
         db.add(outfit)
-        db.commit()
-        db.refresh(outfit)
+        await db.commit()
+        return CachedTryOn(outfit.id, result_url)
+
+
+@router.post(
+    "/tryon/",
+    response_model=TryOnResponse,
+    responses={202: {"model": TryOnAcceptedResponse}},
+)
+async def create_tryon(
+    request: TryOnRequest,
+    background_tasks: BackgroundTasks,
+    mode: Literal["sync", "async"] = Query(default="sync"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    slots = _requested_slots(request)
+    if not slots:
+        raise HTTPException(status_code=400, detail="Must provide at least one garment to try on.")
+
+    user = await db.get(User, request.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    layers = await db.run_sync(_load_layers, request, slots)
+    avatar_url, avatar_hash = _avatar(user)
+    cache_key = (
+        tryon_cache_key(request.user_id, avatar_hash, layer_identity(layers), settings.VTON_MODEL_VERSION)
+        if avatar_hash
+        else None
+    )
+
+    # The outfits table backs the in-process cache (e.g. after a restart); read it only on a miss.
+    stored = None
+    if cache_key and tryon_cache.get(cache_key) is None:
+        stored = await db.run_sync(stored_tryon, request.user_id, cache_key, tryon_cache.ttl_seconds)
+
+    if mode == "async":
+        cached = tryon_cache.lookup(cache_key, lambda: stored) if cache_key else None
+        if cached:
+            return TryOnResponse(
+                outfit_id=cached.outfit_id,
+                generated_image_url=cached.generated_image_url,
+                message=TRYON_CACHED_MESSAGE,
+            )
+        return await db.run_sync(
+            _accept_tryon, background_tasks, request, cache_key, avatar_url, avatar_hash, layers
+        )
+
+    async def _generate() -> CachedTryOn:
+        result_url = await render_outfit(request.user_id, avatar_url, avatar_hash, layers)
+        return await _save_outfit(request, cache_key, result_url)
+
+    try:
+        if cache_key:
+            result, from_cache = await tryon_cache.get_or_generate(cache_key, _generate, lookup=lambda: stored)
+        else:
+            result, from_cache = await _generate(), False
 
         return TryOnResponse(
-            outfit_id=outfit.id,
-            generated_image_url=result_url,
-            message="Try-on generated successfully",
+            outfit_id=result.outfit_id,
+            generated_image_url=result.generated_image_url,
+            message=TRYON_CACHED_MESSAGE if from_cache else TRYON_GENERATED_MESSAGE,
+        )
+    except VtonUnavailableError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))}
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"VTON Generation failed: {str(e)}")
+
+
+def _accept_tryon(
+    db: Session,
+    background_tasks: BackgroundTasks,
+    request: TryOnRequest,
+    cache_key: str | None,
+    avatar_url: str,
+    avatar_hash: str | None,
+    layers: list[GarmentLayer],
+) -> JSONResponse:
+    """Insert a pending outfit and its job, and generate the image in the background."""
+    pending = cache_key and (
+        db.query(ProcessingJob, Outfit)
+        .join(Outfit, ProcessingJob.outfit_id == Outfit.id)
+        .filter(Outfit.owner_id == request.user_id, Outfit.cache_key == cache_key, Outfit.status == "pending")
+        .order_by(Outfit.id.desc())
+        .first()
+    )
+    if pending:
+        # The same try-on is already being generated; hand out that job instead of a duplicate.
+        job, outfit = pending
+        return _accepted_response(job, outfit)
+
+    outfit = Outfit(
+        owner_id=request.user_id,
+        top_id=request.top_id,
+        bottom_id=request.bottom_id,
+        shoes_id=request.shoes_id,
+        accessory_id=request.accessory_id,
+        status="pending",
+        cache_key=cache_key,
+    )
+    db.add(outfit)
+    db.flush()
+    job = create_job(db, kind="tryon", owner_id=request.user_id, outfit_id=outfit.id)
+    db.commit()
+    db.refresh(job)
+
+    background_tasks.add_task(run_tryon_job, job.id, outfit.id, request.user_id, avatar_url, avatar_hash, layers)
+    return _accepted_response(job, outfit)
+
+
+def _accepted_response(job: ProcessingJob, outfit: Outfit) -> JSONResponse:
+    payload = TryOnAcceptedResponse(
+        job=JobResponse.model_validate(job),
+        outfit_id=outfit.id,
+        status=outfit.status,
+        status_url=f"/api/jobs/{job.id}",
+    )
+    return JSONResponse(status_code=202, content=jsonable_encoder(payload))
+
+
+def _prefetch_outfits(db: Session, request: TryOnPrefetchRequest) -> list[list[GarmentLayer]]:
+    """Layers of the outfits one carousel swipe away whose garments are all ready, in one query."""
+    selection = dict(_requested_slots(request))
+    carousels = {slot: items for slot, items in request.carousels.items() if slot in OUTFIT_SLOTS}
+    candidates = carousel_neighbours(selection, carousels, request.radius)
+    item_ids = {item_id for candidate in candidates for item_id in candidate.values()}
+    items = {
+        item.id: item
+        for item in db.query(ClothingItem).filter(
+            ClothingItem.id.in_(item_ids),
+            ClothingItem.owner_id == request.user_id,
+            ClothingItem.deleted_at.is_(None),
+            ClothingItem.status == "ready",
+        )
+    }
+
+    # Speculative work skips garments that are missing or still processing instead of failing.
+    return [
+        build_layers(list(candidate.items()), items)
+        for candidate in candidates
+        if all(item_id in items for item_id in candidate.values())
+    ]
+
+
+# The prefetch routes are async so the prefetcher's queues and wakeup event are only
+# touched from the event loop its workers run on.
+@router.post("/tryon/prefetch", response_model=TryOnPrefetchResponse)
+async def prefetch_tryons(request: TryOnPrefetchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Queue low-priority try-ons for the outfits one carousel swipe away from
+    the current selection, replacing the user's previously queued prefetches.
+    """
+    user = await db.get(User, request.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    avatar_url, avatar_hash = _avatar(user)
+    if not avatar_hash:
+        # Nothing would be cached for an external avatar, so there is nothing to prefetch.
+        return TryOnPrefetchResponse(**PrefetchOutcome(0, 0, 0, 0)._asdict())
+    outfits = await db.run_sync(_prefetch_outfits, request)
+    outcome = tryon_prefetcher.schedule(request.user_id, avatar_url, avatar_hash, outfits)
+    return TryOnPrefetchResponse(**outcome._asdict())
+
+
+@router.delete("/tryon/prefetch/{user_id}")
+async def cancel_prefetched_tryons(user_id: int):
+    return {"cancelled": tryon_prefetcher.cancel(user_id)}
+
+
+@router.get("/tryon/{outfit_id}", response_model=TryOnResponse)
+def get_tryon(outfit_id: int, db: Session = Depends(get_db)):
+    outfit = db.get(Outfit, outfit_id)
+    if not outfit:
+        raise HTTPException(status_code=404, detail="Outfit not found.")
+    messages = {
+        "pending": "Try-on is being generated",
+        "ready": TRYON_GENERATED_MESSAGE,
+        "failed": "Try-on generation failed",
+    }
+    return TryOnResponse(
+        outfit_id=outfit.id,
+        generated_image_url=outfit.generated_image_url,
+        status=outfit.status,
+        message=messages.get(outfit.status, outfit.status),
+    )
+
+
+@router.post("/tryon/webhook/{job_id}")
+def receive_tryon_webhook(job_id: str, payload: dict, token: str = Query(...), db: Session = Depends(get_db)):
+    """Completion callback from the VTON provider for a try-on submitted with a webhook."""
+    if not settings.VTON_WEBHOOK_SECRET or not hmac.compare_digest(token, webhook_token(job_id)):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    job = db.get(ProcessingJob, job_id)
+    if not job or job.kind != "tryon":
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job.status in TERMINAL_JOB_STATUSES:
+        # Providers retry deliveries; later copies are no-ops.
+        return {"status": job.status}
+
+    outfit_id = job.outfit_id
+    # Release this read transaction; completion writes through its own session.
+    db.close()
+    complete_tryon_prediction(job_id, outfit_id, parse_prediction(payload))
+    return {"status": "ok"}
@@ -1,49 +1,134 @@
-import os
-import uuid
+import asyncio
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import BinaryIO, Literal, NamedTuple, NoReturn
 
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Form
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    File,
+    UploadFile,
+    Depends,
+    HTTPException,
+    Form,
+    Header,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse
+from PIL import UnidentifiedImageError
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_async_db, get_db
 from app.models.domain import CategoryEnum
-from app.models.domain import ClothingItem, ClothingItemPhoto, User
+from app.models.domain import ClosetChange, ClothingItem, ClothingItemPhoto, User
 from app.schemas import (
+    ClosetChangesResponse,
     ClothingItemPhotoResponse,
     ClothingItemResponse,
+    CutoutPlacementResponse,
+    ItemBatchOperation,
+    ItemBatchRequest,
+    ItemBatchResponse,
     ItemUpdateRequest,
+    JobResponse,
+    UploadAcceptedResponse,
     UploadResponse,
+    UserResponse,
+)
+from app.core.config import STATIC_URL_PREFIX, settings
+from app.services.assets import asset_response
+from app.services.blob_store import content_digest, record_blob_use
+from app.services.derivatives import (
+    DERIVATIVE_MEDIA_TYPES,
+    derivative_fields,
+    derivative_key,
+    derivative_widths,
+    render_derivatives,
+)
+from app.services.inference_pool import InferenceQueueFullError, inference_executor
+from app.services.ingest import IngestedUpload, UploadRoute, UploadTooLargeError, ingest_upload
+from app.services.closet import (
+    after_item,
+    closet_etag,
+    http_date,
+    not_modified,
+    record_item_change,
+    record_item_changes,
+    url_window_start,
 )
-from app.services.ml_service import InvalidImageError, auto_categorize, remove_background
+from app.services.jobs import create_job, running_job, update_job
+from app.services.metrics import background_removal_fallbacks, cutout_cache_requests, record_stages, stage_timer
+from app.services.classifier import DEFAULT_CATEGORY
+from app.services.ml_service import (
+    ImageTooLargeError,
+    CutoutPlacement,
+    InvalidImageError,
+    SegmentedGarment,
+    classify_garments,
+    cutout_extension,
+    cutout_version,
+    describe_cutout,
+    segment_garment,
+)
+from app.services.storage import storage
+
+router = APIRouter(route_class=UploadRoute)
+
+PLACEMENT_COLUMNS = ("cutout_offset_x", "cutout_offset_y", "cutout_canvas_width", "cutout_canvas_height")
 
-router = APIRouter()
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+def _placement_columns(placement: CutoutPlacement | None) -> dict[str, int | None]:
+    """Column values recording ``placement`` on an item or photo (all NULL when uncropped)."""
+    return dict(zip(PLACEMENT_COLUMNS, placement or (None,) * len(PLACEMENT_COLUMNS)))
+
+
+def _serialize_placement(row: ClothingItem | ClothingItemPhoto) -> CutoutPlacementResponse | None:
+    if row.cutout_canvas_width is None:
+        return None
+    return CutoutPlacementResponse(
+        offset_x=row.cutout_offset_x,
+        offset_y=row.cutout_offset_y,
+        canvas_width=row.cutout_canvas_width,
+        canvas_height=row.cutout_canvas_height,
+    )
 
 
 def _serialize_photo(photo: ClothingItemPhoto) -> ClothingItemPhotoResponse:
+    processed_url = storage.public_url(photo.image_url)
     return ClothingItemPhotoResponse(
         id=photo.id,
         item_id=photo.item_id,
-        original_url=photo.original_image_url,
-        processed_url=photo.image_url,
+        original_url=storage.public_url(photo.original_image_url),
+        processed_url=processed_url,
+        **derivative_fields(photo.image_url, processed_url),
+        placement=_serialize_placement(photo),
         angle_label=photo.angle_label,
         created_at=photo.created_at,
     )
 
 
-def _serialize_item(item: ClothingItem) -> ClothingItemResponse:
+def _serialize_item(item: ClothingItem, include_photos: bool = True) -> ClothingItemResponse:
+    processed_url = storage.public_url(item.image_url)
     return ClothingItemResponse(
         id=item.id,
         owner_id=item.owner_id,
         name=item.name,
-        original_url=item.original_image_url,
-        processed_url=item.image_url,
+        original_url=storage.public_url(item.original_image_url),
+        processed_url=processed_url,
+        **derivative_fields(item.image_url, processed_url),
+        placement=_serialize_placement(item),
         category=item.category.value,
         color=item.color,
+        status=item.status,
         created_at=item.created_at,
-        photos=[_serialize_photo(photo) for photo in item.photos],
+        updated_at=item.updated_at,
+        photos=[_serialize_photo(photo) for photo in item.photos if photo.deleted_at is None] if include_photos else [],
     )
 
 
@@ -59,33 +144,342 @@ def _normalize_item_name(item_name: str | None, fallback_filename: str | None) -
     return None
 
 
-def _process_and_store_image(file_name_hint: str | None, image_bytes: bytes) -> tuple[str, str, str]:
-    upload_message = "Image uploaded, background removed, and categorized successfully"
+BACKGROUND_REMOVED_MESSAGE = "Image uploaded, background removed, and categorized successfully"
+BACKGROUND_SKIPPED_MESSAGE = (
+    "Image uploaded and categorized successfully. "
+    "Background removal was skipped for this file format."
+)
+DEDUPLICATED_MESSAGE = "Image uploaded and matched a previously processed copy."
+QUEUE_RETRY_SECONDS = 0.25
+
+
+class ProcessedImage(NamedTuple):
+    processed_url: str
+    message: str
+    category: str
+    color: str | None
+    placement: CutoutPlacement | None
+
+
+class StoredImage(NamedTuple):
+    original_url: str
+    content_hash: str
+    processed_url: str
+    message: str
+    category: str
+    color: str | None
+    placement: CutoutPlacement | None
+
+
+def _static_url(key: str) -> str:
+    return f"{STATIC_URL_PREFIX}{key}"
+
+
+def _original_key(content_hash: str, file_name_hint: str | None) -> str:
+    original_suffix = Path(file_name_hint or "").suffix.lower() or ".jpg"
+    return f"{content_hash}_orig{original_suffix}"
+
+
+def _processed_key(content_hash: str) -> str:
+    """Cutout cache key: the content plus the model and settings that produced it."""
+    return f"{content_hash}_proc-{cutout_version()}{cutout_extension()}"
+
+
+def _fallback_key(image_bytes: bytes) -> str:
+    """
+    Where an unsegmented image is stored, keyed by its own bytes so the
+    immutable URL never changes content; the cutout cache never looks it up.
+    """
+    return f"{content_digest(image_bytes)}_unsegmented{cutout_extension()}"
+
+
+async def _write_blobs(blobs: dict[str, bytes]) -> None:
+    """Write blobs to storage concurrently."""
+    with stage_timer("store"):
+        await asyncio.gather(*(storage.put(key, data) for key, data in blobs.items()))
+
+
+def _inference_input(upload: IngestedUpload) -> bytes | BinaryIO:
+    """Thread workers decode the spooled file in place; process workers need picklable bytes."""
+    return upload.open() if inference_executor.kind == "thread" else upload.read_bytes()
+
+
+def _raise_for_ingest_error(exc: Exception) -> NoReturn:
+    if isinstance(exc, (UploadTooLargeError, ImageTooLargeError)):
+        raise HTTPException(status_code=413, detail=str(exc)) from exc
+    if isinstance(exc, InferenceQueueFullError):
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "5"}) from exc
+    raise exc
+
+
+async def _known_garment_labels(content_hashes: list[str]) -> dict[str, tuple[str, str | None]]:
+    """Category and color already assigned to items with the same content, in one query."""
+    if not content_hashes:
+        return {}
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(ClothingItem.content_hash, ClothingItem.category, ClothingItem.color).where(
+                ClothingItem.content_hash.in_(content_hashes), ClothingItem.status == "ready"
+            )
+        )
+        return {content_hash: (category.value, color) for content_hash, category, color in rows}
+
+
+async def _known_cutout_placements(content_hashes: list[str]) -> dict[str, CutoutPlacement]:
+    """Placement recorded for cached cutouts, read from any photo that uses them."""
+    if not content_hashes:
+        return {}
+    urls = {_static_url(_processed_key(content_hash)): content_hash for content_hash in content_hashes}
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(ClothingItemPhoto.image_url, *(getattr(ClothingItemPhoto, column) for column in PLACEMENT_COLUMNS))
+            .where(ClothingItemPhoto.image_url.in_(urls), ClothingItemPhoto.cutout_canvas_width.is_not(None))
+        )
+        return {urls[image_url]: CutoutPlacement(*placement) for image_url, *placement in rows}
+
+
+async def _load_item(db: AsyncSession, item_id: int) -> ClothingItem | None:
+    """A live item with its photos, freshly read so server defaults are populated for serializing."""
+    return await db.scalar(
+        select(ClothingItem)
+        .options(selectinload(ClothingItem.photos))
+        .where(ClothingItem.id == item_id, ClothingItem.deleted_at.is_(None))
+        .execution_options(populate_existing=True)
+    )
+
+
+async def _store_processed_batch(
+    uploads: list[IngestedUpload], classify: bool = True
+) -> dict[str, ProcessedImage]:
+    """
+    Map each content hash to its processed image. Cached cutouts are reused;
+    the rest go through background removal in parallel on the executor, and
+    with ``classify`` every garment is categorized in one batched call.
+    """
+    messages: dict[str, tuple[str, str]] = {}
+    cached: list[str] = []
+    pending: dict[str, IngestedUpload] = {}
+    for upload in uploads:
+        processed_key = _processed_key(upload.content_hash)
+        if upload.content_hash in messages or upload.content_hash in pending:
+            continue
+        if await storage.exists(processed_key):
+            messages[upload.content_hash] = (_static_url(processed_key), DEDUPLICATED_MESSAGE)
+            cached.append(upload.content_hash)
+            cutout_cache_requests.inc(result="hit")
+        else:
+            pending[upload.content_hash] = upload
+            cutout_cache_requests.inc(result="miss")
+
+    if cached:
+        await record_blob_use(*(_processed_key(content_hash) for content_hash in cached))
+    labels = await _known_garment_labels(cached) if classify else {}
+    placements = await _known_cutout_placements(cached)
+    garments: dict[str, SegmentedGarment] = {}
+    processed_blobs: dict[str, bytes] = {}
+    if pending:
+        outputs = await inference_executor.map(
+            segment_garment, [_inference_input(upload) for upload in pending.values()]
+        )
+        for (content_hash, upload), output in zip(pending.items(), outputs):
+            # Fallbacks are stored but never cached, so the next upload of the content retries.
+            if isinstance(output, InvalidImageError):
+                # Keep MVP upload flow resilient for odd but browser-decodable images:
+                # the stored original doubles as the "cutout".
+                original_url = _static_url(_original_key(content_hash, upload.filename))
+                messages[content_hash] = (original_url, BACKGROUND_SKIPPED_MESSAGE)
+                background_removal_fallbacks.inc(reason="invalid_image")
+                continue
+            if isinstance(output, BaseException):
+                raise output
+            processed_key = _processed_key(content_hash) if output.segmented else _fallback_key(output.image_bytes)
+            garments[content_hash] = output
+            placements[content_hash] = output.placement
+            record_stages(output.timings)
+            if not output.segmented:
+                background_removal_fallbacks.inc(reason="segmentation_error")
+            processed_blobs[processed_key] = output.image_bytes
+            messages[content_hash] = (_static_url(processed_key), BACKGROUND_REMOVED_MESSAGE)
+        await _write_blobs(processed_blobs)
+
+    unlabelled = [content_hash for content_hash in cached if classify and content_hash not in labels]
+    if unlabelled:
+        # A cutout cached from a photo or a deleted item: describe the stored copy.
+        cutouts = await asyncio.gather(*(storage.get(_processed_key(content_hash)) for content_hash in unlabelled))
+        for content_hash, output in zip(unlabelled, await inference_executor.map(describe_cutout, cutouts)):
+            if not isinstance(output, BaseException):
+                garments[content_hash] = output
+
+    if classify and garments:
+        with stage_timer("categorize"):
+            categories = await inference_executor.run(
+                classify_garments, [garment.features for garment in garments.values()]
+            )
+        for (content_hash, garment), category in zip(garments.items(), categories):
+            labels[content_hash] = (category, garment.color)
+
+    results = {
+        content_hash: ProcessedImage(
+            *message, *labels.get(content_hash, (DEFAULT_CATEGORY, None)), placements.get(content_hash)
+        )
+        for content_hash, message in messages.items()
+    }
+    if processed_blobs:
+        await _render_derivative_batch(processed_blobs)
+    return results
+
+
+async def _render_derivative_batch(processed_blobs: dict[str, bytes]) -> None:
     try:
-        processed_image_bytes = remove_background(image_bytes)
-    except InvalidImageError:
-        # Keep MVP upload flow resilient for odd but browser-decodable images.
-        processed_image_bytes = image_bytes
-        upload_message = (
-            "Image uploaded and categorized successfully. "
-            "Background removal was skipped for this file format."
+        rendered = await inference_executor.map(
+            render_derivatives,
+            list(processed_blobs.values()),
+            derivative_widths(),
+            settings.DERIVATIVE_FORMAT,
         )
+    except InferenceQueueFullError:
+        # Missing derivatives are generated on first request instead.
+        return
+    await _write_blobs(
+        {
+            derivative_key(processed_key, width): data
+            for processed_key, derivatives in zip(processed_blobs, rendered)
+            if not isinstance(derivatives, BaseException)
+            for width, data in derivatives.items()
+        }
+    )
+
+
+async def _store_processed(upload: IngestedUpload) -> ProcessedImage:
+    """Reuse the cached cutout for this content, or run background removal and store it."""
+    return (await _store_processed_batch([upload]))[upload.content_hash]
+
+
+async def _ensure_derivatives(source_key: str, source_bytes: bytes) -> None:
+    """Render and store every configured derivative of ``source_key`` that is missing."""
+    missing_widths = [
+        width for width in derivative_widths() if not await storage.exists(derivative_key(source_key, width))
+    ]
+    if not missing_widths:
+        return
+
+    rendered = await inference_executor.run(
+        render_derivatives, source_bytes, missing_widths, settings.DERIVATIVE_FORMAT
+    )
+    await _write_blobs({derivative_key(source_key, width): data for width, data in rendered.items()})
+
+
+async def _process_and_store_images(uploads: list[IngestedUpload], classify: bool = True) -> list[StoredImage]:
+    """Store originals and cutouts for a set of uploads, processing them as one batch."""
+    try:
+        processed = await _store_processed_batch(uploads, classify=classify)
+    except (InferenceQueueFullError, ImageTooLargeError) as exc:
+        _raise_for_ingest_error(exc)
+
+    original_urls = await _store_originals(uploads)
+    return [
+        StoredImage(original_url, upload.content_hash, *processed[upload.content_hash])
+        for original_url, upload in zip(original_urls, uploads)
+    ]
+
+
+async def _process_and_store_image(upload: IngestedUpload) -> StoredImage:
+    return (await _process_and_store_images([upload]))[0]
+
+
+async def _store_originals(uploads: list[IngestedUpload]) -> list[str]:
+    """
+    Stream the spooled originals into storage concurrently, skipping any an
+    identical upload already stored. Returns their URLs in input order.
+    """
+    keys = [_original_key(upload.content_hash, upload.filename) for upload in uploads]
+    distinct = dict(zip(keys, uploads))
+    stored = await asyncio.gather(*(storage.exists(key) for key in distinct))
+    reused = [key for key, exists in zip(distinct, stored) if exists]
+    if reused:
+        await record_blob_use(*reused)
+    new_originals = {key: upload for (key, upload), exists in zip(distinct.items(), stored) if not exists}
+    if new_originals:
+        with stage_timer("store"):
+            await asyncio.gather(
+                *(storage.put_stream(key, upload.iter_chunks()) for key, upload in new_originals.items())
+            )
+    return [_static_url(key) for key in keys]
+
+
+async def _store_original(upload: IngestedUpload) -> str:
+    return (await _store_originals([upload]))[0]
 
-    unique_id = str(uuid.uuid4())
-    original_suffix = Path(file_name_hint or "").suffix.lower() or ".jpg"
-    original_filename = f"{unique_id}_orig{original_suffix}"
-    processed_filename = f"{unique_id}_proc.png"
 
-    original_path = os.path.join(UPLOAD_DIR, original_filename)
-    processed_path = os.path.join(UPLOAD_DIR, processed_filename)
+async def _set_item_status(item_id: int, status: str) -> None:
+    async with AsyncSessionLocal() as db:
+        item = await db.get(ClothingItem, item_id)
+        if item:
+            item.status = status
+            await db.run_sync(record_item_change, item.owner_id, item.id)
+            await db.commit()
 
-    with open(original_path, "wb") as output_file:
-        output_file.write(image_bytes)
 
-    with open(processed_path, "wb") as output_file:
-        output_file.write(processed_image_bytes)
+async def _apply_processed_upload(item_id: int, processed: ProcessedImage) -> None:
+    """Swap the processed cutout and labels into a provisional item."""
+    async with AsyncSessionLocal() as db:
+        item = await _load_item(db, item_id)
+        if not item:
+            raise RuntimeError("Clothing item was removed before processing finished.")
 
-    return f"/static/{original_filename}", f"/static/{processed_filename}", upload_message
+        # Photos still showing the provisional original switch to the cutout with the item.
+        rows = [photo for photo in item.photos if photo.image_url == item.image_url] + [item]
+        for row in rows:
+            row.image_url = processed.processed_url
+            for column, value in _placement_columns(processed.placement).items():
+                setattr(row, column, value)
+        item.category = CategoryEnum(processed.category)
+        item.color = processed.color
+        item.status = "ready"
+        await db.run_sync(record_item_change, item.owner_id, item.id)
+        await db.commit()
+
+
+async def _complete_upload_job(job_id: str, item_id: int, upload: IngestedUpload) -> None:
+    """Finish an accepted upload: segment, categorize and swap in the processed image."""
+    with running_job(job_id):
+        # update_job is shared with threadpool callers; keep its sync session off the event loop.
+        await asyncio.to_thread(
+            update_job, job_id, status="processing", progress=10, message="Removing background and categorizing"
+        )
+        try:
+            while True:
+                try:
+                    processed = await _store_processed(upload)
+                    break
+                except InferenceQueueFullError:
+                    # Accepted jobs wait for capacity instead of failing.
+                    await asyncio.sleep(QUEUE_RETRY_SECONDS)
+
+            await asyncio.to_thread(update_job, job_id, progress=70, message="Saving")
+            await _apply_processed_upload(item_id, processed)
+        except Exception as exc:
+            await _set_item_status(item_id, "failed")
+            await asyncio.to_thread(
+                update_job, job_id, status="failed", message="Image processing failed", error=str(exc)
+            )
+            return
+        finally:
+            upload.close()
+
+        await asyncio.to_thread(update_job, job_id, status="succeeded", progress=100, message=processed.message)
+
+
+async def _ingest(file: UploadFile) -> IngestedUpload:
+    """Spool one validated upload to a temp file, mapping size and emptiness errors to HTTP."""
+    try:
+        upload = await ingest_upload(file)
+    except UploadTooLargeError as exc:
+        _raise_for_ingest_error(exc)
+    if upload.size == 0:
+        upload.close()
+        raise HTTPException(status_code=400, detail=f"Uploaded image '{file.filename}' is empty.")
+    return upload
 
 
 def _validate_image_file(file: UploadFile) -> None:
@@ -96,48 +490,116 @@ def _validate_image_file(file: UploadFile) -> None:
         raise HTTPException(status_code=400, detail="File provided is not an image.")
 
 
-@router.post("/upload/", response_model=UploadResponse)
+@router.post(
+    "/upload/",
+    response_model=UploadResponse,
+    responses={202: {"model": UploadAcceptedResponse}},
+)
 async def upload_image(
+    background_tasks: BackgroundTasks,
     owner_id: int = Form(...),
     item_name: str | None = Form(default=None),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    mode: Literal["sync", "async"] = Query(default="sync"),
+    db: AsyncSession = Depends(get_async_db),
 ):
     _validate_image_file(file)
 
-    user = db.get(User, owner_id)
+    user = await db.get(User, owner_id)
     if not user:
         raise HTTPException(status_code=404, detail="Owner user was not found.")
 
-    image_bytes = await file.read()
-    if not image_bytes:
-        raise HTTPException(status_code=400, detail="Uploaded image is empty.")
+    upload = await _ingest(file)
+    if mode == "async":
+        # The background job owns the spooled upload from here on.
+        return await _accept_upload(background_tasks, db, owner_id, item_name, upload)
 
-    original_url, processed_url, upload_message = _process_and_store_image(file.filename, image_bytes)
-    predicted_category = auto_categorize(image_bytes)
+    try:
+        stored = await _process_and_store_image(upload)
+    finally:
+        upload.close()
 
     item = ClothingItem(
         owner_id=owner_id,
         name=_normalize_item_name(item_name, file.filename),
-        original_image_url=original_url,
-        image_url=processed_url,
-        category=CategoryEnum(predicted_category),
+        original_image_url=stored.original_url,
+        image_url=stored.processed_url,
+        content_hash=stored.content_hash,
+        category=CategoryEnum(stored.category),
+        color=stored.color,
+        **_placement_columns(stored.placement),
     )
     db.add(item)
-    db.flush()
+    await db.flush()
 
     first_photo = ClothingItemPhoto(
         item_id=item.id,
-        original_image_url=original_url,
-        image_url=processed_url,
+        original_image_url=stored.original_url,
+        image_url=stored.processed_url,
+        content_hash=stored.content_hash,
         angle_label="front",
+        **_placement_columns(stored.placement),
     )
     db.add(first_photo)
+    await db.run_sync(record_item_change, owner_id, item.id)
 
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    item = await _load_item(db, item.id)
+
+    return UploadResponse(item=_serialize_item(item), message=stored.message)
+
+
+async def _accept_upload(
+    background_tasks: BackgroundTasks,
+    db: AsyncSession,
+    owner_id: int,
+    item_name: str | None,
+    upload: IngestedUpload,
+) -> JSONResponse:
+    """Store the original, insert a processing item and defer the heavy work."""
+    try:
+        original_url = await _store_original(upload)
+    except BaseException:
+        upload.close()
+        raise
+    content_hash = upload.content_hash
+
+    # The original stands in for the cutout and the category is provisional
+    # until the background job swaps in the processed results.
+    item = ClothingItem(
+        owner_id=owner_id,
+        name=_normalize_item_name(item_name, upload.filename),
+        original_image_url=original_url,
+        image_url=original_url,
+        content_hash=content_hash,
+        category=CategoryEnum.TOP,
+        status="processing",
+    )
+    db.add(item)
+    await db.flush()
+    db.add(
+        ClothingItemPhoto(
+            item_id=item.id,
+            original_image_url=original_url,
+            image_url=original_url,
+            content_hash=content_hash,
+            angle_label="front",
+        )
+    )
+    job = await db.run_sync(create_job, kind="upload", owner_id=owner_id, item_id=item.id)
+    await db.run_sync(record_item_change, owner_id, item.id)
+    await db.commit()
+    item = await _load_item(db, item.id)
+    await db.refresh(job)
+
+    background_tasks.add_task(_complete_upload_job, job.id, item.id, upload)
 
-    return UploadResponse(item=_serialize_item(item), message=upload_message)
+    payload = UploadAcceptedResponse(
+        job=JobResponse.model_validate(job),
+        item=_serialize_item(item),
+        status_url=f"/api/jobs/{job.id}",
+    )
+    return JSONResponse(status_code=202, content=jsonable_encoder(payload))
 
 
 @router.post("/items/{item_id}/photos", response_model=ClothingItemResponse)
@@ -145,49 +607,101 @@ async def add_item_photos(
     item_id: int,
     files: list[UploadFile] = File(...),
     angle_label: str | None = Form(default=None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if not files:
         raise HTTPException(status_code=400, detail="At least one photo must be provided.")
+    if len(files) > settings.MAX_PHOTOS_PER_REQUEST:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.MAX_PHOTOS_PER_REQUEST} photos can be uploaded at once.",
+        )
 
-    item = (
-        db.query(ClothingItem)
-        .options(selectinload(ClothingItem.photos))
-        .filter(ClothingItem.id == item_id)
-        .first()
-    )
-    if not item:
+    item = await db.get(ClothingItem, item_id)
+    if not item or item.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Clothing item not found.")
 
     for file in files:
         _validate_image_file(file)
-        image_bytes = await file.read()
-        if not image_bytes:
-            raise HTTPException(status_code=400, detail=f"Uploaded image '{file.filename}' is empty.")
-
-        original_url, processed_url, _ = _process_and_store_image(file.filename, image_bytes)
+    uploads: list[IngestedUpload] = []
+    try:
+        for file in files:
+            uploads.append(await _ingest(file))
+        # All photos are segmented in parallel on the executor.
+        stored_images = await _process_and_store_images(uploads, classify=False)
+    finally:
+        for upload in uploads:
+            upload.close()
+    for stored in stored_images:
         photo = ClothingItemPhoto(
             item_id=item.id,
-            original_image_url=original_url,
-            image_url=processed_url,
+            original_image_url=stored.original_url,
+            image_url=stored.processed_url,
+            content_hash=stored.content_hash,
             angle_label=(angle_label.strip() if angle_label else None),
+            **_placement_columns(stored.placement),
         )
         db.add(photo)
+    await db.run_sync(record_item_change, item.owner_id, item.id)
 
-    db.commit()
+    await db.commit()
 
-    refreshed_item = (
-        db.query(ClothingItem)
-        .options(selectinload(ClothingItem.photos))
-        .filter(ClothingItem.id == item_id)
-        .first()
-    )
+    refreshed_item = await _load_item(db, item_id)
     if not refreshed_item:
         raise HTTPException(status_code=404, detail="Clothing item not found after update.")
 
     return _serialize_item(refreshed_item)
 
 
+@router.put("/users/{user_id}/avatar", response_model=UserResponse)
+async def upload_avatar(
+    user_id: int,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Store the user's avatar content-addressed, so try-on results are cached by its bytes."""
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+
+    _validate_image_file(file)
+    upload = await _ingest(file)
+    try:
+        user.avatar_image_url = await _store_original(upload)
+        user.avatar_content_hash = upload.content_hash
+    finally:
+        upload.close()
+    await db.commit()
+    return user
+
+
+@router.get("/derivatives/{width}/{source_key}")
+async def get_derivative(width: int, source_key: str, request: Request):
+    if width not in derivative_widths() or source_key.startswith("."):
+        raise HTTPException(status_code=404, detail="Image derivative not found.")
+
+    key = derivative_key(source_key, width)
+    if not await storage.exists(key):
+        # Items stored before derivatives existed get them lazily on first request.
+        if not await storage.exists(source_key):
+            raise HTTPException(status_code=404, detail="Image derivative not found.")
+        source_bytes = await storage.get(source_key)
+        try:
+            await _ensure_derivatives(source_key, source_bytes)
+        except InferenceQueueFullError as exc:
+            raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "5"}) from exc
+        except (UnidentifiedImageError, OSError) as exc:
+            raise HTTPException(status_code=404, detail="Image derivative not available.") from exc
+
+    local_path = storage.local_path(key)
+    if local_path is None:
+        # Remote storage serves the bytes itself; don't proxy them through the API.
+        return RedirectResponse(storage.url(key))
+    return await asset_response(
+        str(local_path), key, request.headers, media_type=DERIVATIVE_MEDIA_TYPES[settings.DERIVATIVE_FORMAT]
+    )
+
+
 @router.patch("/items/{item_id}", response_model=ClothingItemResponse)
 def update_item(item_id: int, payload: ItemUpdateRequest, db: Session = Depends(get_db)):
     normalized_name = payload.name.strip()
@@ -197,7 +711,7 @@ def update_item(item_id: int, payload: ItemUpdateRequest, db: Session = Depends(
     item = (
         db.query(ClothingItem)
         .options(selectinload(ClothingItem.photos))
-        .filter(ClothingItem.id == item_id)
+        .filter(ClothingItem.id == item_id, ClothingItem.deleted_at.is_(None))
         .first()
     )
     if not item:
@@ -205,19 +719,329 @@ def update_item(item_id: int, payload: ItemUpdateRequest, db: Session = Depends(
 
     item.name = normalized_name
     db.add(item)
+    record_item_change(db, item.owner_id, item.id)
     db.commit()
     db.refresh(item)
 
     return _serialize_item(item)
 
 
-@router.get("/closet/{owner_id}", response_model=list[ClothingItemResponse])
-def list_closet(owner_id: int, db: Session = Depends(get_db)):
+@router.delete("/items/{item_id}", status_code=204)
+def delete_item(item_id: int, db: Session = Depends(get_db)):
+    """Tombstone the item and its photos so delta syncs can report the deletion."""
+    item = (
+        db.query(ClothingItem)
+        .options(selectinload(ClothingItem.photos))
+        .filter(ClothingItem.id == item_id, ClothingItem.deleted_at.is_(None))
+        .first()
+    )
+    if not item:
+        raise HTTPException(status_code=404, detail="Clothing item not found.")
+
+    deleted_at = datetime.now(timezone.utc)
+    item.deleted_at = deleted_at
+    for photo in item.photos:
+        if photo.deleted_at is None:
+            photo.deleted_at = deleted_at
+    record_item_change(db, item.owner_id, item.id)
+    db.commit()
+    return Response(status_code=204)
+
+
+def _batch_error(index: int, status_code: int, detail: str) -> NoReturn:
+    raise HTTPException(status_code=status_code, detail=f"Operation {index}: {detail}")
+
+
+def _batch_item_values(index: int, operation: ItemBatchOperation) -> dict:
+    """Columns a create or update operation sets, validated and normalized."""
+    values = {}
+    if operation.name is not None:
+        name = operation.name.strip()
+        if not name:
+            _batch_error(index, 400, "item name cannot be empty.")
+        values["name"] = name
+    if operation.category is not None:
+        try:
+            values["category"] = CategoryEnum(operation.category)
+        except ValueError:
+            _batch_error(index, 400, f"unknown category {operation.category!r}.")
+    if operation.color is not None:
+        values["color"] = operation.color.strip().lower() or None
+    return values
+
+
+def _apply_item_batch(db: Session, payload: ItemBatchRequest) -> tuple[list[ClothingItem], list[int]]:
+    """
+    Apply a batch in the caller's transaction with a fixed number of
+    statements however many operations it has: one load of the referenced
+    items and one of the create sources, one bulk UPDATE by primary key, one
+    UPDATE per table for deletions, multi-row INSERTs for new items and
+    photos, and one change-log insert. Every operation is validated before
+    anything is written. Loaded and new objects are left in their final
+    state, so the response needs no reload.
+    """
+    owner_id = payload.owner_id
+    operations = payload.operations
+    item_ids = {operation.item_id for operation in operations if operation.item_id is not None}
+    photo_ids = {operation.photo_id for operation in operations if operation.photo_id is not None}
+
+    items = {
+        item.id: item
+        for item in db.scalars(
+            select(ClothingItem)
+            .options(selectinload(ClothingItem.photos))
+            .where(
+                ClothingItem.id.in_(item_ids),
+                ClothingItem.owner_id == owner_id,
+                ClothingItem.deleted_at.is_(None),
+            )
+        )
+    }
+    # A create copies the processed photo (and its item's labels) already in the closet.
+    sources: dict[int, tuple[ClothingItemPhoto, ClothingItem]] = {}
+    if photo_ids:
+        rows = db.execute(
+            select(ClothingItemPhoto, ClothingItem)
+            .join(ClothingItem, ClothingItemPhoto.item_id == ClothingItem.id)
+            .where(
+                ClothingItemPhoto.id.in_(photo_ids),
+                ClothingItemPhoto.deleted_at.is_(None),
+                ClothingItem.owner_id == owner_id,
+                ClothingItem.deleted_at.is_(None),
+                ClothingItem.status == "ready",
+            )
+        )
+        sources = {photo.id: (photo, source_item) for photo, source_item in rows}
+
+    now = datetime.now(timezone.utc)
+    updates: dict[int, dict] = {}
+    deleted: dict[int, None] = {}
+    created: list[ClothingItem] = []
+    results: dict[ClothingItem, None] = {}
+    for index, operation in enumerate(operations):
+        if operation.op == "create":
+            if operation.photo_id is None:
+                _batch_error(index, 400, "photo_id is required to create an item.")
+            source = sources.get(operation.photo_id)
+            if source is None:
+                _batch_error(index, 404, f"photo {operation.photo_id} not found in the owner's closet.")
+            photo, source_item = source
+            placement = {column: getattr(photo, column) for column in PLACEMENT_COLUMNS}
+            item = ClothingItem(
+                owner_id=owner_id,
+                name=source_item.name,
+                category=source_item.category,
+                color=source_item.color,
+                original_image_url=photo.original_image_url,
+                image_url=photo.image_url,
+                content_hash=photo.content_hash,
+                status="ready",
+                created_at=now,
+                updated_at=now,
+                photos=[
+                    ClothingItemPhoto(
+                        original_image_url=photo.original_image_url,
+                        image_url=photo.image_url,
+                        content_hash=photo.content_hash,
+                        angle_label="front",
+                        created_at=now,
+                        updated_at=now,
+                        **placement,
+                    )
+                ],
+                **placement,
+            )
+            for column, value in _batch_item_values(index, operation).items():
+                setattr(item, column, value)
+            created.append(item)
+            results[item] = None
+            continue
+
+        if operation.item_id is None:
+            _batch_error(index, 400, f"item_id is required to {operation.op} an item.")
+        item = items.get(operation.item_id)
+        if item is None or item.id in deleted:
+            _batch_error(index, 404, f"clothing item {operation.item_id} not found.")
+        if operation.op == "update":
+            updates.setdefault(item.id, {}).update(_batch_item_values(index, operation))
+            results[item] = None
+        else:
+            deleted[item.id] = None
+
+    if updates:
+        # Every row sets the same columns so the bulk UPDATE runs as a single executemany.
+        rows = [
+            {
+                "id": item_id,
+                "name": items[item_id].name,
+                "category": items[item_id].category,
+                "color": items[item_id].color,
+                **values,
+                "updated_at": now,
+            }
+            for item_id, values in updates.items()
+        ]
+        db.execute(update(ClothingItem), rows)
+        for row in rows:
+            for column, value in row.items():
+                set_committed_value(items[row["id"]], column, value)
+    if deleted:
+        db.execute(
+            update(ClothingItem)
+            .where(ClothingItem.id.in_(deleted))
+            .values(deleted_at=now, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(
+            update(ClothingItemPhoto)
+            .where(ClothingItemPhoto.item_id.in_(deleted), ClothingItemPhoto.deleted_at.is_(None))
+            .values(deleted_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    if created:
+        db.add_all(created)
+        db.flush()
+
+    changed_ids = [*updates, *deleted, *(item.id for item in created)]
+    record_item_changes(db, owner_id, list(dict.fromkeys(changed_ids)))
+    return [item for item in results if item.id not in deleted], list(deleted)
+
+
+@router.post("/items/batch", response_model=ItemBatchResponse)
+async def batch_items(payload: ItemBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Create, update and delete many of one owner's items in a single
+    transaction. The whole batch is rejected, and nothing is written, if any
+    operation is invalid; the error names the operation's index.
+    """
+    if len(payload.operations) > settings.MAX_BATCH_OPERATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.MAX_BATCH_OPERATIONS} operations can be applied at once.",
+        )
+    if not await db.get(User, payload.owner_id):
+        raise HTTPException(status_code=404, detail="Owner user was not found.")
+
+    items, deleted_item_ids = await db.run_sync(_apply_item_batch, payload)
+    await db.commit()
+    return ItemBatchResponse(items=[_serialize_item(item) for item in items], deleted_item_ids=deleted_item_ids)
+
+
+@router.get("/closet/{owner_id}/changes", response_model=ClosetChangesResponse)
+def list_closet_changes(
+    owner_id: int,
+    since: int = Query(default=0, ge=0, description="cursor of the previous sync; 0 for a full snapshot"),
+    limit: int = Query(default=500, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Items created, updated or deleted after ``since``. The work is proportional
+    to the number of changes: the change log is read from the cursor and only
+    the items it names are loaded. ``since=0`` returns the live closet.
+    """
+    if since == 0:
+        cursor = (
+            db.query(func.max(ClosetChange.id)).filter(ClosetChange.owner_id == owner_id).scalar() or 0
+        )
+        items = (
+            db.query(ClothingItem)
+            .options(selectinload(ClothingItem.photos))
+            .filter(ClothingItem.owner_id == owner_id, ClothingItem.deleted_at.is_(None))
+            .order_by(ClothingItem.id)
+            .all()
+        )
+        return ClosetChangesResponse(
+            cursor=cursor, has_more=False, items=[_serialize_item(item) for item in items], deleted_item_ids=[]
+        )
+
+    changes = (
+        db.query(ClosetChange.id, ClosetChange.item_id)
+        .filter(ClosetChange.owner_id == owner_id, ClosetChange.id > since)
+        .order_by(ClosetChange.id)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if not changes:
+        return ClosetChangesResponse(cursor=since, has_more=False, items=[], deleted_item_ids=[])
+
+    # An item changed several times in the window is sent once, in its current state.
+    changed_ids = list(dict.fromkeys(item_id for _, item_id in changes))
     items = (
         db.query(ClothingItem)
         .options(selectinload(ClothingItem.photos))
-        .filter(ClothingItem.owner_id == owner_id)
-        .order_by(ClothingItem.created_at.desc())
+        .filter(ClothingItem.id.in_(changed_ids))
+        .order_by(ClothingItem.id)
         .all()
     )
-    return [_serialize_item(item) for item in items]
+    return ClosetChangesResponse(
+        cursor=changes[-1].id,
+        has_more=has_more,
+        items=[_serialize_item(item) for item in items if item.deleted_at is None],
+        deleted_item_ids=[item.id for item in items if item.deleted_at is not None],
+    )
+
+
+@router.get("/closet/{owner_id}", response_model=list[ClothingItemResponse])
+def list_closet(
+    owner_id: int,
+    response: Response,
+    category: CategoryEnum | None = Query(default=None),
+    color: str | None = Query(default=None),
+    include_photos: bool = Query(default=True),
+    limit: int | None = Query(default=None, ge=1, le=200),
+    after: int | None = Query(default=None, description="X-Next-Cursor of the previous page"),
+    if_none_match: str | None = Header(default=None),
+    if_modified_since: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    """
+    Newest items first. Without ``limit`` the whole (filtered) closet is
+    returned; with it, pages follow ``X-Next-Cursor`` until the header is
+    absent. The ETag changes whenever anything in the owner's closet does
+    and, with presigned asset URLs, each time half their lifetime has passed.
+    """
+    owner = db.get(User, owner_id)
+    if not owner:
+        return []
+
+    variant = {"category": category.value if category else "", "color": color or "", "photos": include_photos}
+    variant.update(limit=limit or "", after=after or "")
+    last_modified = owner.closet_updated_at
+    if last_modified is not None and last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    url_window = url_window_start(storage.url_lifetime_seconds())
+    if url_window is not None:
+        # Presigned URLs expire: a cached copy is only current within its URL window.
+        variant["urls"] = int(url_window.timestamp())
+        last_modified = max(last_modified or url_window, url_window)
+    etag = closet_etag(owner_id, owner.closet_version, variant)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    if not_modified(etag, last_modified, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+
+    query = db.query(ClothingItem).filter(ClothingItem.owner_id == owner_id, ClothingItem.deleted_at.is_(None))
+    if include_photos:
+        query = query.options(selectinload(ClothingItem.photos))
+    if category is not None:
+        query = query.filter(ClothingItem.category == category)
+    if color:
+        query = query.filter(ClothingItem.color == color.strip().lower())
+    if after is not None:
+        query = after_item(query, after)
+    query = query.order_by(ClothingItem.created_at.desc(), ClothingItem.id.desc())
+
+    if limit is None:
+        items = query.all()
+    else:
+        # One extra row tells whether another page follows.
+        items = query.limit(limit + 1).all()
+        if len(items) > limit:
+            items = items[:limit]
+            headers["X-Next-Cursor"] = str(items[-1].id)
+
+    response.headers.update(headers)
+    return [_serialize_item(item, include_photos=include_photos) for item in items]
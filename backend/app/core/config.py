@@ -5,17 +5,126 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Cloakroom.ai API"
     # Use SQLite by default for local/dev and tests; override in production.
     DATABASE_URL: str = "sqlite:///./cloakroom.db"
+    # Connection pool per engine (sync for threadpool routes, async for async routes).
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # SQLite (dev): WAL journal, NORMAL sync and a busy timeout instead of "database is locked".
+    SQLITE_WAL: bool = True
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # Run `alembic upgrade head` at startup instead of only checking the schema revision.
+    # Convenient for single-process dev; deploys migrate once before starting workers.
+    DB_AUTO_MIGRATE: bool = False
+    # Blob storage: "local" (UPLOAD_DIR served at /static) or "s3" (any S3-compatible API).
+    STORAGE_BACKEND: str = "local"
     AWS_ACCESS_KEY_ID: str | None = None
     AWS_SECRET_ACCESS_KEY: str | None = None
     S3_BUCKET_NAME: str = "cloakroom-assets"
+    S3_REGION: str = "us-east-1"
+    S3_ENDPOINT_URL: str | None = None  # e.g. http://localhost:9000 for MinIO
+    S3_PRESIGN_EXPIRES_SECONDS: int = 3600
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    STORAGE_PUBLIC_BASE_URL: str | None = None  # CDN origin; pre-signed URLs are used when unset
+    # Prepended to every S3 object name (e.g. "cloakroom/"); listing and orphan eviction
+    # only see objects under it, so the bucket can be shared.
+    STORAGE_KEY_PREFIX: str = ""
     STATIC_BASE_URL: str = "http://localhost:8000"
+    # Blob keys are content-addressed, so /static, derivative and S3 objects are served as
+    # immutable for this long (0 sends "no-cache").
+    STATIC_CACHE_MAX_AGE_SECONDS: int = 365 * 24 * 3600
+    UPLOAD_DIR: str = "uploads"
+    # Unreferenced blobs are kept as a dedupe cache up to this size, evicted LRU.
+    BLOB_CACHE_MAX_ORPHAN_BYTES: int = 512 * 1024 * 1024
+    BLOB_ORPHAN_GRACE_SECONDS: int = 3600
+    BLOB_EVICTION_INTERVAL_SECONDS: int = 900  # 0 disables the periodic sweep
+    # Background jobs run in-process: at startup, jobs and items still unfinished this long
+    # after their last heartbeat are failed, since no worker is left to finish them (0 disables).
+    STALE_JOB_SECONDS: int = 1800
+    # How often an instance refreshes the heartbeat of the jobs it is running (keep well under
+    # STALE_JOB_SECONDS); only jobs whose heartbeat has lapsed are reaped.
+    JOB_HEARTBEAT_SECONDS: int = 60
     VTON_API_URL: str = "https://api.replicate.com/v1/predictions"
     VTON_API_KEY: str | None = None
     ENABLE_MOCK_VTON: bool = True
     VTON_MODEL_VERSION: str = "replace-with-provider-model-version"
+    # One pooled client per process; concurrent provider calls are capped and retried with backoff.
+    VTON_MAX_CONCURRENCY: int = 4
+    VTON_MAX_CONNECTIONS: int = 10
+    VTON_KEEPALIVE_EXPIRY_SECONDS: float = 60
+    VTON_HTTP2: bool = True  # needs the optional "h2" package
+    VTON_TIMEOUT_SECONDS: float = 90
+    VTON_CONNECT_TIMEOUT_SECONDS: float = 5
+    VTON_QUEUE_TIMEOUT_SECONDS: float = 10  # wait for a free call slot before answering 503
+    VTON_MAX_RETRIES: int = 3
+    VTON_RETRY_BACKOFF_SECONDS: float = 0.5
+    VTON_RETRY_BACKOFF_MAX_SECONDS: float = 8
+    VTON_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    VTON_CIRCUIT_RESET_SECONDS: float = 30
+    # Predictions are polled until done, or completed by webhook when both of these are set.
+    VTON_POLL_INTERVAL_SECONDS: float = 1
+    VTON_MAX_WAIT_SECONDS: float = 300
+    VTON_WEBHOOK_BASE_URL: str | None = None  # public origin of this API, e.g. https://api.example.com
+    VTON_WEBHOOK_SECRET: str | None = None
+    # Poll a webhook-mode prediction whose callback hasn't arrived this long after its last update.
+    VTON_WEBHOOK_TIMEOUT_SECONDS: float = 120
+    # Outfit slots the VTON model can render, as slot=provider category; other slots are recorded only.
+    VTON_LAYER_CATEGORIES: str = "top=upper_body,bottom=lower_body"
+    # Identical try-ons (same avatar, garments and model version) reuse the stored result.
+    # Keep the TTL under the provider's output URL lifetime (about an hour on Replicate).
+    TRYON_CACHE_TTL_SECONDS: int = 3600
+    TRYON_CACHE_MAX_ENTRIES: int = 1024
+    # Speculative try-ons for carousel neighbours (POST /api/tryon/prefetch) run only
+    # while more than TRYON_PREFETCH_RESERVED_SLOTS provider call slots are idle.
+    TRYON_PREFETCH_WORKERS: int = 1  # 0 disables prefetching
+    TRYON_PREFETCH_MAX_QUEUED_PER_USER: int = 8
+    TRYON_PREFETCH_BUDGET_PER_HOUR: int = 30
+    TRYON_PREFETCH_RESERVED_SLOTS: int = 1
     CORS_ALLOW_ORIGINS: str = "http://localhost:3000,http://127.0.0.1:3000"
+    # Prometheus text metrics at /metrics, and per-stage request timings as a Server-Timing header.
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_ENABLED: bool = True
+    # Background-removal inference runs off the event loop on a bounded executor.
+    INFERENCE_EXECUTOR: str = "thread"  # "thread" or "process"
+    INFERENCE_WORKERS: int = 2
+    INFERENCE_QUEUE_SIZE: int = 8  # workers + queue must cover MAX_PHOTOS_PER_REQUEST
+    # Segmentation model: u2net, u2netp, silueta or isnet-general-use.
+    REMBG_MODEL: str = "u2net"
+    ONNX_INTRA_OP_THREADS: int = 0  # 0 lets ONNX runtime decide
+    ONNX_INTER_OP_THREADS: int = 0
+    PRELOAD_SEGMENTATION_MODEL: bool = True
+    # Longest side fed to the segmentation model; the mask is upsampled to the output.
+    SEGMENTATION_MAX_SIDE: int = 1024
+    # Longest side of stored cutouts (0 keeps the decoded resolution).
+    OUTPUT_MAX_SIDE: int = 2048
+    # Stored cutouts: lossless "png" or "webp", trimmed to the garment's bounding box
+    # with CUTOUT_CROP (items then carry the crop's placement on the full canvas).
+    CUTOUT_FORMAT: str = "png"
+    CUTOUT_PNG_COMPRESS_LEVEL: int = 3  # zlib level 0-9; Pillow's default of 6 costs ~3x the time
+    CUTOUT_WEBP_METHOD: int = 2  # 0 (fastest) to 6 (smallest)
+    CUTOUT_CROP: bool = True
+    # Upload ingestion limits. Files spool to disk past the in-memory threshold.
+    MAX_UPLOAD_BYTES: int = 25 * 1024 * 1024
+    # Whole request bodies; unset allows MAX_PHOTOS_PER_REQUEST files of MAX_UPLOAD_BYTES plus form fields.
+    MAX_REQUEST_BYTES: int | None = None
+    MAX_PHOTOS_PER_REQUEST: int = 8
+    MAX_BATCH_OPERATIONS: int = 500  # per POST /api/items/batch
+    UPLOAD_SPOOL_MAX_MEMORY_BYTES: int = 1024 * 1024
+    # Largest decoded bitmap allowed per image (width * height * bands).
+    DECODE_MEMORY_BUDGET_BYTES: int = 256 * 1024 * 1024
+    # Optional ONNX garment classifier; the built-in silhouette classifier is used when unset.
+    GARMENT_CLASSIFIER_MODEL: str | None = None
+    GARMENT_CLASSIFIER_LABELS: str = "top,bottom,outerwear,shoes,accessory"
+    GARMENT_CLASSIFIER_INPUT_SIZE: int = 224
+    # Resized copies of cutouts for grids and carousels ("webp" or "avif").
+    DERIVATIVE_WIDTHS: str = "160,320,640"
+    DERIVATIVE_FORMAT: str = "webp"
+    THUMBNAIL_WIDTH: int = 320
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
+# Public URL prefix under which stored blobs are served.
+STATIC_URL_PREFIX = "/static/"
+
 settings = Settings()
\ No newline at end of file
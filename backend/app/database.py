@@ -1,12 +1,80 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .core.config import settings
+from .services.metrics import record_stage
+
+# Async drivers for the request path; sync URLs keep working unchanged in DATABASE_URL.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS or parsed.drivername == ASYNC_DRIVERS[backend]:
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
 
-connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(settings.DATABASE_URL, connect_args=connect_args)
+def _engine_options(url: str, is_async: bool = False) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if is_async or parsed.database in (None, "", ":memory:"):
+            # aiosqlite opens a connection (and its thread) per session; memory DBs share one.
+            return options
+    else:
+        options = {"pool_pre_ping": True, "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS}
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    )
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    # WAL lets readers proceed during a write; NORMAL sync is durable enough in WAL mode.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL), **_engine_options(settings.DATABASE_URL, is_async=True)
+)
+# Objects stay usable after commit so handlers can serialize them without a reload.
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if engine.dialect.name == "sqlite" and settings.SQLITE_WAL:
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+
+def _commit_started(session: Session) -> None:
+    session.info["commit_started"] = time.perf_counter()
+
+
+def _commit_finished(session: Session) -> None:
+    # Flush plus COMMIT, for sync sessions and the sessions behind AsyncSession alike.
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        record_stage("db_commit", time.perf_counter() - started)
+
+
+event.listen(Session, "before_commit", _commit_started)
+event.listen(Session, "after_commit", _commit_finished)
+
 Base = declarative_base()
 
 def get_db():
@@ -14,4 +82,10 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """Session for ``async def`` routes, so their queries don't block the event loop."""
+    async with AsyncSessionLocal() as db:
+        yield db
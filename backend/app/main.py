@@ -1,37 +1,121 @@
+import asyncio
+import contextlib
+import logging
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy import inspect, text
+from fastapi.responses import PlainTextResponse
 
-from app.database import engine, Base
-import app.models.domain  # To ensure models are loaded before creating tables
-from app.api import upload, tryon, users
+from app.database import async_engine, engine
+from app.api import jobs, upload, tryon, users
 from app.core.config import settings
-
-
-def _ensure_schema_compatibility() -> None:
-    """Apply lightweight startup migrations needed for MVP evolutions."""
-    inspector = inspect(engine)
-    table_names = set(inspector.get_table_names())
-    if "clothing_items" not in table_names:
-        return
-
-    existing_columns = {column["name"] for column in inspector.get_columns("clothing_items")}
-    if "name" in existing_columns:
-        return
-
-    with engine.begin() as connection:
-        connection.execute(text("ALTER TABLE clothing_items ADD COLUMN name VARCHAR"))
-
-
-# Create database tables (In production use alembic migrations)
-Base.metadata.create_all(bind=engine)
-_ensure_schema_compatibility()
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title=settings.PROJECT_NAME)
+from app.schema_version import check_schema_version, upgrade_database
+from app.services import ml_service
+from app.services.assets import AssetStaticFiles
+from app.services.blob_store import evict_orphaned_blobs
+from app.services.inference_pool import inference_executor
+from app.services.jobs import beat_running_jobs, reap_stale_jobs
+from app.services.ingest import RequestSizeLimitMiddleware
+from app.services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, registry
+from app.services.storage import storage
+from app.services.tryon_cache import tryon_cache, tryon_layer_cache
+from app.services.tryon_jobs import poll_overdue_webhook_jobs, webhooks_enabled
+from app.services.tryon_prefetch import tryon_prefetcher
+from app.services.vton_service import vton_client
+
+logger = logging.getLogger(__name__)
+
+
+async def _evict_orphaned_blobs_periodically(interval_seconds: int) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await evict_orphaned_blobs()
+        except Exception:
+            logger.exception("Orphaned blob eviction failed")
+
+
+async def _beat_running_jobs_periodically(interval_seconds: int) -> None:
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await beat_running_jobs()
+        except Exception:
+            logger.exception("Refreshing job heartbeats failed")
+
+
+async def _poll_overdue_webhooks_periodically(timeout_seconds: float) -> None:
+    while True:
+        await asyncio.sleep(max(1.0, timeout_seconds / 4))
+        try:
+            await poll_overdue_webhook_jobs(timeout_seconds)
+        except Exception:
+            logger.exception("Polling overdue try-on webhooks failed")
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if settings.DB_AUTO_MIGRATE:
+        await asyncio.to_thread(upgrade_database)
+    else:
+        # Migrations run once per deploy (`alembic upgrade head`); workers only verify.
+        check_schema_version(engine)
+
+    if settings.STALE_JOB_SECONDS > 0:
+        # Work a previous run left unfinished would otherwise show "processing" forever.
+        reaped = await reap_stale_jobs(settings.STALE_JOB_SECONDS)
+        if reaped:
+            logger.warning("Failed %d jobs and items interrupted by a restart", reaped)
+
+    if inference_executor.kind == "thread":
+        # Inference threads must never be the first to import rembg (see
+        # ml_service.import_ml_stack), so import it here even without a preload.
+        try:
+            ml_service.import_ml_stack()
+        except (ImportError, RuntimeError) as exc:
+            logger.warning("Segmentation is unavailable; uploads keep their background: %s", exc)
+
+    if settings.PRELOAD_SEGMENTATION_MODEL:
+        # Load the segmentation model once so the first upload is not a cold start.
+        await inference_executor.warm_up()
+
+    # One pooled keep-alive client serves every try-on for the life of the process.
+    vton_client.start()
+    tryon_prefetcher.start()
+
+    background_loops = []
+    if settings.JOB_HEARTBEAT_SECONDS > 0:
+        # Keeps another instance's startup reaper off the jobs this one is running.
+        background_loops.append(asyncio.create_task(_beat_running_jobs_periodically(settings.JOB_HEARTBEAT_SECONDS)))
+    if settings.BLOB_EVICTION_INTERVAL_SECONDS > 0:
+        background_loops.append(
+            asyncio.create_task(_evict_orphaned_blobs_periodically(settings.BLOB_EVICTION_INTERVAL_SECONDS))
+        )
+    if webhooks_enabled():
+        # Webhook-mode try-ons fall back to polling when their callback is late.
+        background_loops.append(
+            asyncio.create_task(_poll_overdue_webhooks_periodically(settings.VTON_WEBHOOK_TIMEOUT_SECONDS))
+        )
+
+    yield
+
+    for task in background_loops:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    inference_executor.shutdown(wait=False)
+    await tryon_prefetcher.aclose()
+    await storage.aclose()
+    await vton_client.aclose()
+    await async_engine.dispose()
+
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
+
+# Innermost of the middlewares below, so oversized-request 413s still get CORS headers and metrics.
+app.add_middleware(RequestSizeLimitMiddleware)
 
 allowed_origins = [origin.strip() for origin in settings.CORS_ALLOW_ORIGINS.split(",") if origin.strip()]
 app.add_middleware(
@@ -40,16 +124,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "X-Next-Cursor", "Server-Timing"],
 )
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
 
-# Serve uploaded files for the MVP
-os.makedirs("uploads", exist_ok=True)
-app.mount("/static", StaticFiles(directory="uploads"), name="static")
+# Serve uploaded files from local disk; remote backends hand out their own URLs.
+if settings.STORAGE_BACKEND == "local":
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    app.mount("/static", AssetStaticFiles(directory=settings.UPLOAD_DIR), name="static")
 
 # Include routers
 app.include_router(upload.router, prefix="/api", tags=["upload"])
 app.include_router(tryon.router, prefix="/api", tags=["tryon"])
 app.include_router(users.router, prefix="/api", tags=["users"])
+app.include_router(jobs.router, prefix="/api", tags=["jobs"])
 
 
 @app.get("/")
@@ -59,4 +148,18 @@ def read_root():
 
 @app.get("/health")
 def healthcheck():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "segmentation_model": inference_executor.model_status(),
+        "garment_classifier": ml_service.garment_classifier.describe(),
+        "tryon_cache": tryon_cache.stats(),
+        "tryon_layer_cache": tryon_layer_cache.stats(),
+        "tryon_prefetch": tryon_prefetcher.stats(),
+    }
+
+
+if settings.METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
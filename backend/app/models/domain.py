@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -20,6 +20,12 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     full_name = Column(String, nullable=False)
     avatar_image_url = Column(String, nullable=True)  # The base photo for VTON
+    # BLAKE2 of an avatar uploaded through the API (which try-on results are cached by);
+    # None for an external avatar URL, whose content the app can't vouch for.
+    avatar_content_hash = Column(String, nullable=True)
+    # Bumped by every closet write (services.closet.touch_closet); drives listing ETags.
+    closet_version = Column(Integer, nullable=False, default=0, server_default="0")
+    closet_updated_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     clothing_items = relationship("ClothingItem", back_populates="owner", cascade="all, delete-orphan")
@@ -28,15 +34,26 @@ class User(Base):
 
 class ClothingItem(Base):
     __tablename__ = "clothing_items"
+    # Closet listings: one owner's items, newest first.
+    __table_args__ = (Index("ix_clothing_items_owner_id_created_at", "owner_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     name = Column(String, nullable=True)
     image_url = Column(String, nullable=False)  # Processed transparent image
     original_image_url = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True, index=True)  # BLAKE2 of the uploaded bytes
     category = Column(Enum(CategoryEnum), nullable=False)
     color = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="ready", server_default="ready")  # processing, ready, failed
+    # Position of a cropped cutout on its uncropped canvas (services.ml_service.CutoutPlacement).
+    cutout_offset_x = Column(Integer, nullable=True)
+    cutout_offset_y = Column(Integer, nullable=True)
+    cutout_canvas_width = Column(Integer, nullable=True)
+    cutout_canvas_height = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # tombstone kept for delta sync
 
     owner = relationship("User", back_populates="clothing_items")
     photos = relationship(
@@ -53,19 +70,30 @@ class ClothingItem(Base):
 
 class ClothingItemPhoto(Base):
     __tablename__ = "clothing_item_photos"
+    # Photo loads for a page of items, in the relationship's order.
+    __table_args__ = (Index("ix_clothing_item_photos_item_id_created_at", "item_id", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
     item_id = Column(Integer, ForeignKey("clothing_items.id"), nullable=False)
     image_url = Column(String, nullable=False)
     original_image_url = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True, index=True)
     angle_label = Column(String, nullable=True)
+    cutout_offset_x = Column(Integer, nullable=True)
+    cutout_offset_y = Column(Integer, nullable=True)
+    cutout_canvas_width = Column(Integer, nullable=True)
+    cutout_canvas_height = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
     item = relationship("ClothingItem", back_populates="photos")
 
 
 class Outfit(Base):
     __tablename__ = "outfits"
+    # Try-on cache lookups and pending-job coalescing filter on both.
+    __table_args__ = (Index("ix_outfits_owner_id_cache_key", "owner_id", "cache_key"),)
 
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -74,6 +102,8 @@ class Outfit(Base):
     shoes_id = Column(Integer, ForeignKey("clothing_items.id"), nullable=True)
     accessory_id = Column(Integer, ForeignKey("clothing_items.id"), nullable=True)
     generated_image_url = Column(String, nullable=True)  # VTON result
+    status = Column(String, nullable=False, default="ready", server_default="ready")  # pending, ready, failed
+    cache_key = Column(String, nullable=True, index=True)  # see services.tryon_cache.tryon_cache_key
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     owner = relationship("User", back_populates="outfits")
@@ -81,3 +111,51 @@ class Outfit(Base):
     bottom = relationship("ClothingItem", foreign_keys=[bottom_id], back_populates="outfit_bottoms")
     shoes = relationship("ClothingItem", foreign_keys=[shoes_id], back_populates="outfit_shoes")
     accessory = relationship("ClothingItem", foreign_keys=[accessory_id], back_populates="outfit_accessories")
+
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+
+    id = Column(String, primary_key=True)  # UUID4 hex
+    kind = Column(String, nullable=False)  # "upload" or "tryon"
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    item_id = Column(Integer, ForeignKey("clothing_items.id"), nullable=True)
+    outfit_id = Column(Integer, ForeignKey("outfits.id"), nullable=True)
+    external_id = Column(String, nullable=True, index=True)  # provider prediction id
+    status = Column(String, nullable=False, default="pending")  # pending, processing, succeeded, failed
+    progress = Column(Integer, nullable=False, default=0)
+    message = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    # Refreshed by the instance running the job; the reaper leaves jobs with a live heartbeat alone.
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ClosetChange(Base):
+    """
+    Append-only log of closet writes; its ids are the delta-sync cursor. Rows
+    are only written by services.closet.record_item_changes, which serializes
+    them per owner so ids commit in order.
+    """
+
+    __tablename__ = "closet_changes"
+    __table_args__ = (Index("ix_closet_changes_owner_id_id", "owner_id", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    item_id = Column(Integer, ForeignKey("clothing_items.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BlobAccess(Base):
+    """
+    Last dedupe-cache hit per stored blob key, for LRU eviction of orphans.
+    Object mtimes only record the write (and S3 has no cheap way to bump
+    them), so eviction ranks a blob by the later of the two.
+    """
+
+    __tablename__ = "blob_access"
+
+    key = Column(String, primary_key=True)
+    last_used = Column(Float, nullable=False)  # POSIX timestamp, like StoredObject.last_used
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+
+# Latest migration in migrations/versions; bump it with every new revision
+# (tests/test_migrations.py fails until it matches the Alembic head).
+SCHEMA_REVISION = "0005"
+
+ALEMBIC_INI = Path(__file__).resolve().parents[1] / "alembic.ini"
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def current_revision(engine: Engine) -> str | None:
+    try:
+        with engine.connect() as connection:
+            return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except DBAPIError:
+        return None  # no alembic_version table: never migrated
+
+
+def check_schema_version(engine: Engine) -> None:
+    """One-query startup check that the database was migrated to this release's schema."""
+    revision = current_revision(engine)
+    if revision != SCHEMA_REVISION:
+        raise SchemaVersionError(
+            f"Database schema is at revision {revision or 'none'}, this release needs {SCHEMA_REVISION}. "
+            "Run `alembic upgrade head` from backend/ before starting the API."
+        )
+
+
+def upgrade_database(database_url: str | None = None) -> None:
+    """``alembic upgrade head`` in-process, for dev auto-migration, tests and benchmarks."""
+    # Alembic is a deploy-time tool; keep it out of the API's import path.
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("sqlalchemy.url", (database_url or settings.DATABASE_URL).replace("%", "%%"))
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
@@ -1,5 +1,7 @@
 from datetime import datetime
-from pydantic import BaseModel, EmailStr, ConfigDict
+from typing import Literal
+
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
 
 
 class UserBootstrapRequest(BaseModel):
@@ -17,11 +19,23 @@ class UserResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class CutoutPlacementResponse(BaseModel):
+    # The cutout is cropped to the garment; draw it at (offset_x, offset_y) on a
+    # canvas_width x canvas_height canvas to line it up with the original photo.
+    offset_x: int
+    offset_y: int
+    canvas_width: int
+    canvas_height: int
+
+
 class ClothingItemPhotoResponse(BaseModel):
     id: int
     item_id: int
     original_url: str | None = None
     processed_url: str
+    thumbnail_url: str | None = None
+    srcset: str | None = None
+    placement: CutoutPlacementResponse | None = None
     angle_label: str | None = None
     created_at: datetime
 
@@ -32,21 +46,78 @@ class ClothingItemResponse(BaseModel):
     name: str | None = None
     original_url: str | None = None
     processed_url: str
+    thumbnail_url: str | None = None
+    srcset: str | None = None
+    placement: CutoutPlacementResponse | None = None
     category: str
     color: str | None = None
+    status: str = "ready"
     created_at: datetime
+    updated_at: datetime | None = None
     photos: list[ClothingItemPhotoResponse] = []
 
 
+class ClosetChangesResponse(BaseModel):
+    # Pass back as ``since`` on the next sync.
+    cursor: int
+    has_more: bool
+    # Created or updated items, each with its full current photo list.
+    items: list[ClothingItemResponse]
+    deleted_item_ids: list[int]
+
+
 class UploadResponse(BaseModel):
     item: ClothingItemResponse
     message: str
 
 
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    progress: int
+    message: str | None = None
+    error: str | None = None
+    item_id: int | None = None
+    outfit_id: int | None = None
+    created_at: datetime
+    updated_at: datetime | None = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UploadAcceptedResponse(BaseModel):
+    job: JobResponse
+    item: ClothingItemResponse
+    status_url: str
+
+
 class ItemUpdateRequest(BaseModel):
     name: str
 
 
+class ItemBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    item_id: int | None = None  # update and delete
+    # create: a new item from a photo already in the owner's closet, e.g. one angle split off
+    photo_id: int | None = None
+    # create and update; omitted fields are left unchanged (create copies them from the source item)
+    name: str | None = None
+    category: str | None = None
+    color: str | None = None
+
+
+class ItemBatchRequest(BaseModel):
+    owner_id: int
+    operations: list[ItemBatchOperation] = Field(min_length=1)
+
+
+class ItemBatchResponse(BaseModel):
+    # Created and updated items in their final state, in operation order.
+    items: list[ClothingItemResponse]
+    deleted_item_ids: list[int]
+
+
 class TryOnRequest(BaseModel):
     user_id: int
     top_id: int | None = None
@@ -57,5 +128,26 @@ class TryOnRequest(BaseModel):
 
 class TryOnResponse(BaseModel):
     outfit_id: int
-    generated_image_url: str
+    generated_image_url: str | None = None
+    status: str = "ready"
     message: str
+
+
+class TryOnPrefetchRequest(TryOnRequest):
+    # Item ids in carousel order per slot, e.g. {"top": [4, 9, 2]}.
+    carousels: dict[str, list[int]] = {}
+    radius: int = Field(default=1, ge=1, le=3)
+
+
+class TryOnPrefetchResponse(BaseModel):
+    queued: int
+    cached: int
+    over_budget: int
+    cancelled: int
+
+
+class TryOnAcceptedResponse(BaseModel):
+    job: JobResponse
+    outfit_id: int
+    status: str
+    status_url: str
@@ -0,0 +1,176 @@
+"""
+HTTP delivery of stored blobs from local disk (``/static`` and derivatives).
+
+Blob keys are content-addressed (``<digest>_proc.png``, ``<digest>_proc_w320.webp``),
+so the bytes behind a URL never change. Responses are therefore cacheable for
+STATIC_CACHE_MAX_AGE_SECONDS as ``immutable``, and their strong ETag comes from
+the key and size rather than the file's mtime, which moves whenever the same
+content is written again. Any conditional request is answered with ``304``.
+
+A ``<file>.br`` or ``<file>.gz`` next to a blob is served instead when the client
+accepts that encoding. Full responses go through ``FileResponse``, which hands
+the path to the server (``http.response.pathsend``) where supported; single
+byte ranges are answered with ``206``.
+"""
+
+import hashlib
+import os
+import re
+from email.utils import formatdate
+from mimetypes import guess_type
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+# (Content-Encoding, file suffix), in order of preference.
+PRECOMPRESSED_VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def cache_control() -> str:
+    max_age = settings.STATIC_CACHE_MAX_AGE_SECONDS
+    return f"public, max-age={max_age}, immutable" if max_age > 0 else "no-cache"
+
+
+def asset_etag(key: str, size: int, encoding: str | None = None) -> str:
+    digest = hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+    return f'"{digest}-{size:x}{f"-{encoding}" if encoding else ""}"'
+
+
+def _accepted_encodings(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _select_variant(path: str, accept_encoding: str) -> tuple[str, os.stat_result, str | None, bool]:
+    """The file to send, its stat, its Content-Encoding and whether any variant exists."""
+    accepted = _accepted_encodings(accept_encoding)
+    chosen: tuple[str, os.stat_result, str | None] | None = None
+    has_variants = False
+    for encoding, suffix in PRECOMPRESSED_VARIANTS:
+        try:
+            variant_stat = os.stat(path + suffix)
+        except OSError:
+            continue
+        has_variants = True
+        if chosen is None and encoding in accepted:
+            chosen = (path + suffix, variant_stat, encoding)
+    if chosen is None:
+        chosen = (path, os.stat(path), None)
+    return (*chosen, has_variants)
+
+
+def _byte_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """Inclusive (start, end) of a single ``bytes=`` range; raises ValueError if unsatisfiable."""
+    match = _RANGE.fullmatch(range_header.strip())
+    if match is None:
+        return None  # multiple or malformed ranges: send the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(range_header)
+    return start, end
+
+
+class FileRangeResponse(FileResponse):
+    """``206 Partial Content`` with one byte range of a file."""
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict[str, str], media_type: str):
+        super().__init__(path, status_code=206, headers=headers, media_type=media_type)
+        self.start, self.end = start, end
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining -= len(chunk)
+                more_body = remaining > 0 and bool(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                if not chunk:
+                    break
+
+
+async def asset_response(
+    path: str, key: str, request_headers: Headers, media_type: str | None = None
+) -> Response:
+    """Serve the stored blob ``key`` at ``path`` with immutable caching, validators and ranges."""
+    media_type = media_type or guess_type(key)[0] or "application/octet-stream"
+    send_path, stat_result, encoding, has_variants = await anyio.to_thread.run_sync(
+        _select_variant, path, request_headers.get("accept-encoding", "")
+    )
+    etag = asset_etag(key, stat_result.st_size, encoding)
+    headers = {
+        "etag": etag,
+        "cache-control": cache_control(),
+        "accept-ranges": "bytes",
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+    }
+    if has_variants:
+        headers["vary"] = "Accept-Encoding"
+    if encoding:
+        headers["content-encoding"] = encoding
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return NotModifiedResponse(Headers(headers))
+    elif "if-modified-since" in request_headers:
+        # The content under a key never changes, so any earlier copy is current.
+        return NotModifiedResponse(Headers(headers))
+
+    range_header = request_headers.get("range")
+    if range_header and request_headers.get("if-range", etag) == etag:
+        try:
+            byte_range = _byte_range(range_header, stat_result.st_size)
+        except ValueError:
+            return Response(
+                status_code=416, headers={**headers, "content-range": f"bytes */{stat_result.st_size}"}
+            )
+        if byte_range is not None:
+            return FileRangeResponse(send_path, *byte_range, stat_result.st_size, headers, media_type)
+
+    return FileResponse(send_path, headers=headers, media_type=media_type, stat_result=stat_result)
+
+
+class AssetStaticFiles(StaticFiles):
+    """``StaticFiles`` whose file responses go through ``asset_response``."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200) -> Response:
+        # Validators are handled in get_response with the key-based ETag.
+        return FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if isinstance(response, FileResponse) and response.status_code == 200:
+            key = os.path.relpath(response.path, self.directory)
+            return await asset_response(str(response.path), key, Headers(scope=scope))
+        return response
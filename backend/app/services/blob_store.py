@@ -0,0 +1,109 @@
+import hashlib
+import time
+from collections.abc import Iterable, Mapping
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import STATIC_URL_PREFIX, settings
+from app.database import AsyncSessionLocal
+from app.models.domain import BlobAccess, ClothingItem, ClothingItemPhoto, User
+from app.services.derivatives import derivative_key, derivative_widths
+from app.services.storage import StorageBackend, storage
+
+DIGEST_SIZE = 16
+
+
+def content_digest(data: bytes) -> str:
+    """Stable content key for uploaded bytes (BLAKE2b, 128-bit hex)."""
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def _record_blob_uses(db: Session, keys: set[str], used_at: float) -> None:
+    existing = set(db.scalars(select(BlobAccess.key).where(BlobAccess.key.in_(keys))))
+    if existing:
+        db.execute(update(BlobAccess).where(BlobAccess.key.in_(existing)).values(last_used=used_at))
+    db.add_all(BlobAccess(key=key, last_used=used_at) for key in keys - existing)
+
+
+async def record_blob_use(*keys: str) -> None:
+    """Mark stored blobs as just used (a dedupe-cache hit) for LRU eviction."""
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(_record_blob_uses, set(keys), time.time())
+        try:
+            await db.commit()
+        except IntegrityError:
+            pass  # a concurrent hit inserted the row first, with an equally recent time
+
+
+async def evict_orphans(
+    backend: StorageBackend,
+    referenced_keys: Iterable[str],
+    max_orphan_bytes: int,
+    grace_seconds: float = 0,
+    last_used: Mapping[str, float] | None = None,
+) -> list[str]:
+    """
+    Delete least-recently-used blobs that no row references until the
+    remaining orphans fit in ``max_orphan_bytes``.
+
+    Orphans are kept as a dedupe cache for re-uploads; blobs used within
+    ``grace_seconds`` are never evicted so in-flight uploads are safe. A
+    blob's last use is its write time or its entry in ``last_used``,
+    whichever is later.
+    """
+    referenced = set(referenced_keys)
+    last_used = last_used or {}
+    now = time.time()
+    orphans = []
+    for stored in await backend.list_objects():
+        used_at = max(stored.last_used, last_used.get(stored.key, 0.0))
+        if stored.key not in referenced and now - used_at >= grace_seconds:
+            orphans.append((used_at, stored.size, stored.key))
+    orphans.sort()
+
+    orphan_bytes = sum(size for _, size, _ in orphans)
+    evicted: list[str] = []
+    for _, size, key in orphans:
+        if orphan_bytes <= max_orphan_bytes:
+            break
+        await backend.delete(key)
+        orphan_bytes -= size
+        evicted.append(key)
+    return evicted
+
+
+def referenced_blob_keys(db: Session) -> set[str]:
+    """Keys of every blob (and its derivatives) still pointed at by a clothing item, photo or avatar."""
+    keys: set[str] = set()
+    for model in (ClothingItem, ClothingItemPhoto):
+        for image_url, original_image_url in db.query(model.image_url, model.original_image_url):
+            for url in (image_url, original_image_url):
+                if url and url.startswith(STATIC_URL_PREFIX):
+                    keys.add(url[len(STATIC_URL_PREFIX):])
+    for (avatar_url,) in db.query(User.avatar_image_url).filter(User.avatar_image_url.startswith(STATIC_URL_PREFIX)):
+        keys.add(avatar_url[len(STATIC_URL_PREFIX):])
+
+    widths = derivative_widths()
+    keys.update([derivative_key(key, width) for key in keys for width in widths])
+    return keys
+
+
+async def evict_orphaned_blobs() -> list[str]:
+    """Apply the configured size-bounded LRU policy to unreferenced blobs."""
+    async with AsyncSessionLocal() as db:
+        referenced = await db.run_sync(referenced_blob_keys)
+        last_used = dict((await db.execute(select(BlobAccess.key, BlobAccess.last_used))).all())
+    evicted = await evict_orphans(
+        storage,
+        referenced,
+        max_orphan_bytes=settings.BLOB_CACHE_MAX_ORPHAN_BYTES,
+        grace_seconds=settings.BLOB_ORPHAN_GRACE_SECONDS,
+        last_used=last_used,
+    )
+    if evicted:
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(BlobAccess).where(BlobAccess.key.in_(evicted)))
+            await db.commit()
+    return evicted
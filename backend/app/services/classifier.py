@@ -0,0 +1,261 @@
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from PIL import Image
+
+if TYPE_CHECKING:
+    import onnxruntime as ort
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+GARMENT_CATEGORIES = ("top", "bottom", "outerwear", "shoes", "accessory")
+DEFAULT_CATEGORY = "top"
+
+SILHOUETTE_SIDE = 32
+COLOR_SAMPLE_SIDE = 64
+_IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32).reshape(3, 1, 1)
+_IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(3, 1, 1)
+
+# Linear head over silhouette features (see ``silhouette_features``), one row
+# per category: bias, log aspect, fill, top/middle/bottom width, lower centre
+# gap, mean runs per row in the lower half. The weights are a hand-set
+# heuristic, not fit to labelled data, and its accuracy on real garment photos
+# is unmeasured: it pre-fills a category the user is expected to correct. Real
+# classification needs a trained model via GARMENT_CLASSIFIER_MODEL.
+_SILHOUETTE_WEIGHTS = np.array(
+    [
+        [2.58, 1.09, 0.58, 7.16, -1.79, -3.14, -0.23, -2.69],
+        [-0.46, 5.14, 1.49, 0.42, 0.41, 3.84, 1.6, -1.78],
+        [-3.94, -0.13, -0.74, 0.45, 0.61, -3.55, -1.32, 4.73],
+        [-2.04, -5.39, 1.16, -1.18, 4.47, -0.46, 0.0, -2.12],
+        [3.85, -0.7, -2.49, -6.84, -3.7, 3.31, -0.04, 1.86],
+    ],
+    dtype=np.float32,
+)
+
+# Named colors reported in ``ClothingItem.color``.
+NAMED_COLORS = {
+    "black": (20, 20, 20),
+    "white": (240, 240, 240),
+    "gray": (128, 128, 128),
+    "navy": (25, 35, 80),
+    "blue": (40, 90, 200),
+    "light blue": (140, 180, 230),
+    "red": (200, 30, 40),
+    "burgundy": (110, 20, 40),
+    "pink": (235, 150, 180),
+    "orange": (240, 130, 30),
+    "yellow": (240, 210, 50),
+    "green": (40, 140, 60),
+    "olive": (110, 110, 50),
+    "brown": (110, 70, 40),
+    "beige": (215, 195, 160),
+    "purple": (110, 50, 150),
+}
+_NAMED_COLOR_NAMES = list(NAMED_COLORS)
+_NAMED_COLOR_VALUES = np.array(list(NAMED_COLORS.values()), dtype=np.float32)
+
+
+def _opaque_mask(cutout: Image.Image) -> Image.Image | None:
+    """Binary alpha mask of a cutout, or None when it has no usable transparency."""
+    if "A" not in cutout.getbands():
+        return None
+    mask = cutout.getchannel("A").point(lambda alpha: 255 if alpha > 127 else 0)
+    bbox = mask.getbbox()
+    if bbox is None or bbox == (0, 0, *cutout.size):
+        # Fully transparent or fully opaque: segmentation did not isolate a garment.
+        return None
+    return mask.crop(bbox)
+
+
+def silhouette_features(cutout: Image.Image) -> np.ndarray:
+    """
+    Shape descriptor of the garment's alpha mask. Returns zeros (which the
+    head maps to DEFAULT_CATEGORY) when the cutout has no silhouette.
+    """
+    mask = _opaque_mask(cutout)
+    if mask is None:
+        return np.zeros(_SILHOUETTE_WEIGHTS.shape[1], dtype=np.float32)
+
+    aspect = np.log(mask.height / mask.width)
+    grid = np.asarray(mask.resize((SILHOUETTE_SIDE, SILHOUETTE_SIDE), Image.BILINEAR)) > 127
+    row_fill = grid.mean(axis=1)
+    third = SILHOUETTE_SIDE // 3
+    lower = grid[SILHOUETTE_SIDE // 2:]
+    centre = slice(SILHOUETTE_SIDE // 2 - 2, SILHOUETTE_SIDE // 2 + 2)
+    # Rows with material on both sides of an empty centre, e.g. trouser legs.
+    centre_gap = (
+        ~lower[:, centre].any(axis=1) & lower[:, : centre.start].any(axis=1) & lower[:, centre.stop:].any(axis=1)
+    ).mean()
+    runs = (np.diff(lower.astype(np.int8), axis=1) == 1).sum(axis=1) + lower[:, 0]
+    return np.array(
+        [
+            1.0,
+            aspect,
+            grid.mean(),
+            row_fill[:third].mean(),
+            row_fill[third:-third].mean(),
+            row_fill[-third:].mean(),
+            centre_gap,
+            runs.mean(),
+        ],
+        dtype=np.float32,
+    )
+
+
+def dominant_color(cutout: Image.Image) -> str | None:
+    """
+    Name of the most common color among the garment's opaque pixels, from a
+    small downsampled copy bucketed into a 8x8x8 RGB histogram.
+    """
+    sample = cutout.convert("RGBA")
+    sample.thumbnail((COLOR_SAMPLE_SIDE, COLOR_SAMPLE_SIDE), Image.BILINEAR)
+    pixels = np.asarray(sample).reshape(-1, 4)
+    pixels = pixels[pixels[:, 3] > 127, :3]
+    if not len(pixels):
+        return None
+
+    buckets = (pixels >> 5).astype(np.int32)
+    bucket_ids = buckets[:, 0] * 64 + buckets[:, 1] * 8 + buckets[:, 2]
+    counts = np.bincount(bucket_ids, minlength=512)
+    top_bucket = int(counts.argmax())
+    representative = pixels[bucket_ids == top_bucket].mean(axis=0)
+
+    # "Redmean" weighting approximates perceptual distance without a Lab conversion.
+    red_mean = (representative[0] + _NAMED_COLOR_VALUES[:, 0]) / 2
+    delta = _NAMED_COLOR_VALUES - representative
+    distance = (
+        (2 + red_mean / 256) * delta[:, 0] ** 2
+        + 4 * delta[:, 1] ** 2
+        + (2 + (255 - red_mean) / 256) * delta[:, 2] ** 2
+    )
+    return _NAMED_COLOR_NAMES[int(distance.argmin())]
+
+
+class GarmentClassifier:
+    """
+    Predicts a garment category from cutouts produced by background removal.
+
+    ``prepare`` runs next to segmentation on the already decoded cutout and
+    yields a small array; ``predict`` scores a whole batch of them at once.
+    With GARMENT_CLASSIFIER_MODEL set, an ONNX image classifier (NCHW float
+    input, logits over GARMENT_CLASSIFIER_LABELS) is loaded once per process;
+    otherwise, or if that model cannot be loaded, the built-in silhouette
+    heuristic is used. Inference worker processes don't decide for themselves:
+    they are ``pin``-ned to the parent's choice.
+    """
+
+    def __init__(self, model_path: str | None, labels: list[str], input_size: int = 224):
+        unknown = set(labels) - set(GARMENT_CATEGORIES)
+        if unknown:
+            raise ValueError(f"Unsupported garment classifier labels: {sorted(unknown)}")
+        self.model_path = model_path
+        self.labels = labels if model_path else list(GARMENT_CATEGORIES)
+        self._model_labels = labels
+        self.input_size = input_size
+        self._can_fall_back = True
+        self._session: "ort.InferenceSession | None" = None
+        self._lock = threading.Lock()
+        self.error: str | None = None
+
+    @property
+    def backend(self) -> str:
+        return "onnx" if self.model_path else "silhouette"
+
+    def describe(self) -> dict:
+        return {
+            "backend": self.backend,
+            # The silhouette head is hand-tuned, not trained; see _SILHOUETTE_WEIGHTS.
+            "heuristic": self.backend == "silhouette",
+            "error": self.error,
+        }
+
+    def pin(self, model_path: str | None) -> None:
+        """
+        Use ``model_path`` (None for the silhouette head) without falling back.
+        Inference workers are pinned to the model the parent process loaded, so
+        a worker that can't load it fails its work instead of answering from a
+        different head than its siblings.
+        """
+        self.model_path = model_path
+        self.labels = list(self._model_labels) if model_path else list(GARMENT_CATEGORIES)
+        self._can_fall_back = False
+
+    def _get_session(self) -> "ort.InferenceSession":
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import onnxruntime as ort
+
+                    if not Path(self.model_path).is_file():
+                        raise FileNotFoundError(f"Garment classifier model not found: {self.model_path}")
+                    self._session = ort.InferenceSession(self.model_path, providers=["CPUExecutionProvider"])
+        return self._session
+
+    def _model_loaded(self) -> bool:
+        """
+        Whether the ONNX model is in use. One that fails to load (missing file,
+        no onnxruntime, bad export) is dropped for the silhouette head for the
+        life of the process, so uploads keep being categorized.
+        """
+        if not self.model_path:
+            return False
+        if not self._can_fall_back:
+            self._get_session()
+            return True
+        try:
+            self._get_session()
+        except Exception as exc:
+            logger.warning("Garment classifier model unavailable, using the silhouette head: %s", exc)
+            self.error = str(exc)
+            self.model_path = None
+            self.labels = list(GARMENT_CATEGORIES)
+            return False
+        return True
+
+    def warm_up(self) -> bool:
+        """Load the model now; returns False (after falling back, if allowed) if it is unavailable."""
+        try:
+            return self._model_loaded() or self.error is None
+        except Exception as exc:
+            self.error = str(exc)
+            return False
+
+    def prepare(self, cutout: Image.Image) -> np.ndarray:
+        if not self._model_loaded():
+            return silhouette_features(cutout)
+
+        # Composite onto white so transparent regions look like a product shot.
+        canvas = Image.new("RGB", cutout.size, (255, 255, 255))
+        canvas.paste(cutout, mask=cutout.getchannel("A") if "A" in cutout.getbands() else None)
+        canvas = canvas.resize((self.input_size, self.input_size), Image.BILINEAR, reducing_gap=2.0)
+        tensor = np.asarray(canvas, dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return (tensor - _IMAGENET_MEAN) / _IMAGENET_STD
+
+    def predict(self, batch: list[np.ndarray]) -> list[str]:
+        if not batch:
+            return []
+        inputs = np.stack(batch).astype(np.float32, copy=False)
+        if self.model_path:
+            session = self._get_session()
+            scores = session.run(None, {session.get_inputs()[0].name: inputs})[0]
+        else:
+            scores = inputs @ _SILHOUETTE_WEIGHTS.T
+            # An all-zero descriptor means there was no silhouette to classify.
+            scores[~inputs.any(axis=1)] = 0
+        predictions = []
+        for row in scores:
+            predictions.append(self.labels[int(row.argmax())] if row.any() else DEFAULT_CATEGORY)
+        return predictions
+
+
+garment_classifier = GarmentClassifier(
+    model_path=settings.GARMENT_CLASSIFIER_MODEL,
+    labels=[label.strip() for label in settings.GARMENT_CLASSIFIER_LABELS.split(",") if label.strip()],
+    input_size=settings.GARMENT_CLASSIFIER_INPUT_SIZE,
+)
@@ -0,0 +1,108 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.orm import Query, Session
+
+from app.models.domain import ClosetChange, ClothingItem, User
+
+
+def touch_closet(db: Session, owner_id: int) -> None:
+    """
+    Bump the owner's closet version in the caller's transaction. Every write
+    that changes a closet listing calls this, so the version (and with it the
+    listing's ETag) changes exactly when the listing does.
+    """
+    db.execute(
+        update(User)
+        .where(User.id == owner_id)
+        .values(closet_version=User.closet_version + 1, closet_updated_at=datetime.now(timezone.utc))
+    )
+
+
+def record_item_change(db: Session, owner_id: int, item_id: int) -> None:
+    """Log that an item (or one of its photos) was created, updated or deleted, and bump the closet version."""
+    record_item_changes(db, owner_id, [item_id])
+
+
+def record_item_changes(db: Session, owner_id: int, item_ids: list[int]) -> None:
+    """
+    ``record_item_change`` for many items: one version bump and one multi-row insert.
+
+    Change ids are the delta-sync cursor, so for one owner they must become
+    visible in id order; otherwise a reader could move its cursor past an id
+    whose transaction commits later. The version bump comes first and row-locks
+    the owner until commit, so each owner's change-log writers allocate and
+    commit their ids one transaction at a time.
+    """
+    if not item_ids:
+        return
+    touch_closet(db, owner_id)
+    db.execute(insert(ClosetChange), [{"owner_id": owner_id, "item_id": item_id} for item_id in item_ids])
+
+
+def after_item(query: Query, item_id: int) -> Query:
+    """
+    Keyset page boundary for the ``(created_at desc, id desc)`` closet order.
+
+    The boundary row's ``created_at`` is read in SQL rather than round-tripped
+    through the cursor, so it compares exactly however the backend stores it.
+    """
+    anchor = select(ClothingItem.created_at).where(ClothingItem.id == item_id).scalar_subquery()
+    return query.filter(
+        or_(
+            ClothingItem.created_at < anchor,
+            and_(ClothingItem.created_at == anchor, ClothingItem.id < item_id),
+        )
+    )
+
+
+def closet_etag(owner_id: int, version: int, variant: dict) -> str:
+    """Weak validator for one closet listing: owner, closet version and the query that shaped it."""
+    shape = "&".join(f"{name}={variant[name]}" for name in sorted(variant))
+    digest = hashlib.blake2b(shape.encode(), digest_size=6).hexdigest()
+    return f'W/"closet-{owner_id}-{version}-{digest}"'
+
+
+def url_window_start(url_lifetime_seconds: int | None) -> datetime | None:
+    """
+    Start of the current window for listings that embed expiring (presigned)
+    asset URLs, or None when URLs don't expire. Windows last half the URL
+    lifetime and a listing's validators change with each one, so a 304 only
+    confirms a copy rendered in the same window, whose URLs still have at
+    least half their lifetime left.
+    """
+    if not url_lifetime_seconds:
+        return None
+    window = max(1, url_lifetime_seconds // 2)
+    now = int(time.time())
+    return datetime.fromtimestamp(now - now % window, timezone.utc)
+
+
+def http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def not_modified(
+    etag: str, last_modified: datetime | None, if_none_match: str | None, if_modified_since: str | None
+) -> bool:
+    """RFC 9110 conditional GET: If-None-Match (weak comparison) wins over If-Modified-Since."""
+    if if_none_match is not None:
+        opaque_tag = etag.removeprefix("W/")
+        return any(
+            candidate == "*" or candidate.removeprefix("W/") == opaque_tag
+            for candidate in (part.strip() for part in if_none_match.split(","))
+        )
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
@@ -0,0 +1,70 @@
+import io
+from pathlib import PurePosixPath
+
+from PIL import Image
+
+from app.core.config import STATIC_URL_PREFIX, settings
+
+DERIVATIVE_MEDIA_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+
+
+def derivative_widths() -> list[int]:
+    return sorted({int(width) for width in settings.DERIVATIVE_WIDTHS.split(",") if width.strip()})
+
+
+def thumbnail_width() -> int | None:
+    """THUMBNAIL_WIDTH, or the smallest derivative width; None when DERIVATIVE_WIDTHS is empty."""
+    widths = derivative_widths()
+    if not widths:
+        return None
+    return settings.THUMBNAIL_WIDTH if settings.THUMBNAIL_WIDTH in widths else widths[0]
+
+
+def derivative_key(source_key: str, width: int, image_format: str | None = None) -> str:
+    """Blob key of the resized copy of ``source_key`` (e.g. ``abc_proc_w320.webp``)."""
+    return f"{PurePosixPath(source_key).stem}_w{width}.{image_format or settings.DERIVATIVE_FORMAT}"
+
+
+def derivative_url(source_key: str, width: int) -> str:
+    return f"/api/derivatives/{width}/{source_key}"
+
+
+def derivative_fields(image_url: str | None, full_url: str | None = None) -> dict[str, str | None]:
+    """
+    ``thumbnail_url`` and ``srcset`` for a stored ``/static/...`` image, if any.
+    With no DERIVATIVE_WIDTHS configured the thumbnail is ``full_url``, the
+    full cutout as clients fetch it, and there is no srcset.
+    """
+    if not image_url or not image_url.startswith(STATIC_URL_PREFIX):
+        return {"thumbnail_url": None, "srcset": None}
+    width = thumbnail_width()
+    if width is None:
+        return {"thumbnail_url": full_url, "srcset": None}
+    source_key = image_url[len(STATIC_URL_PREFIX):]
+    srcset = ", ".join(f"{derivative_url(source_key, width)} {width}w" for width in derivative_widths())
+    return {"thumbnail_url": derivative_url(source_key, width), "srcset": srcset}
+
+
+def render_derivatives(image_bytes: bytes, widths: list[int], image_format: str) -> dict[int, bytes]:
+    """
+    Decode once and encode a copy per width, largest first so every resize
+    starts from the smallest image that is still big enough.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    if image.mode not in {"RGB", "RGBA"}:
+        image = image.convert("RGBA")
+
+    rendered: dict[int, bytes] = {}
+    current = image
+    for width in sorted(widths, reverse=True):
+        if current.width > width:
+            height = max(1, round(current.height * width / current.width))
+            current = current.resize((width, height), Image.LANCZOS, reducing_gap=2.0)
+        stream = io.BytesIO()
+        if image_format == "avif":
+            current.save(stream, format="AVIF", quality=60)
+        else:
+            current.save(stream, format="WEBP", quality=80, method=4)
+        rendered[width] = stream.getvalue()
+    return rendered
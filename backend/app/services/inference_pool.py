@@ -0,0 +1,168 @@
+import asyncio
+import contextlib
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.services import ml_service
+from app.services.metrics import registry
+
+
+class InferenceQueueFullError(RuntimeError):
+    """Raised when the inference executor has no free worker or queue slot."""
+
+
+class InferenceExecutor:
+    """
+    Bounded executor for CPU-heavy image inference.
+
+    Work runs on a thread or process pool so async request handlers never block
+    the event loop. At most ``max_workers + queue_size`` jobs are admitted at a
+    time; further submissions are rejected immediately so callers can shed load.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = 2, queue_size: int = 8):
+        if kind not in {"thread", "process"}:
+            raise ValueError(f"Unsupported inference executor kind: {kind!r}")
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.capacity = self.max_workers + max(0, queue_size)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool: Executor | None = None
+        self._worker_model_status: list[dict] = []
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_pool(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.kind == "process":
+                    # The classifier is settled once here and every worker is pinned to it,
+                    # so workers that disagree on loading it can't mix label models.
+                    ml_service.garment_classifier.warm_up()
+                    # Spawned workers avoid inheriting ONNX runtime threads from the parent.
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=ml_service.init_worker,
+                        initargs=(ml_service.garment_classifier.model_path,),
+                    )
+                else:
+                    # Threads share the parent's session; ONNX runtime releases the GIL.
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="inference",
+                    )
+            return self._pool
+
+    def _acquire_slots(self, count: int = 1) -> None:
+        with self._lock:
+            if self._pending + count > self.capacity:
+                raise InferenceQueueFullError("Image processing is at capacity. Please retry shortly.")
+            self._pending += count
+
+    def _release_slot(self, _future: Any = None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run ``fn(*args)`` on the pool, raising InferenceQueueFullError when saturated."""
+        self._acquire_slots()
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BaseException:
+            self._release_slot()
+            raise
+        # Release on completion rather than on await exit so cancelled callers keep
+        # counting against capacity until the worker actually finishes.
+        future.add_done_callback(self._release_slot)
+        return await asyncio.wrap_future(future)
+
+    async def map(self, fn: Callable[..., Any], items: list[Any], *args: Any) -> list[Any]:
+        """
+        Run ``fn(item, *args)`` for every item in parallel on the pool.
+
+        The batch is admitted or rejected as a whole, so it may not exceed the
+        executor's capacity. Results come back in input order, with exceptions
+        raised by ``fn`` returned in place of a result.
+        """
+        if not items:
+            return []
+        if len(items) > self.capacity:
+            raise ValueError(f"A batch of {len(items)} exceeds the inference capacity of {self.capacity}.")
+        self._acquire_slots(len(items))
+        pool = self._get_pool()
+        futures = []
+        try:
+            for item in items:
+                future = pool.submit(fn, item, *args)
+                future.add_done_callback(self._release_slot)
+                futures.append(future)
+        except BaseException:
+            for _ in range(len(items) - len(futures)):
+                self._release_slot()
+            raise
+        return await asyncio.gather(*(asyncio.wrap_future(future) for future in futures), return_exceptions=True)
+
+    async def warm_up(self) -> None:
+        """Load the segmentation model in every worker before traffic arrives."""
+        if self.kind == "thread":
+            # Thread workers share this process's session, so load it once here. rembg
+            # is imported on this (the main) thread first; see ml_service.import_ml_stack.
+            with contextlib.suppress(ImportError, RuntimeError):
+                ml_service.import_ml_stack()
+            await asyncio.to_thread(ml_service.warm_up)
+            return
+        pool = self._get_pool()
+        futures = [pool.submit(ml_service.warm_up) for _ in range(self.max_workers)]
+        self._worker_model_status = [await asyncio.wrap_future(future) for future in futures]
+
+    def model_status(self) -> dict:
+        """Report segmentation model warm-up state for health checks."""
+        if self.kind == "thread":
+            return ml_service.session_manager.describe()
+        if not self._worker_model_status:
+            return {"model": ml_service.session_manager.model_name, "state": "cold"}
+        # Report the least-ready worker so a failed load is never masked.
+        for state in ("failed", "loading", "cold"):
+            for status in self._worker_model_status:
+                if status["state"] == state:
+                    return status
+        return self._worker_model_status[0]
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+inference_executor = InferenceExecutor(
+    kind=settings.INFERENCE_EXECUTOR,
+    max_workers=settings.INFERENCE_WORKERS,
+    queue_size=settings.INFERENCE_QUEUE_SIZE,
+)
+if settings.MAX_PHOTOS_PER_REQUEST > inference_executor.capacity:
+    # A multi-photo upload is one batch; one larger than the capacity could never be admitted.
+    raise RuntimeError(
+        f"MAX_PHOTOS_PER_REQUEST ({settings.MAX_PHOTOS_PER_REQUEST}) exceeds the inference capacity "
+        f"INFERENCE_WORKERS + INFERENCE_QUEUE_SIZE ({inference_executor.capacity})."
+    )
+
+registry.callback(
+    "cloakroom_inference_pending",
+    "Inference jobs running or queued on the executor.",
+    "gauge",
+    lambda: [({}, inference_executor.pending)],
+)
+registry.callback(
+    "cloakroom_inference_capacity",
+    "Inference jobs the executor admits at once (workers plus queue slots).",
+    "gauge",
+    lambda: [({}, inference_executor.capacity)],
+)
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import tempfile
+from collections.abc import AsyncIterator, Callable, Coroutine
+from typing import Any, BinaryIO
+
+from fastapi import HTTPException, Request, Response, UploadFile
+from fastapi.routing import APIRoute
+from starlette.datastructures import FormData, Headers
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+from app.services.blob_store import DIGEST_SIZE
+
+INGEST_CHUNK_SIZE = 256 * 1024
+# Room for the multipart framing and text fields around the files of one request.
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+
+class RequestTooLargeError(HTTPException):
+    """Raised while a request body is still arriving once it exceeds ``max_request_bytes``."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Request body exceeds the {max_bytes // (1024 * 1024)} MB limit.")
+
+
+def max_request_bytes() -> int:
+    """Largest request body accepted: MAX_REQUEST_BYTES, or a full batch of maximum-size photos."""
+    if settings.MAX_REQUEST_BYTES is not None:
+        return settings.MAX_REQUEST_BYTES
+    return settings.MAX_UPLOAD_BYTES * settings.MAX_PHOTOS_PER_REQUEST + FORM_OVERHEAD_BYTES
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Pure ASGI middleware bounding request bodies before they are buffered.
+
+    Starlette reads a whole multipart form (to memory and temp files) before a
+    route runs, so per-file checks alone come too late to protect the server.
+    A declared ``Content-Length`` over the limit is refused without reading
+    the body; otherwise bytes are counted as they arrive and the request fails
+    with 413 as soon as the limit is crossed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = max_request_bytes()
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            error = RequestTooLargeError(max_bytes)
+            await JSONResponse({"detail": error.detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # An HTTPException: FastAPI re-raises it from form parsing as a 413 response.
+                    raise RequestTooLargeError(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class UploadRequest(Request):
+    """
+    A request whose multipart files spool to disk past UPLOAD_SPOOL_MAX_MEMORY_BYTES.
+    Ingestion reads Starlette's spool in place, so its in-memory threshold is the one
+    that matters; other routes keep Starlette's default.
+    """
+
+    async def _get_form(self, *, max_files: int | float = 1000, max_fields: int | float = 1000) -> FormData:
+        if self._form is None and self.headers.get("content-type", "").startswith("multipart/form-data"):
+            parser = MultiPartParser(self.headers, self.stream(), max_files=max_files, max_fields=max_fields)
+            parser.max_file_size = settings.UPLOAD_SPOOL_MAX_MEMORY_BYTES
+            try:
+                self._form = await parser.parse()
+            except MultiPartException as exc:
+                raise HTTPException(status_code=400, detail=exc.message)
+        return await super()._get_form(max_files=max_files, max_fields=max_fields)
+
+
+class UploadRoute(APIRoute):
+    """Route class for the upload router: hands its endpoints an ``UploadRequest``."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def upload_route_handler(request: Request) -> Response:
+            return await handler(UploadRequest(request.scope, request.receive))
+
+        return upload_route_handler
+
+
+class IngestedUpload:
+    """
+    An upload's spooled file (small files in memory, larger ones on disk) with
+    its size and content hash, so no full ``bytes`` copy is needed to process it.
+    """
+
+    def __init__(self, filename: str | None, spool: BinaryIO, size: int, content_hash: str):
+        self.filename = filename
+        self.size = size
+        self.content_hash = content_hash
+        self._spool = spool
+
+    def open(self) -> BinaryIO:
+        """The spooled file, rewound; decoders can read it in place."""
+        self._spool.seek(0)
+        return self._spool
+
+    def read_bytes(self) -> bytes:
+        """Materialize the upload, for consumers that need a picklable payload."""
+        return self.open().read()
+
+    async def iter_chunks(self, chunk_size: int = INGEST_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        spool = self.open()
+        while chunk := await asyncio.to_thread(spool.read, chunk_size):
+            yield chunk
+
+    def close(self) -> None:
+        self._spool.close()
+
+
+def _hash_spool(spool: BinaryIO) -> tuple[int, str]:
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    size = 0
+    spool.seek(0)
+    while chunk := spool.read(INGEST_CHUNK_SIZE):
+        size += len(chunk)
+        hasher.update(chunk)
+    return size, hasher.hexdigest()
+
+
+async def ingest_upload(upload: UploadFile, max_bytes: int | None = None) -> IngestedUpload:
+    """
+    Take over the file Starlette spooled while parsing the form: check its
+    size and hash it in place, without copying it. The form closes its files
+    when the route returns, so the upload gets an empty stand-in and the
+    returned ``IngestedUpload`` owns the spool (e.g. for a background job).
+    """
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    too_large = UploadTooLargeError(
+        f"Uploaded image '{upload.filename}' exceeds the {max_bytes // (1024 * 1024)} MB limit."
+    )
+    if upload.size is not None and upload.size > max_bytes:
+        raise too_large
+    spool = upload.file
+    upload.file = tempfile.SpooledTemporaryFile()
+    try:
+        size, content_hash = await asyncio.to_thread(_hash_spool, spool)
+        if size > max_bytes:
+            raise too_large
+    except BaseException:
+        spool.close()
+        raise
+    return IngestedUpload(upload.filename, spool, size, content_hash)
@@ -0,0 +1,139 @@
+import contextlib
+import uuid
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models.domain import ClothingItem, Outfit, ProcessingJob
+from app.services.closet import record_item_changes
+
+TERMINAL_JOB_STATUSES = {"succeeded", "failed"}
+
+# Jobs this process is working on; beat_running_jobs keeps their heartbeat fresh.
+_running_jobs: set[str] = set()
+
+
+def create_job(
+    db: Session, kind: str, owner_id: int, item_id: int | None = None, outfit_id: int | None = None
+) -> ProcessingJob:
+    """Add a pending job to the session; the caller commits it with its related rows."""
+    job = ProcessingJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        owner_id=owner_id,
+        item_id=item_id,
+        outfit_id=outfit_id,
+        status="pending",
+        progress=0,
+        heartbeat_at=datetime.now(timezone.utc),
+    )
+    db.add(job)
+    return job
+
+
+@contextlib.contextmanager
+def running_job(job_id: str) -> Iterator[None]:
+    """Mark ``job_id`` as being worked on by this process for the duration of the block."""
+    _running_jobs.add(job_id)
+    try:
+        yield
+    finally:
+        _running_jobs.discard(job_id)
+
+
+async def beat_running_jobs() -> int:
+    """Refresh the heartbeat of every unfinished job this process is running."""
+    if not _running_jobs:
+        return 0
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id.in_(list(_running_jobs)), ProcessingJob.status.not_in(TERMINAL_JOB_STATUSES))
+            # Keep updated_at: it records progress, which a heartbeat isn't.
+            .values(heartbeat_at=datetime.now(timezone.utc), updated_at=ProcessingJob.updated_at)
+        )
+        await db.commit()
+        return result.rowcount
+
+
+def update_active_job(db: Session, job_id: str, **fields) -> bool:
+    """
+    Update the job in ``db``'s transaction unless it has already finished, so a
+    late write (e.g. the worker's after a webhook completed the job) can't
+    revert it. Returns whether the job was updated.
+    """
+    result = db.execute(
+        update(ProcessingJob)
+        .where(ProcessingJob.id == job_id, ProcessingJob.status.not_in(TERMINAL_JOB_STATUSES))
+        .values(**fields)
+    )
+    return result.rowcount > 0
+
+
+def update_job(job_id: str, **fields) -> bool:
+    """Persist job progress from a background worker using its own session."""
+    db = SessionLocal()
+    try:
+        updated = update_active_job(db, job_id, **fields)
+        db.commit()
+        return updated
+    finally:
+        db.close()
+
+
+def reap_interrupted_work(db: Session, stale_before: datetime) -> int:
+    """
+    Fail jobs, items and pending outfits whose background work was lost to a
+    restart. Background jobs run in the process that accepted them, which
+    keeps their heartbeat fresh; a job whose heartbeat (or, without one, last
+    update) is older than ``stale_before`` has no worker left on any instance.
+    Items are failed only when no job with a live heartbeat is processing
+    them. Returns the number of jobs and items failed.
+    """
+    error = "Interrupted before it finished; please try again."
+    unfinished = ProcessingJob.status.not_in(TERMINAL_JOB_STATUSES)
+    last_beat = func.coalesce(ProcessingJob.heartbeat_at, ProcessingJob.updated_at)
+    stale_jobs = db.execute(
+        select(ProcessingJob.id, ProcessingJob.outfit_id).where(unfinished, last_beat < stale_before)
+    ).all()
+    for job_id, _ in stale_jobs:
+        update_active_job(db, job_id, status="failed", message="Job interrupted", error=error)
+    outfit_ids = [outfit_id for _, outfit_id in stale_jobs if outfit_id is not None]
+    if outfit_ids:
+        db.execute(
+            update(Outfit).where(Outfit.id.in_(outfit_ids), Outfit.status == "pending").values(status="failed")
+        )
+
+    live_item_ids = select(ProcessingJob.item_id).where(
+        unfinished, ProcessingJob.item_id.is_not(None), last_beat >= stale_before
+    )
+    stale_items = db.execute(
+        select(ClothingItem.id, ClothingItem.owner_id).where(
+            ClothingItem.status == "processing",
+            ClothingItem.updated_at < stale_before,
+            ClothingItem.id.not_in(live_item_ids),
+        )
+    ).all()
+    if stale_items:
+        db.execute(
+            update(ClothingItem)
+            .where(ClothingItem.id.in_([item_id for item_id, _ in stale_items]))
+            .values(status="failed")
+        )
+        item_ids_by_owner: dict[int, list[int]] = {}
+        for item_id, owner_id in stale_items:
+            item_ids_by_owner.setdefault(owner_id, []).append(item_id)
+        for owner_id, item_ids in item_ids_by_owner.items():
+            record_item_changes(db, owner_id, item_ids)
+    db.commit()
+    return len(stale_jobs) + len(stale_items)
+
+
+async def reap_stale_jobs(stale_after_seconds: int) -> int:
+    """Startup sweep: ``reap_interrupted_work`` for rows idle longer than ``stale_after_seconds``."""
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=stale_after_seconds)
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(reap_interrupted_work, stale_before)
@@ -0,0 +1,315 @@
+"""
+In-process metrics in the Prometheus text format, plus per-request stage
+timings surfaced as a ``Server-Timing`` header.
+
+Stage timings come from ``stage_timer``/``record_stage``: each observation
+lands in the ``cloakroom_stage_duration_seconds`` histogram and, when it
+happens inside a request, in that request's span list. Work that runs in an
+executor worker measures its own stages and returns them (see
+``SegmentedGarment.timings``) so the request task can record them.
+"""
+
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from collections.abc import Callable, Iterator
+
+from starlette.datastructures import MutableHeaders
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._sample_lines())
+        return lines
+
+    def _sample_lines(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._label_values(labels), 0)
+
+    def _sample_lines(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket (non-cumulative) counts, then sum and count.
+        self._series: dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._label_values(labels))
+        return series[2] if series else 0
+
+    def _sample_lines(self) -> list[str]:
+        with self._lock:
+            snapshot = sorted((key, list(counts), total, count) for key, (counts, total, count) in self._series.items())
+        lines = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """A gauge or counter read from existing state (queue lengths, cache stats) at scrape time."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        collect: Callable[[], list[tuple[dict[str, str], float]]],
+        labelnames: tuple[str, ...] = (),
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self._collect = collect
+
+    def _sample_lines(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, self._label_values(labels))} {_format_value(value)}"
+            for labels, value in self._collect()
+        ]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Re-registering a name (e.g. a module reloaded in tests) replaces the old metric.
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        collect: Callable[[], list[tuple[dict[str, str], float]]],
+        labelnames: tuple[str, ...] = (),
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, kind, collect, labelnames))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_seconds = registry.histogram(
+    "cloakroom_http_request_duration_seconds",
+    "Time to the last response byte, by route template.",
+    ("method", "route", "status"),
+)
+stage_seconds = registry.histogram(
+    "cloakroom_stage_duration_seconds",
+    "Time spent per processing stage (decode, segment, categorize, encode, store, db_commit, provider_call).",
+    ("stage",),
+)
+background_removal_fallbacks = registry.counter(
+    "cloakroom_background_removal_fallbacks_total",
+    "Uploads stored without a segmented cutout, by reason.",
+    ("reason",),
+)
+cutout_cache_requests = registry.counter(
+    "cloakroom_cutout_cache_requests_total",
+    "Processed-cutout lookups by content hash, by result (hit or miss).",
+    ("result",),
+)
+tryon_prefetches_skipped = registry.counter(
+    "cloakroom_tryon_prefetches_skipped_total",
+    "Speculative try-ons dropped without being generated, by reason.",
+    ("reason",),
+)
+
+# Spans of the request being handled; None outside requests (background loops, scripts).
+_request_spans: contextvars.ContextVar[list[tuple[str, float]] | None] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, stage=stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+def record_stages(timings: dict[str, float] | None) -> None:
+    """Record stage timings measured elsewhere, e.g. in an inference worker."""
+    for stage, seconds in (timings or {}).items():
+        record_stage(stage, seconds)
+
+
+@contextlib.contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def server_timing_header(spans: list[tuple[str, float]], total_seconds: float) -> str:
+    """``Server-Timing`` value with repeated stages summed, e.g. ``segment;dur=41.2, total;dur=57.9``."""
+    durations: dict[str, float] = {}
+    for stage, seconds in spans:
+        durations[stage] = durations.get(stage, 0) + seconds
+    durations["total"] = total_seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in durations.items())
+
+
+def _route_label(scope: dict) -> str:
+    # FastAPI stores the matched route in the scope; mounts (e.g. /static) set root_path.
+    route = scope.get("route")
+    return getattr(route, "path", None) or scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: times each HTTP request into the request histogram
+    and, with ``server_timing``, reports the request's stage spans in a
+    ``Server-Timing`` response header. Background tasks that run after the
+    response are not counted in the request's duration.
+    """
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: list[tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        started = time.perf_counter()
+        status = 500
+        finished = False
+
+        def _finish() -> None:
+            nonlocal finished
+            if not finished:
+                finished = True
+                http_request_seconds.observe(
+                    time.perf_counter() - started,
+                    method=scope["method"],
+                    route=_route_label(scope),
+                    status=str(status),
+                )
+
+        async def _send(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", server_timing_header(spans, time.perf_counter() - started)
+                    )
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                _finish()
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _finish()
+            _request_spans.reset(token)
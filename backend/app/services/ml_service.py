@@ -1,44 +1,348 @@
+import hashlib
 import io
+import threading
+import time
+from typing import BinaryIO, NamedTuple
 
-import pillow_heif
+import numpy as np
 from PIL import Image, UnidentifiedImageError
-from rembg import remove
 
-# Register HEIF/HEIC opener so uploads from Apple devices decode correctly.
-pillow_heif.register_heif_opener()
+from app.core.config import settings
+from app.services.classifier import dominant_color, garment_classifier
+
+# rembg (onnxruntime, scipy, scikit-image) and pillow_heif are imported on first
+# use, so API-only processes and tests never pay for the ML stack. rembg is the
+# exception to "first use": see import_ml_stack.
+
+SUPPORTED_MODELS = ("u2net", "u2netp", "silueta", "isnet-general-use")
+_MODEL_ALIASES = {"isnet": "isnet-general-use"}
 
 
 class InvalidImageError(ValueError):
     """Raised when uploaded bytes are not a supported image format."""
 
 
-def remove_background(image_bytes: bytes) -> bytes:
+class ImageTooLargeError(ValueError):
+    """Raised when decoding an upload would exceed the per-image memory budget."""
+
+
+_ml_stack_imported = False
+
+
+def import_ml_stack() -> None:
+    """
+    Import rembg (and with it pymatting and numba) on the main thread.
+
+    pymatting starts numba's threading layer at import; when that is TBB and it
+    was first started from any other thread, the interpreter deadlocks on exit.
+    So rembg may not be first imported from an inference thread: the app
+    imports it at startup before handing work to threads, and process-pool
+    workers import it from their initializer. Raises RuntimeError off the main
+    thread (and ImportError without rembg) until it has been imported.
+    """
+    global _ml_stack_imported
+    if _ml_stack_imported:
+        return
+    if threading.current_thread() is not threading.main_thread():
+        raise RuntimeError("rembg was not imported at startup; it cannot be first imported from a worker thread.")
+    import onnxruntime  # noqa: F401
+    import rembg  # noqa: F401
+
+    _ml_stack_imported = True
+
+
+class SegmentationSessionManager:
+    """
+    Owns the process-wide rembg session so the ONNX model is loaded once
+    (ideally at startup) instead of on the request path.
+    """
+
+    def __init__(self, model_name: str = "u2net", intra_op_threads: int = 0, inter_op_threads: int = 0):
+        model_name = _MODEL_ALIASES.get(model_name, model_name)
+        if model_name not in SUPPORTED_MODELS:
+            raise ValueError(
+                f"Unsupported segmentation model {model_name!r}; expected one of {', '.join(SUPPORTED_MODELS)}."
+            )
+        self.model_name = model_name
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.state = "cold"
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _build_session(self):
+        import_ml_stack()
+        import onnxruntime as ort
+        from rembg.sessions import sessions_class
+
+        session_class = next(cls for cls in sessions_class if cls.name() == self.model_name)
+        sess_opts = ort.SessionOptions()
+        if self.intra_op_threads > 0:
+            sess_opts.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads > 0:
+            sess_opts.inter_op_num_threads = self.inter_op_threads
+        return session_class(self.model_name, sess_opts)
+
+    def get(self):
+        """Return the loaded session, loading it on first use. Raises if loading fails."""
+        if self._session is not None:
+            return self._session
+        with self._lock:
+            if self._session is None:
+                self.state = "loading"
+                started = time.perf_counter()
+                try:
+                    self._session = self._build_session()
+                except Exception as exc:
+                    self.state = "failed"
+                    self.error = str(exc)
+                    raise
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                self.state = "ready"
+                self.error = None
+        return self._session
+
+    def warm_up(self) -> bool:
+        """Load the model now; returns False (and records the error) if it is unavailable."""
+        try:
+            self.get()
+        except Exception:
+            return False
+        return True
+
+    def describe(self) -> dict:
+        return {
+            "model": self.model_name,
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+session_manager = SegmentationSessionManager(
+    model_name=settings.REMBG_MODEL,
+    intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+    inter_op_threads=settings.ONNX_INTER_OP_THREADS,
+)
+
+
+def warm_up() -> dict:
+    """Load the segmentation and classifier models ahead of the first request and report their state."""
+    session_manager.warm_up()
+    garment_classifier.warm_up()
+    return session_manager.describe()
+
+
+def init_worker(classifier_model: str | None) -> None:
+    """Initializer for inference worker processes: use the parent's classifier, then warm up."""
+    garment_classifier.pin(classifier_model)
+    warm_up()
+
+
+_heif_lock = threading.Lock()
+_heif_registered = False
+
+
+def _register_heif_opener() -> None:
+    """Register the HEIF/HEIC opener so uploads from Apple devices decode correctly."""
+    global _heif_registered
+    if _heif_registered:
+        return
+    with _heif_lock:
+        if not _heif_registered:
+            import pillow_heif
+
+            pillow_heif.register_heif_opener()
+            _heif_registered = True
+
+
+def _decode_bounded(source: bytes | BinaryIO, max_side: int) -> Image.Image:
     """
-    Takes an image in bytes, removes the background using rembg,
-    and returns the processed image as bytes (PNG format).
+    Decode an upload no larger than ``max_side`` on its longest edge. ``source``
+    may be a file object (e.g. a spooled upload) so it is decoded in place.
     """
+    _register_heif_opener()
     try:
-        input_image = Image.open(io.BytesIO(image_bytes))
-        input_image.load()
+        image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        if max_side > 0:
+            # JPEG can decode straight at 1/2, 1/4 or 1/8 scale; other formats ignore this.
+            image.draft("RGB", (max_side, max_side))
+        # Check the decoded footprint from the header before allocating any pixels.
+        decoded_bytes = image.width * image.height * len(image.getbands())
+        if decoded_bytes > settings.DECODE_MEMORY_BUDGET_BYTES:
+            raise ImageTooLargeError(
+                f"Image is {image.width}x{image.height}; decoding it would exceed the memory budget."
+            )
+        image.load()
     except UnidentifiedImageError as exc:
         raise InvalidImageError(
             "Unsupported image format. Please upload a valid JPG, PNG, or WEBP file."
         ) from exc
+    except Image.DecompressionBombError as exc:
+        raise ImageTooLargeError(str(exc)) from exc
+
+    if max_side > 0 and max(image.size) > max_side:
+        # thumbnail() uses reduce() before resampling, which is far cheaper on huge photos.
+        image.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=2.0)
+    return image
+
+
+def remove(image: Image.Image, **kwargs) -> Image.Image:
+    """rembg's ``remove``, imported on first use (see ``import_ml_stack``)."""
+    import_ml_stack()
+    from rembg import remove as rembg_remove
+
+    return rembg_remove(image, **kwargs)
+
 
+def _segmentation_mask(image: Image.Image, max_side: int) -> Image.Image:
+    """Run segmentation on a bounded copy and return an ``L`` mask at ``image.size``."""
+    inference_image = image
+    if max_side > 0 and max(image.size) > max_side:
+        inference_image = image.copy()
+        inference_image.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+
+    mask = remove(inference_image, session=session_manager.get(), only_mask=True)
+    if mask.size != image.size:
+        mask = mask.resize(image.size, Image.BILINEAR)
+    return mask
+
+
+CUTOUT_FORMATS = {"png": ".png", "webp": ".webp"}
+
+
+class CutoutPlacement(NamedTuple):
+    """Where a cropped cutout sits on the uncropped output canvas."""
+
+    offset_x: int
+    offset_y: int
+    canvas_width: int
+    canvas_height: int
+
+
+class SegmentedGarment(NamedTuple):
+    image_bytes: bytes  # cutout in CUTOUT_FORMAT
+    features: np.ndarray  # garment classifier input
+    color: str | None
+    # Seconds per stage, measured in the worker and recorded by the caller (services.metrics).
+    timings: dict[str, float] | None = None
+    segmented: bool = True  # False when segmentation failed and the image is kept opaque
+    placement: CutoutPlacement | None = None  # None when the cutout was not cropped
+
+
+def _describe(cutout: Image.Image, image_bytes: bytes, timings: dict[str, float] | None = None) -> SegmentedGarment:
+    started = time.perf_counter()
+    features, color = garment_classifier.prepare(cutout), dominant_color(cutout)
+    if timings is not None:
+        timings["categorize"] = time.perf_counter() - started
+    return SegmentedGarment(image_bytes, features, color, timings)
+
+
+# Bump when a code change alters the cutouts produced for the same settings.
+CUTOUT_PIPELINE_VERSION = 1
+
+
+def cutout_version() -> str:
+    """
+    Short tag of everything that shapes a cutout: the pipeline version, the
+    segmentation model and input size, and the output size, format and crop.
+    Cached cutouts are keyed by it, so they are not reused across changes.
+    """
+    config = ":".join(
+        str(part)
+        for part in (
+            CUTOUT_PIPELINE_VERSION,
+            session_manager.model_name,
+            settings.SEGMENTATION_MAX_SIDE,
+            settings.OUTPUT_MAX_SIDE,
+            settings.CUTOUT_FORMAT,
+            settings.CUTOUT_CROP,
+        )
+    )
+    return hashlib.blake2b(config.encode(), digest_size=4).hexdigest()
+
+
+def cutout_extension() -> str:
+    """File extension of cutouts written with the configured CUTOUT_FORMAT."""
+    return CUTOUT_FORMATS[settings.CUTOUT_FORMAT]
+
+
+def _crop_to_content(image: Image.Image) -> tuple[Image.Image, CutoutPlacement | None]:
+    """Trim fully transparent borders, returning the crop's position on the original canvas."""
+    bbox = image.getchannel("A").getbbox()
+    if bbox is None or bbox == (0, 0, *image.size):
+        return image, None
+    return image.crop(bbox), CutoutPlacement(bbox[0], bbox[1], *image.size)
+
+
+def encode_cutout(image: Image.Image) -> bytes:
+    """
+    Encode an RGBA cutout losslessly in CUTOUT_FORMAT. Fully transparent
+    pixels are blanked first: they are invisible, but segmentation leaves the
+    photo's background in their color channels, which compresses poorly.
+    """
+    transparent = image.getchannel("A").point(lambda alpha: 255 if alpha == 0 else 0)
+    if transparent.getbbox() is not None:
+        image = image.copy()
+        image.paste((0, 0, 0, 0), mask=transparent)
+
+    stream = io.BytesIO()
+    if settings.CUTOUT_FORMAT == "webp":
+        image.save(stream, format="WEBP", lossless=True, quality=0, method=settings.CUTOUT_WEBP_METHOD)
+    else:
+        image.save(stream, format="PNG", compress_level=settings.CUTOUT_PNG_COMPRESS_LEVEL)
+    return stream.getvalue()
+
+
+def segment_garment(image_bytes: bytes | BinaryIO) -> SegmentedGarment:
+    """
+    Takes an image in bytes, removes the background using rembg, and
+    returns the encoded cutout together with its classifier features and
+    dominant color, both computed from the cutout while it is decoded.
+
+    Segmentation runs at SEGMENTATION_MAX_SIDE and only the alpha mask is
+    upsampled to the output, which is capped at OUTPUT_MAX_SIDE. With
+    CUTOUT_CROP the cutout is trimmed to the garment's bounding box and
+    ``placement`` records where it sat on the full canvas.
+    """
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+    input_image = _decode_bounded(image_bytes, settings.OUTPUT_MAX_SIDE)
+    output_image = input_image.convert("RGBA")
+    timings["decode"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    segmented = True
     try:
-        output_image = remove(input_image)
+        output_image.putalpha(_segmentation_mask(input_image, settings.SEGMENTATION_MAX_SIDE))
     except Exception:
         # Fallback path for environments where rembg dependencies are unavailable.
-        output_image = input_image.convert("RGBA")
+        segmented = False
+    del input_image
+    timings["segment"] = time.perf_counter() - started
 
-    img_byte_arr = io.BytesIO()
-    output_image.save(img_byte_arr, format="PNG")
-    return img_byte_arr.getvalue()
+    started = time.perf_counter()
+    placement = None
+    if settings.CUTOUT_CROP and segmented:
+        output_image, placement = _crop_to_content(output_image)
+    encoded = encode_cutout(output_image)
+    timings["encode"] = time.perf_counter() - started
+    return _describe(output_image, encoded, timings)._replace(segmented=segmented, placement=placement)
 
-def auto_categorize(image_bytes: bytes) -> str:
-    """
-    Placeholder for an ML-based categorization model (e.g., ViT or ResNet).
-    For MVP, use deterministic hashing for stable outputs in tests.
-    """
-    categories = ["top", "bottom", "outerwear", "shoes", "accessory"]
-    return categories[hash(image_bytes) % len(categories)]
\ No newline at end of file
+
+def remove_background(image_bytes: bytes | BinaryIO) -> bytes:
+    """Background removal only; see ``segment_garment``."""
+    return segment_garment(image_bytes).image_bytes
+
+
+def describe_cutout(image_bytes: bytes) -> SegmentedGarment:
+    """Classifier features and color of an already stored cutout."""
+    cutout = _decode_bounded(image_bytes, settings.OUTPUT_MAX_SIDE)
+    return _describe(cutout, image_bytes)
+
+
+def classify_garments(features: list[np.ndarray]) -> list[str]:
+    """Predict categories for a batch of ``SegmentedGarment.features`` in one pass."""
+    return garment_classifier.predict(features)
@@ -0,0 +1,451 @@
+import asyncio
+import datetime
+import hashlib
+import hmac
+import mimetypes
+import os
+import tempfile
+import xml.etree.ElementTree as ElementTree
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterable, AsyncIterator
+from dataclasses import dataclass
+from urllib.parse import quote, urlsplit
+
+import httpx
+
+from app.core.config import STATIC_URL_PREFIX, settings
+from app.services.assets import cache_control
+
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+_S3_XML_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+_UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+
+class StorageError(RuntimeError):
+    """Raised when the storage backend rejects or fails an operation."""
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    key: str
+    size: int
+    last_used: float  # POSIX write time; later dedupe hits are tracked in BlobAccess
+
+
+def _canonical_query(query: dict[str, str]) -> str:
+    return "&".join(
+        f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}" for name, value in sorted(query.items())
+    )
+
+
+def _content_type_for(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+def _object_headers(key: str, content_type: str | None) -> dict[str, str]:
+    """Stored with each object, so S3 and any CDN in front serve blobs as immutable."""
+    return {"Content-Type": content_type or _content_type_for(key), "Cache-Control": cache_control()}
+
+
+async def _iter_bytes(data: bytes, chunk_size: int) -> AsyncIterator[bytes]:
+    for offset in range(0, len(data), chunk_size):
+        yield data[offset:offset + chunk_size]
+
+
+class StorageBackend(ABC):
+    """Async blob storage addressed by flat keys such as ``<digest>_proc.png``."""
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes, content_type: str | None = None) -> None:
+        """Store ``data`` under ``key``, replacing any existing object atomically."""
+
+    @abstractmethod
+    async def put_stream(
+        self, key: str, chunks: AsyncIterable[bytes], content_type: str | None = None
+    ) -> int:
+        """Store an object from an async chunk stream without buffering it whole; returns its size."""
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Return the object's bytes, raising FileNotFoundError if it is missing."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Delete the object; missing keys are ignored."""
+
+    @abstractmethod
+    async def list_objects(self) -> list[StoredObject]:
+        """Every object this backend owns (for S3, those under its key prefix)."""
+
+    @abstractmethod
+    def url(self, key: str) -> str:
+        """URL clients should fetch the object from."""
+
+    def url_lifetime_seconds(self) -> int | None:
+        """How long URLs from ``url`` stay valid, or None when they don't expire."""
+        return None
+
+    def local_path(self, key: str) -> str | None:
+        """Filesystem path for zero-copy serving, or None when objects live remotely."""
+        return None
+
+    async def aclose(self) -> None:
+        """Release pooled connections."""
+
+    def public_url(self, stored_url: str | None) -> str | None:
+        """Resolve a stored ``/static/<key>`` URL to the backend's client-facing URL."""
+        if not stored_url or not stored_url.startswith(STATIC_URL_PREFIX):
+            return stored_url
+        return self.url(stored_url[len(STATIC_URL_PREFIX):])
+
+    def absolute_url(self, stored_url: str) -> str:
+        """Like public_url but always absolute, for handing assets to external services."""
+        url = self.public_url(stored_url) or stored_url
+        if url.startswith("/"):
+            return f"{settings.STATIC_BASE_URL}{url}"
+        return url
+
+
+class LocalStorage(StorageBackend):
+    """Objects as files in one directory, served by the app's ``/static`` mount."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def url(self, key: str) -> str:
+        return f"{STATIC_URL_PREFIX}{key}"
+
+    def _write_atomic(self, key: str, data: bytes) -> None:
+        # Concurrent identical uploads must never observe partial files.
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as output_file:
+                output_file.write(data)
+            os.replace(temp_path, self.local_path(key))
+        except BaseException:
+            self._unlink(temp_path)
+            raise
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    async def put(self, key: str, data: bytes, content_type: str | None = None) -> None:
+        await asyncio.to_thread(self._write_atomic, key, data)
+
+    async def put_stream(
+        self, key: str, chunks: AsyncIterable[bytes], content_type: str | None = None
+    ) -> int:
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as output_file:
+                async for chunk in chunks:
+                    await asyncio.to_thread(output_file.write, chunk)
+                    size += len(chunk)
+            os.replace(temp_path, self.local_path(key))
+        except BaseException:
+            self._unlink(temp_path)
+            raise
+        return size
+
+    async def get(self, key: str) -> bytes:
+        def _read() -> bytes:
+            with open(self.local_path(key), "rb") as input_file:
+                return input_file.read()
+
+        return await asyncio.to_thread(_read)
+
+    async def exists(self, key: str) -> bool:
+        return os.path.isfile(self.local_path(key))
+
+    async def delete(self, key: str) -> None:
+        self._unlink(self.local_path(key))
+
+    async def list_objects(self) -> list[StoredObject]:
+        def _scan() -> list[StoredObject]:
+            objects = []
+            with os.scandir(self.root) as entries:
+                for entry in entries:
+                    if entry.is_file() and not entry.name.startswith("."):
+                        stat = entry.stat()
+                        objects.append(StoredObject(entry.name, stat.st_size, stat.st_mtime))
+            return objects
+
+        return await asyncio.to_thread(_scan)
+
+
+class S3Storage(StorageBackend):
+    """
+    S3-compatible object storage (AWS S3, MinIO, R2) over a pooled httpx client
+    with SigV4 signing. Large objects use multipart uploads; clients receive a
+    CDN URL when ``public_base_url`` is set, otherwise a pre-signed GET URL.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        access_key_id: str,
+        secret_access_key: str,
+        region: str = "us-east-1",
+        endpoint_url: str | None = None,
+        public_base_url: str | None = None,
+        presign_expires_seconds: int = 3600,
+        part_size: int = 8 * 1024 * 1024,
+        key_prefix: str = "",
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.bucket = bucket
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.region = region
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+        self.presign_expires_seconds = presign_expires_seconds
+        self.part_size = max(part_size, S3_MIN_PART_SIZE)
+        # Object names are ``key_prefix + key``, so a shared bucket is only listed (and
+        # swept by orphan eviction) under this app's prefix.
+        self.key_prefix = key_prefix.lstrip("/")
+        if endpoint_url:
+            # Custom endpoints (MinIO and friends) use path-style addressing.
+            self._base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self._base_url = f"https://{bucket}.s3.{region}.amazonaws.com"
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=60, transport=self._transport)
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _object_url(self, key: str = "") -> str:
+        return f"{self._base_url}/{quote(self.key_prefix + key, safe='/-_.~')}" if key else f"{self._base_url}/"
+
+    def _signing_key(self, date_stamp: str) -> bytes:
+        key = f"AWS4{self.secret_access_key}".encode()
+        for part in (date_stamp, self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        return key
+
+    def _signature(
+        self,
+        method: str,
+        url: str,
+        query: dict[str, str],
+        headers: dict[str, str],
+        amz_date: str,
+        payload_hash: str,
+    ) -> tuple[str, str]:
+        """Return ``(signed_headers, signature)`` for an AWS SigV4 request."""
+        parts = urlsplit(url)
+        canonical_headers = {name.lower(): value.strip() for name, value in headers.items()}
+        canonical_headers["host"] = parts.netloc
+        signed_headers = ";".join(sorted(canonical_headers))
+        canonical_request = "\n".join(
+            [
+                method,
+                parts.path or "/",
+                _canonical_query(query),
+                "".join(f"{name}:{canonical_headers[name]}\n" for name in sorted(canonical_headers)),
+                signed_headers,
+                payload_hash,
+            ]
+        )
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = "\n".join(
+            ["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode()).hexdigest()]
+        )
+        signature = hmac.new(self._signing_key(amz_date[:8]), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return signed_headers, signature
+
+    async def _request(
+        self,
+        method: str,
+        key: str = "",
+        query: dict[str, str] | None = None,
+        content: bytes | None = None,
+        headers: dict[str, str] | None = None,
+        expected: tuple[int, ...] = (200,),
+    ) -> httpx.Response:
+        query = query or {}
+        url = self._object_url(key)
+        amz_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        request_headers = {
+            **(headers or {}),
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": _UNSIGNED_PAYLOAD,
+        }
+        signed_headers, signature = self._signature(
+            method, url, query, request_headers, amz_date, _UNSIGNED_PAYLOAD
+        )
+        request_headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key_id}/{amz_date[:8]}/{self.region}/s3/aws4_request, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        # Send the exact query string that was signed rather than letting httpx re-encode it.
+        if query:
+            url = f"{url}?{_canonical_query(query)}"
+        response = await self.client.request(method, url, content=content, headers=request_headers)
+        if response.status_code not in expected:
+            raise StorageError(f"S3 {method} {key or '/'} failed with HTTP {response.status_code}: {response.text[:200]}")
+        return response
+
+    async def put(self, key: str, data: bytes, content_type: str | None = None) -> None:
+        if len(data) > self.part_size:
+            await self.put_stream(key, _iter_bytes(data, self.part_size), content_type)
+            return
+        await self._request("PUT", key, content=data, headers=_object_headers(key, content_type))
+
+    async def put_stream(
+        self, key: str, chunks: AsyncIterable[bytes], content_type: str | None = None
+    ) -> int:
+        """Multipart upload with at most one part buffered in memory."""
+        object_headers = _object_headers(key, content_type)
+        buffer = bytearray()
+        size = 0
+        upload_id: str | None = None
+        etags: list[str] = []
+
+        async def _flush_part() -> None:
+            nonlocal upload_id
+            if upload_id is None:
+                response = await self._request(
+                    "POST", key, query={"uploads": ""}, headers=object_headers
+                )
+                upload_id = ElementTree.fromstring(response.content).findtext(f"{_S3_XML_NAMESPACE}UploadId") or ""
+            response = await self._request(
+                "PUT",
+                key,
+                query={"partNumber": str(len(etags) + 1), "uploadId": upload_id},
+                content=bytes(buffer),
+            )
+            etags.append(response.headers["ETag"])
+            buffer.clear()
+
+        try:
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                size += len(chunk)
+                if len(buffer) >= self.part_size:
+                    await _flush_part()
+
+            if upload_id is None:
+                # Small enough for a single PUT.
+                await self._request("PUT", key, content=bytes(buffer), headers=object_headers)
+                return size
+
+            if buffer:
+                await _flush_part()
+            manifest = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            await self._request(
+                "POST",
+                key,
+                query={"uploadId": upload_id},
+                content=f"<CompleteMultipartUpload>{manifest}</CompleteMultipartUpload>".encode(),
+            )
+        except BaseException:
+            if upload_id:
+                await self._request("DELETE", key, query={"uploadId": upload_id}, expected=(200, 204, 404))
+            raise
+        return size
+
+    async def get(self, key: str) -> bytes:
+        response = await self._request("GET", key, expected=(200, 404))
+        if response.status_code == 404:
+            raise FileNotFoundError(key)
+        return response.content
+
+    async def exists(self, key: str) -> bool:
+        response = await self._request("HEAD", key, expected=(200, 404))
+        return response.status_code == 200
+
+    async def delete(self, key: str) -> None:
+        await self._request("DELETE", key, expected=(200, 204, 404))
+
+    async def list_objects(self) -> list[StoredObject]:
+        objects: list[StoredObject] = []
+        base_query = {"list-type": "2", **({"prefix": self.key_prefix} if self.key_prefix else {})}
+        query = base_query
+        while True:
+            response = await self._request("GET", query=query)
+            root = ElementTree.fromstring(response.content)
+            for entry in root.iter(f"{_S3_XML_NAMESPACE}Contents"):
+                last_modified = datetime.datetime.fromisoformat(
+                    (entry.findtext(f"{_S3_XML_NAMESPACE}LastModified") or "").replace("Z", "+00:00")
+                )
+                objects.append(
+                    StoredObject(
+                        key=(entry.findtext(f"{_S3_XML_NAMESPACE}Key") or "").removeprefix(self.key_prefix),
+                        size=int(entry.findtext(f"{_S3_XML_NAMESPACE}Size") or 0),
+                        last_used=last_modified.timestamp(),
+                    )
+                )
+            token = root.findtext(f"{_S3_XML_NAMESPACE}NextContinuationToken")
+            if not token:
+                return objects
+            query = {**base_query, "continuation-token": token}
+
+    def url(self, key: str) -> str:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{quote(self.key_prefix + key, safe='/-_.~')}"
+        return self.presigned_url(key)
+
+    def url_lifetime_seconds(self) -> int | None:
+        return None if self.public_base_url else self.presign_expires_seconds
+
+    def presigned_url(self, key: str, expires_seconds: int | None = None) -> str:
+        """Pre-signed GET URL so clients fetch straight from storage instead of via uvicorn."""
+        url = self._object_url(key)
+        amz_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        query = {
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key_id}/{amz_date[:8]}/{self.region}/s3/aws4_request",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires_seconds or self.presign_expires_seconds),
+            "X-Amz-SignedHeaders": "host",
+        }
+        _, signature = self._signature("GET", url, query, {}, amz_date, _UNSIGNED_PAYLOAD)
+        return f"{url}?{_canonical_query(query)}&X-Amz-Signature={signature}"
+
+
+def create_storage_backend() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage(settings.UPLOAD_DIR)
+    if settings.STORAGE_BACKEND == "s3":
+        if not settings.AWS_ACCESS_KEY_ID or not settings.AWS_SECRET_ACCESS_KEY:
+            raise RuntimeError("AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY are required when STORAGE_BACKEND=s3.")
+        return S3Storage(
+            bucket=settings.S3_BUCKET_NAME,
+            access_key_id=settings.AWS_ACCESS_KEY_ID,
+            secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region=settings.S3_REGION,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            public_base_url=settings.STORAGE_PUBLIC_BASE_URL,
+            presign_expires_seconds=settings.S3_PRESIGN_EXPIRES_SECONDS,
+            part_size=settings.S3_MULTIPART_PART_SIZE,
+            key_prefix=settings.STORAGE_KEY_PREFIX,
+        )
+    raise RuntimeError(f"Unsupported STORAGE_BACKEND: {settings.STORAGE_BACKEND!r}")
+
+
+storage = create_storage_backend()
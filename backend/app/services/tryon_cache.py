@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from typing import Generic, NamedTuple, TypeVar
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.domain import Outfit
+from app.services.metrics import registry
+
+
+T = TypeVar("T")
+
+
+class CachedTryOn(NamedTuple):
+    outfit_id: int
+    generated_image_url: str
+
+
+def tryon_cache_key(
+    user_id: int,
+    avatar_hash: str,
+    garments: list[tuple[str, int, str | None]],
+    model_version: str,
+) -> str:
+    """
+    Identity of a try-on result: the owner, the avatar image's content hash,
+    the ordered ``(slot, item id, content hash)`` garment layers and the VTON
+    model version. Keyed on content, so replacing the avatar misses the cache
+    even if its URL stays the same.
+    """
+    parts = [str(user_id), avatar_hash, model_version]
+    parts.extend(f"{slot}={item_id}:{content_hash or ''}" for slot, item_id, content_hash in garments)
+    return hashlib.blake2b("\n".join(parts).encode(), digest_size=16).hexdigest()
+
+
+def stored_tryon(db: Session, owner_id: int, cache_key: str, ttl_seconds: float) -> CachedTryOn | None:
+    """The newest finished outfit for ``cache_key`` that is still within the TTL, if any."""
+    outfit = (
+        db.query(Outfit)
+        .filter(Outfit.owner_id == owner_id, Outfit.cache_key == cache_key, Outfit.status == "ready")
+        .order_by(Outfit.id.desc())
+        .first()
+    )
+    if not outfit or not outfit.generated_image_url:
+        return None
+    if outfit.created_at is not None:
+        created_at = outfit.created_at
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if (datetime.now(timezone.utc) - created_at).total_seconds() > ttl_seconds:
+            return None
+    return CachedTryOn(outfit.id, outfit.generated_image_url)
+
+
+class TryOnResultCache(Generic[T]):
+    """
+    In-process TTL/LRU map from try-on cache keys to finished outfits (or,
+    for the layer cache, intermediate try-on image URLs).
+
+    ``get_or_generate`` coalesces concurrent requests for the same key into
+    one generation (single-flight); the generation runs as its own task, so
+    a disconnecting leader does not cancel it for everyone else.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, T]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: str) -> T | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: T) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def _find(self, key: str, lookup: Callable[[], T | None] | None) -> T | None:
+        cached = self.get(key)
+        if cached is None and lookup is not None:
+            cached = lookup()
+            if cached is not None:
+                self.put(key, cached)
+        return cached
+
+    def lookup(self, key: str, lookup: Callable[[], T | None] | None = None) -> T | None:
+        """Counted cache check for callers that generate elsewhere (e.g. a background job)."""
+        cached = self._find(key, lookup)
+        if cached is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    async def get_or_generate(
+        self,
+        key: str,
+        generate: Callable[[], Awaitable[T]],
+        lookup: Callable[[], T | None] | None = None,
+    ) -> tuple[T, bool]:
+        """
+        Return ``(result, cached)``. ``lookup`` consults a slower shared store
+        (e.g. the outfits table) before ``generate`` pays for a provider call.
+        """
+        cached = self._find(key, lookup)
+        if cached is not None:
+            self.hits += 1
+            return cached, True
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future), True
+
+        self.misses += 1
+        future = asyncio.ensure_future(generate())
+        self._inflight[key] = future
+
+        def _settle(done: asyncio.Future) -> None:
+            self._inflight.pop(key, None)
+            if not done.cancelled() and done.exception() is None:
+                self.put(key, done.result())
+
+        future.add_done_callback(_settle)
+        return await asyncio.shield(future), False
+
+    def stats(self) -> dict:
+        requests = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.coalesced) / requests, 4) if requests else 0.0,
+        }
+
+
+tryon_cache: TryOnResultCache[CachedTryOn] = TryOnResultCache(
+    max_entries=settings.TRYON_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TRYON_CACHE_TTL_SECONDS,
+)
+# Intermediate images of layered try-ons (e.g. avatar + top), keyed like outfits.
+tryon_layer_cache: TryOnResultCache[str] = TryOnResultCache(
+    max_entries=settings.TRYON_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TRYON_CACHE_TTL_SECONDS,
+)
+
+_CACHES = {"result": tryon_cache, "layer": tryon_layer_cache}
+
+registry.callback(
+    "cloakroom_tryon_cache_requests_total",
+    "Try-on cache lookups by result: hit, coalesced onto an in-flight generation, or miss.",
+    "counter",
+    lambda: [
+        ({"cache": name, "result": result}, getattr(cache, attribute))
+        for name, cache in _CACHES.items()
+        for result, attribute in (("hit", "hits"), ("coalesced", "coalesced"), ("miss", "misses"))
+    ],
+    ("cache", "result"),
+)
+registry.callback(
+    "cloakroom_tryon_cache_hit_ratio",
+    "Share of try-on cache lookups served without a new generation.",
+    "gauge",
+    lambda: [({"cache": name}, cache.stats()["hit_rate"]) for name, cache in _CACHES.items()],
+    ("cache",),
+)
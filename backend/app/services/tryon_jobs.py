@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models.domain import Outfit, ProcessingJob
+from app.services.jobs import TERMINAL_JOB_STATUSES, running_job, update_active_job, update_job
+from app.services.tryon_cache import CachedTryOn, tryon_cache
+from app.services.tryon_pipeline import GarmentLayer, render_outfit
+from app.services.vton_service import (
+    PREDICTION_TERMINAL_STATUSES,
+    Prediction,
+    VtonUnavailableError,
+    prediction_result,
+    vton_client,
+)
+
+logger = logging.getLogger(__name__)
+
+# Accepted try-ons wait out provider back-pressure rather than failing.
+UNAVAILABLE_RETRY_MAX_SECONDS = 5
+
+
+def webhook_token(job_id: str) -> str:
+    return hmac.new(settings.VTON_WEBHOOK_SECRET.encode(), job_id.encode(), hashlib.sha256).hexdigest()
+
+
+def webhooks_enabled() -> bool:
+    return bool(not settings.ENABLE_MOCK_VTON and settings.VTON_WEBHOOK_BASE_URL and settings.VTON_WEBHOOK_SECRET)
+
+
+def webhook_url(job_id: str) -> str | None:
+    """Callback URL handed to the provider, or None when webhooks are not configured."""
+    if not webhooks_enabled():
+        return None
+    base_url = settings.VTON_WEBHOOK_BASE_URL.rstrip("/")
+    return f"{base_url}/api/tryon/webhook/{job_id}?token={webhook_token(job_id)}"
+
+
+def complete_tryon_job(
+    job_id: str,
+    outfit_id: int,
+    result_url: str | None = None,
+    error: str | None = None,
+    external_id: str | None = None,
+) -> None:
+    """
+    Record the generated image (or the failure) on the outfit and finish its
+    job, in one transaction. Only the first completion applies; a later one
+    (the worker racing the webhook, or a redelivery) leaves both untouched.
+    """
+    if error:
+        fields = {"status": "failed", "message": "Try-on generation failed", "error": error}
+    else:
+        fields = {"status": "succeeded", "progress": 100, "message": "Try-on generated successfully"}
+    if external_id:
+        fields["external_id"] = external_id
+
+    db = SessionLocal()
+    try:
+        if not update_active_job(db, job_id, **fields):
+            return
+        outfit = db.get(Outfit, outfit_id)
+        if outfit:
+            outfit.generated_image_url = result_url
+            outfit.status = "failed" if error else "ready"
+        db.commit()
+        if outfit and outfit.cache_key and not error:
+            tryon_cache.put(outfit.cache_key, CachedTryOn(outfit.id, result_url))
+    finally:
+        db.close()
+
+
+def complete_tryon_prediction(job_id: str, outfit_id: int, prediction: Prediction) -> bool:
+    """Apply a provider prediction to the job; returns whether it was final."""
+    if prediction.status not in PREDICTION_TERMINAL_STATUSES:
+        update_job(job_id, status="processing", progress=50, message=f"Provider status: {prediction.status}")
+        return False
+    try:
+        result_url = prediction_result(prediction)
+    except RuntimeError as exc:
+        complete_tryon_job(job_id, outfit_id, error=str(exc), external_id=prediction.id)
+    else:
+        complete_tryon_job(job_id, outfit_id, result_url=result_url, external_id=prediction.id)
+    return True
+
+
+async def run_tryon_job(
+    job_id: str,
+    outfit_id: int,
+    user_id: int,
+    user_avatar_url: str,
+    avatar_hash: str | None,
+    layers: list[GarmentLayer],
+) -> None:
+    """
+    Background worker: render the outfit layer by layer. With webhooks
+    configured the last provider step is submitted and left to the webhook;
+    otherwise every step is polled to completion here.
+    """
+    with running_job(job_id):
+        # The job helpers use sync sessions (the webhook route calls them from the threadpool);
+        # run them in a worker thread so they don't block the event loop here.
+        await asyncio.to_thread(update_job, job_id, status="processing", progress=10, message="Generating try-on")
+        callback_url = webhook_url(job_id)
+        submitted: list[Prediction] = []
+
+        async def _submit_final_layer(person_url: str, layer: GarmentLayer) -> str:
+            prediction = await vton_client.submit(person_url, layer.garment_url, layer.vton_category, callback_url)
+            submitted.append(prediction)
+            # Record the prediction straight away; the webhook may already be on its way
+            # (it also records the id, and once it has finished the job this is a no-op).
+            await asyncio.to_thread(
+                update_job, job_id, external_id=prediction.id, progress=60, message="Waiting for provider"
+            )
+            return prediction.output_url or ""
+
+        try:
+            while True:
+                try:
+                    result_url = await render_outfit(
+                        user_id,
+                        user_avatar_url,
+                        avatar_hash,
+                        layers,
+                        final_step=_submit_final_layer if callback_url else None,
+                    )
+                    break
+                except VtonUnavailableError as exc:
+                    await asyncio.sleep(min(exc.retry_after, UNAVAILABLE_RETRY_MAX_SECONDS))
+        except Exception as exc:
+            await asyncio.to_thread(complete_tryon_job, job_id, outfit_id, error=str(exc))
+            return
+
+        if submitted:
+            if submitted[0].status in PREDICTION_TERMINAL_STATUSES:
+                await asyncio.to_thread(complete_tryon_prediction, job_id, outfit_id, submitted[0])
+            return
+        await asyncio.to_thread(complete_tryon_job, job_id, outfit_id, result_url=result_url)
+
+
+async def poll_overdue_webhook_jobs(webhook_timeout_seconds: float) -> int:
+    """
+    Poll the provider for try-ons whose webhook hasn't arrived within
+    ``webhook_timeout_seconds`` of the job's last update (a lost or blocked
+    callback would otherwise leave them pending forever). A prediction still
+    running past ``VTON_MAX_WAIT_SECONDS`` fails the job. Returns the number of
+    jobs finished.
+    """
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        overdue = (
+            await db.execute(
+                select(ProcessingJob.id, ProcessingJob.outfit_id, ProcessingJob.external_id, ProcessingJob.created_at)
+                .where(
+                    ProcessingJob.kind == "tryon",
+                    ProcessingJob.external_id.is_not(None),
+                    ProcessingJob.status.not_in(TERMINAL_JOB_STATUSES),
+                    ProcessingJob.updated_at < now - timedelta(seconds=webhook_timeout_seconds),
+                )
+            )
+        ).all()
+
+    finished = 0
+    for job_id, outfit_id, external_id, created_at in overdue:
+        try:
+            prediction = await vton_client.fetch(Prediction(external_id, "processing", None, None, None))
+        except Exception as exc:
+            logger.warning("Polling overdue try-on job %s failed: %s", job_id, exc)
+            prediction = None
+        if prediction is not None and await asyncio.to_thread(
+            complete_tryon_prediction, job_id, outfit_id, prediction
+        ):
+            finished += 1
+            continue
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        if now - created_at > timedelta(seconds=settings.VTON_MAX_WAIT_SECONDS):
+            error = f"VTON prediction did not finish within {settings.VTON_MAX_WAIT_SECONDS:g}s."
+            await asyncio.to_thread(complete_tryon_job, job_id, outfit_id, error=error, external_id=external_id)
+            finished += 1
+    return finished
@@ -0,0 +1,100 @@
+from collections.abc import Awaitable, Callable
+from functools import partial
+from typing import NamedTuple
+
+from app.core.config import settings
+from app.models.domain import ClothingItem
+from app.services.storage import storage
+from app.services.tryon_cache import tryon_cache_key, tryon_layer_cache
+from app.services.vton_service import generate_vton_image
+
+# Layers are applied in this order, so a changed bottom reuses "avatar + top".
+OUTFIT_SLOTS = ("top", "bottom", "shoes", "accessory")
+
+
+class GarmentLayer(NamedTuple):
+    slot: str
+    item_id: int
+    content_hash: str | None
+    garment_url: str
+    vton_category: str | None  # None when the model cannot render this slot
+
+
+def layer_categories() -> dict[str, str]:
+    """Slot -> provider garment category, from VTON_LAYER_CATEGORIES (e.g. ``top=upper_body``)."""
+    categories = {}
+    for pair in settings.VTON_LAYER_CATEGORIES.split(","):
+        slot, _, category = pair.partition("=")
+        if slot.strip() and category.strip():
+            categories[slot.strip()] = category.strip()
+    return categories
+
+
+def build_layers(slots: list[tuple[str, int]], items: dict[int, ClothingItem]) -> list[GarmentLayer]:
+    """Outfit layers in application order for the requested ``(slot, item id)`` pairs."""
+    categories = layer_categories()
+    requested = dict(slots)
+    return [
+        GarmentLayer(
+            slot=slot,
+            item_id=requested[slot],
+            content_hash=items[requested[slot]].content_hash,
+            garment_url=storage.absolute_url(items[requested[slot]].image_url),
+            vton_category=categories.get(slot),
+        )
+        for slot in OUTFIT_SLOTS
+        if slot in requested
+    ]
+
+
+def layer_identity(layers: list[GarmentLayer]) -> list[tuple[str, int, str | None]]:
+    return [(layer.slot, layer.item_id, layer.content_hash) for layer in layers]
+
+
+def rendered_layers(layers: list[GarmentLayer]) -> list[GarmentLayer]:
+    return [layer for layer in layers if layer.vton_category]
+
+
+async def render_outfit(
+    user_id: int,
+    avatar_url: str,
+    avatar_hash: str | None,
+    layers: list[GarmentLayer],
+    final_step: Callable[[str, GarmentLayer], Awaitable[str]] | None = None,
+) -> str:
+    """
+    Dress the avatar one layer at a time, each provider call taking the
+    previous result as its person image. Starts from the longest prefix
+    already in the layer cache, and every step is single-flight, so outfits
+    that share a prefix (carousel neighbours, prefetches) generate it once.
+
+    ``final_step`` replaces the provider call for the last uncached layer
+    (e.g. to submit it with a webhook); its result is not layer-cached.
+    Without an ``avatar_hash`` (an avatar known only by URL) every layer is
+    generated and nothing is cached.
+    """
+    steps = rendered_layers(layers)
+    keys = [
+        tryon_cache_key(user_id, avatar_hash, layer_identity(steps[: index + 1]), settings.VTON_MODEL_VERSION)
+        if avatar_hash
+        else None
+        for index in range(len(steps))
+    ]
+
+    image_url, start = avatar_url, 0
+    for index in reversed(range(len(steps))):
+        cached = tryon_layer_cache.get(keys[index]) if keys[index] else None
+        if cached is not None:
+            image_url, start = cached, index + 1
+            break
+
+    for index in range(start, len(steps)):
+        layer = steps[index]
+        if final_step is not None and index == len(steps) - 1:
+            return await final_step(image_url, layer)
+        generate = partial(generate_vton_image, image_url, layer.garment_url, layer.vton_category)
+        if keys[index] is None:
+            image_url = await generate()
+        else:
+            image_url, _ = await tryon_layer_cache.get_or_generate(keys[index], generate)
+    return image_url
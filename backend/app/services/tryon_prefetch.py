@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import deque
+from typing import NamedTuple
+
+from app.core.config import settings
+from app.services.metrics import registry, tryon_prefetches_skipped
+from app.services.tryon_cache import tryon_cache_key, tryon_layer_cache
+from app.services.tryon_pipeline import OUTFIT_SLOTS, GarmentLayer, layer_identity, render_outfit, rendered_layers
+from app.services.vton_service import VtonUnavailableError, vton_client
+
+logger = logging.getLogger(__name__)
+
+IDLE_POLL_SECONDS = 0.5
+
+
+class PrefetchTask(NamedTuple):
+    user_id: int
+    avatar_url: str
+    avatar_hash: str
+    layers: list[GarmentLayer]
+    key: str  # layer-cache key of the fully rendered outfit
+
+
+class PrefetchOutcome(NamedTuple):
+    queued: int
+    cached: int
+    over_budget: int
+    cancelled: int
+
+
+def carousel_neighbours(
+    selection: dict[str, int], carousels: dict[str, list[int]], radius: int
+) -> list[dict[str, int]]:
+    """
+    Outfits one carousel swipe away from ``selection``: each slot's item is
+    replaced by its neighbours up to ``radius`` positions away, nearest first.
+    """
+    candidates: list[dict[str, int]] = []
+    for distance in range(1, radius + 1):
+        for slot in OUTFIT_SLOTS:
+            items = carousels.get(slot) or []
+            if selection.get(slot) not in items:
+                continue
+            index = items.index(selection[slot])
+            for neighbour in (index + distance, index - distance):
+                if 0 <= neighbour < len(items):
+                    candidate = {**selection, slot: items[neighbour]}
+                    if candidate != selection and candidate not in candidates:
+                        candidates.append(candidate)
+    return candidates
+
+
+class TryOnPrefetcher:
+    """
+    Low-priority background generation of try-ons the user is likely to ask
+    for next. Results land in the layer cache, so a later "Try on" for the
+    same outfit finds every layer already rendered.
+
+    Work is queued per user and served round-robin; it only starts while at
+    least ``reserved_slots`` provider call slots stay free for interactive
+    try-ons. Each user has a cap on queued work and an hourly generation
+    budget, and a new carousel state replaces whatever was still queued.
+    """
+
+    def __init__(self, workers: int, max_queued_per_user: int, budget_per_hour: int, reserved_slots: int):
+        self.workers = workers
+        self.max_queued_per_user = max_queued_per_user
+        self.budget_per_hour = budget_per_hour
+        self.reserved_slots = reserved_slots
+        self._queues: dict[int, deque[PrefetchTask]] = {}
+        self._running: set[str] = set()
+        self._started_at: dict[int, deque[float]] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self.generated = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def start(self) -> None:
+        """Spawn the worker tasks; called from the app lifespan."""
+        if self._worker_tasks or self.workers <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._worker_tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def aclose(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        for task in self._worker_tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._worker_tasks = []
+        self._running.clear()
+        self._queues.clear()
+        self._wakeup = None
+
+    def _budget_left(self, user_id: int) -> int:
+        started = self._started_at.setdefault(user_id, deque())
+        horizon = time.monotonic() - 3600
+        while started and started[0] < horizon:
+            started.popleft()
+        return self.budget_per_hour - len(started)
+
+    def schedule(
+        self, user_id: int, avatar_url: str, avatar_hash: str, outfits: list[list[GarmentLayer]]
+    ) -> PrefetchOutcome:
+        """Replace the user's queued prefetches with ``outfits`` (in priority order)."""
+        cancelled = len(self._queues.pop(user_id, ()))
+        queue: deque[PrefetchTask] = deque()
+        cached = over_budget = 0
+        budget = min(self._budget_left(user_id), self.max_queued_per_user)
+        for layers in outfits:
+            steps = rendered_layers(layers)
+            if not steps:
+                continue
+            key = tryon_cache_key(user_id, avatar_hash, layer_identity(steps), settings.VTON_MODEL_VERSION)
+            if tryon_layer_cache.get(key) is not None or key in self._running:
+                cached += 1
+            elif len(queue) >= budget:
+                over_budget += 1
+                tryon_prefetches_skipped.inc(reason="over_budget")
+            elif all(task.key != key for task in queue):
+                queue.append(PrefetchTask(user_id, avatar_url, avatar_hash, layers, key))
+
+        if queue:
+            self._queues[user_id] = queue
+            if self._wakeup is not None:
+                self._wakeup.set()
+        self.cancelled += cancelled
+        return PrefetchOutcome(queued=len(queue), cached=cached, over_budget=over_budget, cancelled=cancelled)
+
+    def cancel(self, user_id: int) -> int:
+        """Drop the user's queued prefetches. Generations already started finish into the cache."""
+        cancelled = len(self._queues.pop(user_id, ()))
+        self.cancelled += cancelled
+        return cancelled
+
+    def _next_task(self) -> PrefetchTask | None:
+        for user_id in list(self._queues):
+            queue = self._queues.pop(user_id)
+            task = queue.popleft()
+            if queue:
+                # Re-insert at the end so users are served round-robin.
+                self._queues[user_id] = queue
+            if self._budget_left(user_id) > 0:
+                return task
+            # The user's hourly budget ran out while this was queued.
+            tryon_prefetches_skipped.inc(reason="over_budget")
+        return None
+
+    async def _work(self) -> None:
+        while True:
+            if vton_client.idle_slots <= self.reserved_slots and not settings.ENABLE_MOCK_VTON:
+                await asyncio.sleep(IDLE_POLL_SECONDS)
+                continue
+            task = self._next_task()
+            if task is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            self._started_at.setdefault(task.user_id, deque()).append(time.monotonic())
+            self._running.add(task.key)
+            try:
+                await render_outfit(task.user_id, task.avatar_url, task.avatar_hash, task.layers)
+                self.generated += 1
+            except VtonUnavailableError:
+                # The provider is busy or failing; speculative work just gives up.
+                self.failed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("Try-on prefetch failed")
+            finally:
+                self._running.discard(task.key)
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "running": len(self._running),
+            "generated": self.generated,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
+
+
+tryon_prefetcher = TryOnPrefetcher(
+    workers=settings.TRYON_PREFETCH_WORKERS,
+    max_queued_per_user=settings.TRYON_PREFETCH_MAX_QUEUED_PER_USER,
+    budget_per_hour=settings.TRYON_PREFETCH_BUDGET_PER_HOUR,
+    reserved_slots=settings.TRYON_PREFETCH_RESERVED_SLOTS,
+)
+
+registry.callback(
+    "cloakroom_tryon_prefetch_tasks",
+    "Speculative try-ons by state.",
+    "gauge",
+    lambda: [({"state": state}, tryon_prefetcher.stats()[state]) for state in ("queued", "running")],
+    ("state",),
+)
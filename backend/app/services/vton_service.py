@@ -1,6 +1,328 @@
 import asyncio
+import contextlib
+import importlib.util
+import logging
+import random
+import time
+from typing import NamedTuple
+
 import httpx
 from app.core.config import settings
+from app.services.metrics import registry, stage_timer
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Creating a prediction is not idempotent: after a 5xx or a dropped connection the
+# provider may already be running it, so POSTs are only retried when it surely is not.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+UNPROCESSED_STATUS_CODES = {429}
+UNSENT_REQUEST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+PREDICTION_TERMINAL_STATUSES = {"succeeded", "failed", "canceled"}
+
+
+class VtonUnavailableError(RuntimeError):
+    """Raised when the provider is shedding load: circuit open or no free call slot."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failed calls and fails fast
+    for ``reset_seconds``; then lets a single trial call through (half-open)
+    and closes again on its success.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            retry_after = max(0.0, self.reset_seconds - (self._clock() - self._opened_at))
+            raise VtonUnavailableError("Try-on provider is temporarily unavailable.", retry_after=retry_after or 1.0)
+        if state == "half_open":
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+
+
+class Prediction(NamedTuple):
+    """A provider prediction (Replicate-style create-then-poll resource)."""
+
+    id: str | None
+    status: str  # starting, processing, succeeded, failed, canceled
+    output_url: str | None
+    error: str | None
+    poll_url: str | None
+
+
+def parse_prediction(payload: dict) -> Prediction:
+    """Read a prediction payload; providers that answer synchronously just return ``output``."""
+    output = payload.get("output")
+    if isinstance(output, list):
+        output = str(output[-1]) if output else None
+    elif not isinstance(output, str):
+        output = None
+    status = payload.get("status") or ("succeeded" if output else "failed")
+    return Prediction(
+        id=payload.get("id"),
+        status=status,
+        output_url=output,
+        error=payload.get("error"),
+        poll_url=(payload.get("urls") or {}).get("get"),
+    )
+
+
+def prediction_result(prediction: Prediction) -> str:
+    """The generated image URL of a finished prediction, or the provider's failure."""
+    if prediction.status != "succeeded":
+        raise RuntimeError(prediction.error or f"VTON prediction {prediction.status}.")
+    if not prediction.output_url:
+        raise RuntimeError("Unexpected VTON provider response payload.")
+    return prediction.output_url
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class VtonClient:
+    """
+    Long-lived client for the VTON provider: one pooled keep-alive
+    ``httpx.AsyncClient`` (HTTP/2 when ``h2`` is installed), a cap on
+    concurrent provider calls, jittered retries on 429/5xx and transport
+    errors, and a circuit breaker so an unhealthy provider fails fast.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str | None,
+        model_version: str,
+        max_concurrency: int = 4,
+        max_connections: int = 10,
+        keepalive_expiry: float = 60,
+        http2: bool = True,
+        timeout: float = 90,
+        connect_timeout: float = 5,
+        queue_timeout: float = 10,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+        backoff_max_seconds: float = 8,
+        circuit_failure_threshold: int = 5,
+        circuit_reset_seconds: float = 30,
+        poll_interval: float = 1,
+        max_wait: float = 300,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model_version = model_version
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.circuit = CircuitBreaker(circuit_failure_threshold, circuit_reset_seconds)
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        if http2 and not _http2_available():
+            logger.info("h2 is not installed; the VTON client falls back to HTTP/1.1")
+        self._http2 = http2 and _http2_available()
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._active_calls = 0
+
+    @property
+    def idle_slots(self) -> int:
+        """Provider call slots not in use right now."""
+        return self.max_concurrency - self._active_calls
+
+    def start(self) -> None:
+        """Open the pooled client; called from the app lifespan."""
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
+            self._client = httpx.AsyncClient(
+                headers=headers,
+                limits=self._limits,
+                timeout=self._timeout,
+                http2=self._http2,
+                transport=self._transport,
+            )
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._slots = None
+
+    def _backoff(self, attempt: int, response: httpx.Response | None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max_seconds)
+        # Full jitter keeps a burst of retries from hitting the provider in lockstep.
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_seconds * 2**attempt))
+
+    async def _send_with_retries(self, method: str, url: str, payload: dict | None) -> httpx.Response:
+        if method in IDEMPOTENT_METHODS:
+            retry_statuses, retry_errors = RETRYABLE_STATUS_CODES, httpx.TransportError
+        else:
+            retry_statuses, retry_errors = UNPROCESSED_STATUS_CODES, UNSENT_REQUEST_ERRORS
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self._client.request(method, url, json=payload)
+                if response.status_code not in retry_statuses:
+                    return response
+            except retry_errors:
+                if attempt == self.max_retries:
+                    raise
+            if attempt == self.max_retries:
+                return response
+            await asyncio.sleep(self._backoff(attempt, response))
+
+    async def _request(self, method: str, url: str, payload: dict | None = None) -> httpx.Response:
+        """Send with retries; the circuit counts one failure per exhausted call, not per attempt."""
+        self.circuit.before_call()
+        try:
+            with stage_timer("provider_call"):
+                response = await self._send_with_retries(method, url, payload)
+        except BaseException:
+            self.circuit.record_failure()
+            raise
+        if response.status_code in RETRYABLE_STATUS_CODES or response.is_server_error:
+            self.circuit.record_failure()
+        else:
+            # Other 4xx responses are bad requests, not an unhealthy provider.
+            self.circuit.record_success()
+        response.raise_for_status()
+        return response
+
+    @contextlib.asynccontextmanager
+    async def _call_slot(self):
+        if not self.api_key:
+            raise RuntimeError("VTON_API_KEY is required when ENABLE_MOCK_VTON is false.")
+        self.start()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError as exc:
+            raise VtonUnavailableError(
+                "Too many try-ons in progress; try again shortly.", retry_after=self.queue_timeout
+            ) from exc
+        self._active_calls += 1
+        try:
+            yield
+        finally:
+            self._active_calls -= 1
+            self._slots.release()
+
+    async def _create(
+        self, user_avatar_url: str, garment_url: str, category: str, webhook_url: str | None = None
+    ) -> Prediction:
+        payload = {
+            "version": self.model_version,
+            "input": {
+                "human_image": user_avatar_url,
+                "garm_image": garment_url,
+                "category": category,
+                "garment_des": "a piece of clothing",
+            },
+        }
+        if webhook_url:
+            payload["webhook"] = webhook_url
+            payload["webhook_events_filter"] = ["completed"]
+        response = await self._request("POST", self.api_url, payload)
+        return parse_prediction(response.json())
+
+    async def fetch(self, prediction: Prediction) -> Prediction:
+        """Poll the provider for the current state of ``prediction``."""
+        url = prediction.poll_url or f"{self.api_url.rstrip('/')}/{prediction.id}"
+        response = await self._request("GET", url)
+        return parse_prediction(response.json())
+
+    async def submit(
+        self, user_avatar_url: str, garment_url: str, category: str, webhook_url: str | None = None
+    ) -> Prediction:
+        """Create a prediction and return without waiting; the provider calls ``webhook_url`` when done."""
+        async with self._call_slot():
+            return await self._create(user_avatar_url, garment_url, category, webhook_url)
+
+    async def generate(self, user_avatar_url: str, garment_url: str, category: str) -> str:
+        """Create a prediction and poll it to completion, holding one call slot throughout."""
+        async with self._call_slot():
+            prediction = await self._create(user_avatar_url, garment_url, category)
+            deadline = time.monotonic() + self.max_wait
+            while prediction.status not in PREDICTION_TERMINAL_STATUSES:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"VTON prediction did not finish within {self.max_wait:g}s.")
+                await asyncio.sleep(self.poll_interval)
+                prediction = await self.fetch(prediction)
+        return prediction_result(prediction)
+
+    def describe(self) -> dict:
+        return {"circuit": self.circuit.state, "http2": self._http2, "max_concurrency": self.max_concurrency}
+
+
+vton_client = VtonClient(
+    api_url=settings.VTON_API_URL,
+    api_key=settings.VTON_API_KEY,
+    model_version=settings.VTON_MODEL_VERSION,
+    max_concurrency=settings.VTON_MAX_CONCURRENCY,
+    max_connections=settings.VTON_MAX_CONNECTIONS,
+    keepalive_expiry=settings.VTON_KEEPALIVE_EXPIRY_SECONDS,
+    http2=settings.VTON_HTTP2,
+    timeout=settings.VTON_TIMEOUT_SECONDS,
+    connect_timeout=settings.VTON_CONNECT_TIMEOUT_SECONDS,
+    queue_timeout=settings.VTON_QUEUE_TIMEOUT_SECONDS,
+    max_retries=settings.VTON_MAX_RETRIES,
+    backoff_seconds=settings.VTON_RETRY_BACKOFF_SECONDS,
+    backoff_max_seconds=settings.VTON_RETRY_BACKOFF_MAX_SECONDS,
+    circuit_failure_threshold=settings.VTON_CIRCUIT_FAILURE_THRESHOLD,
+    circuit_reset_seconds=settings.VTON_CIRCUIT_RESET_SECONDS,
+    poll_interval=settings.VTON_POLL_INTERVAL_SECONDS,
+    max_wait=settings.VTON_MAX_WAIT_SECONDS,
+)
+
+registry.callback(
+    "cloakroom_vton_active_calls",
+    "Provider calls holding a concurrency slot.",
+    "gauge",
+    lambda: [({}, vton_client.max_concurrency - vton_client.idle_slots)],
+)
 
 
 async def generate_vton_image(user_avatar_url: str, garment_url: str, category: str) -> str:
@@ -8,35 +330,10 @@ async def generate_vton_image(user_avatar_url: str, garment_url: str, category:
     Calls a serverless GPU provider (e.g., Replicate) to run a VTON model (like IDM-VTON).
     For MVP, we simulate a delay and return a dummy result URL.
     """
-    
+
     if settings.ENABLE_MOCK_VTON:
         # Simulated delay for model generation (5-10 seconds in reality, we use 2 for MVP testing)
         await asyncio.sleep(2)
         return "https://via.placeholder.com/400x600.png?text=VTON+Result"
 
-    if not settings.VTON_API_KEY:
-        raise RuntimeError("VTON_API_KEY is required when ENABLE_MOCK_VTON is false.")
-
-    async with httpx.AsyncClient(timeout=90) as client:
-        response = await client.post(
-            settings.VTON_API_URL,
-            headers={"Authorization": f"Bearer {settings.VTON_API_KEY}"},
-            json={
-                "version": settings.VTON_MODEL_VERSION,
-                "input": {
-                    "human_image": user_avatar_url,
-                    "garm_image": garment_url,
-                    "category": category,
-                    "garment_des": "a piece of clothing",
-                },
-            },
-        )
-        response.raise_for_status()
-        payload = response.json()
-
-    output = payload.get("output")
-    if isinstance(output, str):
-        return output
-    if isinstance(output, list) and output:
-        return str(output[-1])
-    raise RuntimeError("Unexpected VTON provider response payload.")
+    return await vton_client.generate(user_avatar_url, garment_url, category)
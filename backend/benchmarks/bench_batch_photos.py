@@ -0,0 +1,98 @@
+"""
+Throughput of multi-angle photo processing: serial per-photo inference (the
+old add_item_photos loop) versus one parallel batch on the inference executor.
+
+    cd backend
+    python benchmarks/bench_batch_photos.py --photos 8 --workers 4 --executor process
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.inference_pool import InferenceExecutor  # noqa: E402
+from app.services.ml_service import remove_background  # noqa: E402
+
+
+def _sample_photos(count: int, width: int, height: int) -> list[bytes]:
+    photos = []
+    for index in range(count):
+        image = Image.radial_gradient("L").resize((width, height)).convert("RGB")
+        image.paste((index * 30 % 255, 90, 160), (width // 4, height // 4, width * 3 // 4, height * 3 // 4))
+        stream = io.BytesIO()
+        image.save(stream, format="JPEG", quality=90)
+        photos.append(stream.getvalue())
+    return photos
+
+
+async def _serial(executor: InferenceExecutor, photos: list[bytes]) -> None:
+    for photo in photos:
+        await executor.run(remove_background, photo)
+
+
+async def _batched(executor: InferenceExecutor, photos: list[bytes]) -> None:
+    await executor.map(remove_background, photos)
+
+
+async def _measure(label: str, runner, executor: InferenceExecutor, photos: list[bytes], rounds: int) -> dict:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await runner(executor, photos)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    return {
+        "path": label,
+        "best_seconds": round(best, 4),
+        "photos_per_second": round(len(photos) / best, 2),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--photos", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--executor", choices=["thread", "process"], default="thread")
+    parser.add_argument("--width", type=int, default=3024)
+    parser.add_argument("--height", type=int, default=4032)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    photos = _sample_photos(args.photos, args.width, args.height)
+    executor = InferenceExecutor(kind=args.executor, max_workers=args.workers, queue_size=args.photos)
+    try:
+        await executor.warm_up()
+        # One throwaway round so pool start-up is not billed to either path.
+        await _batched(executor, photos[: args.workers])
+        serial = await _measure("serial", _serial, executor, photos, args.rounds)
+        batched = await _measure("batched", _batched, executor, photos, args.rounds)
+    finally:
+        executor.shutdown()
+
+    print(
+        json.dumps(
+            {
+                "benchmark": "batch_photos",
+                "executor": args.executor,
+                "workers": args.workers,
+                "photos": args.photos,
+                "resolution": f"{args.width}x{args.height}",
+                "segmentation_model": executor.model_status()["state"],
+                "results": [serial, batched],
+                "speedup": round(serial["best_seconds"] / batched["best_seconds"], 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
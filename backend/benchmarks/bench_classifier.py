@@ -0,0 +1,172 @@
+"""
+Latency of the garment classifier and dominant-color extraction, and its
+accuracy on a directory of labelled cutouts.
+
+Without --dataset it times synthetic garment outlines drawn on the fly. No
+accuracy is reported for them: the silhouette heuristic was tuned on the same
+outlines, so scoring it there says nothing about real photos. Point --dataset
+at labelled cutouts (``<dir>/<category>/*.png``, transparent background) for
+an accuracy figure.
+
+    cd backend
+    python benchmarks/bench_classifier.py --per-class 200 --batch-size 16
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.classifier import GARMENT_CATEGORIES, dominant_color, garment_classifier  # noqa: E402
+
+
+def _jitter(rng: random.Random, value: float, spread: float = 0.12) -> float:
+    return value * rng.uniform(1 - spread, 1 + spread)
+
+
+def synthetic_garment(category: str, rng: random.Random, size: int = 512) -> Image.Image:
+    """Flat-lay outline of a garment of ``category`` on a transparent canvas."""
+    image = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    fill = tuple(rng.randrange(256) for _ in range(3)) + (255,)
+    s = size * rng.uniform(0.55, 0.9)
+    cx, cy = size / 2, size / 2
+
+    def box(x0, y0, x1, y1):
+        draw.rectangle([cx + x0 * s, cy + y0 * s, cx + x1 * s, cy + y1 * s], fill=fill)
+
+    if category == "top":
+        body, height, sleeve = _jitter(rng, 0.28), _jitter(rng, 0.42), _jitter(rng, 0.2)
+        box(-body, -height, body, height)
+        draw.polygon(
+            [
+                (cx - body * s, cy - height * s),
+                (cx - (body + sleeve) * s, cy - (height - 0.1) * s),
+                (cx - (body + sleeve * 0.7) * s, cy - (height - 0.3) * s),
+                (cx - body * s, cy - (height - 0.22) * s),
+            ],
+            fill=fill,
+        )
+        draw.polygon(
+            [
+                (cx + body * s, cy - height * s),
+                (cx + (body + sleeve) * s, cy - (height - 0.1) * s),
+                (cx + (body + sleeve * 0.7) * s, cy - (height - 0.3) * s),
+                (cx + body * s, cy - (height - 0.22) * s),
+            ],
+            fill=fill,
+        )
+    elif category == "outerwear":
+        body, height, gap, sleeve = _jitter(rng, 0.2), _jitter(rng, 0.5), _jitter(rng, 0.04), _jitter(rng, 0.08)
+        box(-body, -height, body, height)
+        box(-body - gap - sleeve, -height + 0.05, -body - gap, _jitter(rng, 0.3))
+        box(body + gap, -height + 0.05, body + gap + sleeve, _jitter(rng, 0.3))
+        box(-body - gap - sleeve, -height, body + gap + sleeve, -height + 0.08)
+    elif category == "bottom":
+        waist, height = _jitter(rng, 0.22), _jitter(rng, 0.5)
+        if rng.random() < 0.7:
+            gap = _jitter(rng, 0.03)
+            box(-waist, -height, waist, -height + _jitter(rng, 0.25))
+            box(-waist, -height, -gap, height)
+            box(gap, -height, waist, height)
+        else:
+            hem = _jitter(rng, 0.4)
+            height *= 0.6
+            draw.polygon(
+                [(cx - waist * s, cy - height * s), (cx + waist * s, cy - height * s), (cx + hem * s, cy + height * s), (cx - hem * s, cy + height * s)],
+                fill=fill,
+            )
+    elif category == "shoes":
+        length, height = _jitter(rng, 0.45), _jitter(rng, 0.22)
+        box(-length, height - 0.06, length, height)
+        draw.ellipse([cx - length * s, cy - height * s, cx + length * 0.3 * s, cy + height * s], fill=fill)
+        draw.ellipse([cx - length * 0.2 * s, cy + 0.0 * s, cx + length * s, cy + height * s], fill=fill)
+    else:
+        radius = _jitter(rng, 0.35)
+        if rng.random() < 0.5:
+            # Handbag: body plus a handle loop with a hole in it.
+            box(-radius, -radius * 0.2, radius, radius * 0.8)
+            draw.arc(
+                [cx - radius * 0.6 * s, cy - radius * 0.9 * s, cx + radius * 0.6 * s, cy + radius * 0.2 * s],
+                180,
+                360,
+                fill=fill,
+                width=max(2, int(s * 0.04)),
+            )
+        else:
+            # Hat: brim and crown.
+            draw.ellipse([cx - radius * s, cy, cx + radius * s, cy + radius * 0.35 * s], fill=fill)
+            draw.ellipse([cx - radius * 0.55 * s, cy - radius * 0.7 * s, cx + radius * 0.55 * s, cy + radius * 0.25 * s], fill=fill)
+    return image.rotate(rng.uniform(-8, 8), resample=Image.BILINEAR)
+
+
+def _load_dataset(root: Path) -> list[tuple[Image.Image, str]]:
+    samples = []
+    for category in GARMENT_CATEGORIES:
+        for path in sorted((root / category).glob("*.png")):
+            image = Image.open(path)
+            image.load()
+            samples.append((image.convert("RGBA"), category))
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", type=Path, default=None)
+    parser.add_argument("--per-class", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.dataset:
+        samples = _load_dataset(args.dataset)
+    else:
+        rng = random.Random(args.seed)
+        samples = [(synthetic_garment(category, rng), category) for category in GARMENT_CATEGORIES for _ in range(args.per_class)]
+
+    garment_classifier.warm_up()
+    started = time.perf_counter()
+    features = [garment_classifier.prepare(image) for image, _ in samples]
+    prepare_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predictions = []
+    for offset in range(0, len(features), args.batch_size):
+        predictions.extend(garment_classifier.predict(features[offset : offset + args.batch_size]))
+    predict_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for image, _ in samples:
+        dominant_color(image)
+    color_seconds = time.perf_counter() - started
+
+    count = len(samples)
+    report = {
+        "benchmark": "garment_classifier",
+        **garment_classifier.describe(),
+        "dataset": str(args.dataset) if args.dataset else "synthetic",
+        "samples": count,
+        "batch_size": args.batch_size,
+        "prepare_ms_per_image": round(prepare_seconds * 1000 / count, 3),
+        "predict_ms_per_image": round(predict_seconds * 1000 / count, 3),
+        "dominant_color_ms_per_image": round(color_seconds * 1000 / count, 3),
+    }
+    if args.dataset:
+        per_class = {}
+        for category in GARMENT_CATEGORIES:
+            labelled = [predicted for predicted, (_, label) in zip(predictions, samples) if label == category]
+            if labelled:
+                per_class[category] = round(sum(predicted == category for predicted in labelled) / len(labelled), 3)
+        report["accuracy"] = round(sum(predicted == label for predicted, (_, label) in zip(predictions, samples)) / count, 3)
+        report["per_class_accuracy"] = per_class
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
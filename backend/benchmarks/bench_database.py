@@ -0,0 +1,121 @@
+"""
+Closet-list and upload throughput against a throwaway SQLite database,
+driving the app in-process over ASGI with concurrent clients.
+
+Segmentation is replaced by a fixed cutout so the numbers reflect request
+handling and database work, not model inference. ``--baseline`` turns off
+WAL and drops the composite indexes to reproduce the old setup.
+
+    cd backend
+    python benchmarks/bench_database.py --items 5000 --concurrency 8
+    python benchmarks/bench_database.py --items 5000 --concurrency 8 --baseline
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from harness import configure_environment, drive, encoded_image, seed_closets  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--owners", type=int, default=20)
+    parser.add_argument("--items", type=int, default=2000, help="items per owner")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--baseline", action="store_true", help="no WAL, no composite indexes")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="cloakroom-bench-"))
+    configure_environment(workdir, SQLITE_WAL="false" if args.baseline else "true")
+
+    import httpx
+    from sqlalchemy import text
+
+    from app.schema_version import upgrade_database
+
+    upgrade_database()
+
+    from app.api import upload as upload_api
+    from app.database import engine
+    from app.main import app
+    from app.services.classifier import garment_classifier
+    from app.services.ml_service import SegmentedGarment
+
+    if args.baseline:
+        with engine.begin() as connection:
+            for name in (
+                "ix_clothing_items_owner_id_created_at",
+                "ix_clothing_item_photos_item_id_created_at",
+                "ix_outfits_owner_id_cache_key",
+            ):
+                connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+    cutout = Image.new("RGBA", (64, 64), (20, 20, 20, 255))
+    cutout_stream = io.BytesIO()
+    cutout.save(cutout_stream, format="PNG")
+    segmented = SegmentedGarment(cutout_stream.getvalue(), garment_classifier.prepare(cutout), "black")
+    upload_api.segment_garment = lambda _source: segmented
+
+    owner_ids = list(seed_closets(args.owners, args.items))
+
+    async def list_full(client, index):
+        return await client.get(f"/api/closet/{owner_ids[index % len(owner_ids)]}")
+
+    async def list_page(client, index):
+        return await client.get(f"/api/closet/{owner_ids[index % len(owner_ids)]}?limit=50&include_photos=false")
+
+    etags: dict[int, str] = {}
+
+    async def revalidate(client, index):
+        owner_id = owner_ids[index % len(owner_ids)]
+        headers = {"If-None-Match": etags[owner_id]} if owner_id in etags else {}
+        response = await client.get(f"/api/closet/{owner_id}?limit=50", headers=headers)
+        etags.setdefault(owner_id, response.headers.get("ETag", ""))
+        return response
+
+    async def upload(client, index):
+        return await client.post(
+            "/api/upload/",
+            data={"owner_id": str(owner_ids[index % len(owner_ids)])},
+            files={"file": (f"bench-{index}.jpg", encoded_image(index), "image/jpeg")},
+        )
+
+    async def run() -> dict:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            full_requests = max(1, args.requests // 10)  # full closets are large; fewer of them
+            return {
+                "closet_full": await drive(client, full_requests, args.concurrency, list_full),
+                "closet_page": await drive(client, args.requests, args.concurrency, list_page),
+                "closet_304": await drive(client, args.requests, args.concurrency, revalidate),
+                "upload": await drive(client, args.uploads, args.concurrency, upload),
+            }
+
+    results = asyncio.run(run())
+    print(
+        json.dumps(
+            {
+                "baseline": args.baseline,
+                "owners": args.owners,
+                "items_per_owner": args.items,
+                "concurrency": args.concurrency,
+                **results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Load suite for the upload, photo, closet and try-on paths, driving the app
+in-process over ASGI against a synthetic dataset at several concurrency levels.
+
+The dataset is generated per run: ``--owners`` users with ``--items`` ready
+items each (``--photos`` photos per item), and distinct JPEG/PNG/HEIC photos
+for every upload so nothing is served from the dedupe cache. Segmentation is
+replaced by a fixed elliptical mask, so decode, encode, derivatives, storage
+and the database are real but model inference is not (see
+bench_batch_photos.py for that). Try-ons go to a mock provider over the real
+VTON client with ``--provider-latency-ms`` per prediction.
+
+Results are JSON: p50/p99 latency, throughput and status counts per scenario
+and concurrency. ``--compare`` checks them against a previous run and exits
+non-zero on a regression, for CI.
+
+    cd backend
+    python benchmarks/bench_load.py --concurrency 1,8,32 --output load.json
+    python benchmarks/bench_load.py --concurrency 1,8,32 --compare load.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from harness import IMAGE_FORMATS, configure_environment, drive, encoded_image, seed_closets  # noqa: E402
+
+SCENARIOS = ("closet", "upload", "photos", "tryon")
+
+
+def _mock_provider(latency_seconds: float):
+    import httpx
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency_seconds)
+        prediction_id = uuid.uuid4().hex
+        output = [f"https://vton.example.com/{prediction_id}.png"]
+        return httpx.Response(201, json={"id": prediction_id, "status": "succeeded", "output": output})
+
+    return httpx.MockTransport(handler)
+
+
+def _fixed_mask(image, _max_side):
+    from PIL import Image, ImageDraw
+
+    mask = Image.new("L", image.size, 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, image.width - 1, image.height - 1), fill=255)
+    return mask
+
+
+def _upload_files(count: int, formats: list[str], size: int) -> list[tuple[str, bytes, str]]:
+    """Distinct photos cycling through ``formats``, as httpx ``(filename, content, content type)`` tuples."""
+    files = []
+    for index in range(count):
+        image_format = formats[index % len(formats)]
+        _, content_type, extension = IMAGE_FORMATS[image_format]
+        files.append((f"bench-{index}{extension}", encoded_image(index, image_format, size), content_type))
+    return files
+
+
+def _regressions(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Scenario/concurrency pairs whose p99 grew or throughput fell by more than ``tolerance``."""
+    found = []
+    for scenario, levels in current["results"].items():
+        for concurrency, result in levels.items():
+            previous = baseline.get("results", {}).get(scenario, {}).get(concurrency)
+            if not previous:
+                continue
+            if result["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+                found.append(f"{scenario}@{concurrency}: p99 {previous['p99_ms']} -> {result['p99_ms']} ms")
+            if result["rps"] < previous["rps"] * (1 - tolerance):
+                found.append(f"{scenario}@{concurrency}: {previous['rps']} -> {result['rps']} req/s")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--owners", type=int, default=20)
+    parser.add_argument("--items", type=int, default=500, help="items per owner")
+    parser.add_argument("--photos", type=int, default=3, help="photos per seeded item")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and level")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--image-size", type=int, default=512, help="longest side of uploaded photos")
+    parser.add_argument("--formats", default="jpeg,png,heic", help=f"upload formats from {', '.join(IMAGE_FORMATS)}")
+    parser.add_argument("--provider-latency-ms", type=float, default=200)
+    parser.add_argument("--output", type=Path, help="also write the JSON results here")
+    parser.add_argument("--compare", type=Path, help="previous results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario in SCENARIOS]
+    formats = [image_format for image_format in args.formats.split(",") if image_format in IMAGE_FORMATS]
+
+    workdir = Path(tempfile.mkdtemp(prefix="cloakroom-load-"))
+    configure_environment(
+        workdir,
+        ENABLE_MOCK_VTON="false",
+        VTON_API_KEY="bench",
+        VTON_HTTP2="false",
+        VTON_MAX_CONCURRENCY=str(max(levels)),
+        INFERENCE_EXECUTOR="thread",
+        # Admit every concurrent upload; shedding is measured separately by the 429 tests.
+        INFERENCE_QUEUE_SIZE=str(max(levels) * 4),
+        # The photos scenario sends three per request; capacity must cover one request's batch.
+        MAX_PHOTOS_PER_REQUEST="3",
+        TRYON_PREFETCH_WORKERS="0",
+        BLOB_EVICTION_INTERVAL_SECONDS="0",
+    )
+
+    import httpx
+
+    from app.schema_version import upgrade_database
+
+    upgrade_database()
+
+    from app.main import app
+    from app.services import ml_service
+    from app.services.vton_service import vton_client
+
+    ml_service._segmentation_mask = _fixed_mask
+    vton_client._transport = _mock_provider(args.provider_latency_ms / 1000)
+
+    closets = seed_closets(args.owners, args.items, args.photos)
+    owner_ids = list(closets)
+    # Encode every photo up front so client-side encoding stays out of the timings.
+    photos = _upload_files(args.requests * len(levels) * 4, formats, args.image_size)  # 1 upload or 3 photos each
+    next_photo = iter(photos)
+
+    async def closet(client, index):
+        owner_id = owner_ids[index % len(owner_ids)]
+        return await client.get(f"/api/closet/{owner_id}?limit=50")
+
+    async def upload(client, index):
+        return await client.post(
+            "/api/upload/",
+            data={"owner_id": str(owner_ids[index % len(owner_ids)])},
+            files={"file": next(next_photo)},
+        )
+
+    async def add_photos(client, index):
+        owner_id = owner_ids[index % len(owner_ids)]
+        item_id = closets[owner_id][index % len(closets[owner_id])]
+        files = [("files", next(next_photo)) for _ in range(3)]
+        return await client.post(f"/api/items/{item_id}/photos", files=files)
+
+    tryon_index = itertools.count()
+
+    async def tryon(client, _index):
+        # A different (owner, top) pair per request, so every try-on is a cache miss.
+        index = next(tryon_index)
+        owner_id = owner_ids[index % len(owner_ids)]
+        top_id = closets[owner_id][(index // len(owner_ids)) % len(closets[owner_id])]
+        return await client.post("/api/tryon/", json={"user_id": owner_id, "top_id": top_id})
+
+    requests = {"closet": closet, "upload": upload, "photos": add_photos, "tryon": tryon}
+
+    async def run() -> dict:
+        results: dict[str, dict[str, dict]] = {}
+        vton_client.start()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                for scenario in scenarios:
+                    for level in levels:
+                        results.setdefault(scenario, {})[str(level)] = await drive(
+                            client, args.requests, level, requests[scenario]
+                        )
+        finally:
+            await vton_client.aclose()
+        return results
+
+    report = {
+        "config": {
+            "owners": args.owners,
+            "items_per_owner": args.items,
+            "photos_per_item": args.photos,
+            "requests": args.requests,
+            "image_size": args.image_size,
+            "formats": formats,
+            "provider_latency_ms": args.provider_latency_ms,
+        },
+        "results": asyncio.run(run()),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        regressions = _regressions(report, json.loads(args.compare.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
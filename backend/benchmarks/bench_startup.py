@@ -0,0 +1,73 @@
+"""
+Cold-import cost of the API: wall time, peak RSS and which heavy ML modules
+``import app.main`` drags in. Each sample runs in a fresh interpreter.
+
+    cd backend
+    python benchmarks/bench_startup.py --runs 5
+    python -X importtime -c "import app.main" 2> importtime.txt  # per-module breakdown
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("rembg", "onnxruntime", "pillow_heif", "scipy", "skimage")
+
+PROBE = f"""
+import json, resource, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+try:
+    # VmHWM is this image's peak; ru_maxrss on Linux also counts the parent's pages copied at fork.
+    with open("/proc/self/status") as status:
+        peak_kb = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "max_rss_mb": peak_kb / 1024,
+    "heavy_modules": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_import() -> dict:
+    """Import ``app.main`` in a fresh interpreter against a throwaway database."""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{workdir}/startup.db", "UPLOAD_DIR": f"{workdir}/uploads"}
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [measure_import() for _ in range(args.runs)]
+    seconds = [sample["import_seconds"] for sample in samples]
+    print(
+        json.dumps(
+            {
+                "runs": args.runs,
+                "import_seconds_median": round(statistics.median(seconds), 3),
+                "import_seconds_max": round(max(seconds), 3),
+                "max_rss_mb": round(max(sample["max_rss_mb"] for sample in samples), 1),
+                "heavy_modules": samples[-1]["heavy_modules"],
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
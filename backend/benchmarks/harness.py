@@ -0,0 +1,111 @@
+"""
+Shared pieces of the in-process benchmarks: a throwaway environment, synthetic
+images and closets, and a concurrent request driver with latency percentiles.
+
+Settings are read when ``app`` is first imported, so call
+``configure_environment`` before importing anything from it.
+"""
+
+import asyncio
+import io
+import os
+import statistics
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+# name -> (Pillow format, content type, file extension)
+IMAGE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "png": ("PNG", "image/png", ".png"),
+    "heic": ("HEIF", "image/heic", ".heic"),
+}
+
+
+def configure_environment(workdir: Path, **overrides: str) -> None:
+    """Point the app at a fresh SQLite database and upload directory under ``workdir``."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ["UPLOAD_DIR"] = str(workdir / "uploads")
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ["PRELOAD_SEGMENTATION_MODEL"] = "false"
+    os.environ.update(overrides)
+
+
+def encoded_image(index: int, image_format: str = "jpeg", size: int = 64) -> bytes:
+    """A distinct garment-like photo per ``index``: a colored shape on a light background."""
+    image = Image.new("RGB", (size, size), (235, 235, 230))
+    color = (index % 251, (index // 251) % 251, 120)
+    ImageDraw.Draw(image).rounded_rectangle((size // 5, size // 8, size * 4 // 5, size * 7 // 8), size // 8, color)
+    if image_format == "heic":
+        from pillow_heif import register_heif_opener
+
+        register_heif_opener()
+    stream = io.BytesIO()
+    image.save(stream, format=IMAGE_FORMATS[image_format][0], **({"quality": 80} if image_format == "jpeg" else {}))
+    return stream.getvalue()
+
+
+def percentiles(latencies: list[float]) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+    }
+
+
+async def drive(client, count: int, concurrency: int, make_request) -> dict:
+    """Send ``count`` requests from ``concurrency`` workers; ``make_request(client, index)`` sends one."""
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+    queue = iter(range(count))
+
+    async def worker():
+        for index in queue:
+            started = time.perf_counter()
+            response = await make_request(client, index)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"requests": count, "rps": round(count / elapsed, 1), "statuses": statuses, **percentiles(latencies)}
+
+
+def seed_closets(owner_count: int, items_per_owner: int, photos_per_item: int = 1) -> dict[int, list[int]]:
+    """Insert owners with ready items (and photos) in bulk; returns item ids per owner."""
+    from app.database import SessionLocal
+    from app.models.domain import CategoryEnum, ClothingItem, ClothingItemPhoto, User
+
+    categories = list(CategoryEnum)
+    db = SessionLocal()
+    try:
+        owners = [User(email=f"bench-{index}@cloakroom.ai", full_name="Bench") for index in range(owner_count)]
+        db.add_all(owners)
+        db.flush()
+        closets: dict[int, list[int]] = {}
+        for owner in owners:
+            items = [
+                ClothingItem(
+                    owner_id=owner.id,
+                    name=f"Item {index}",
+                    image_url=f"/static/bench-{owner.id}-{index}_proc.png",
+                    content_hash=f"bench-{owner.id}-{index}",
+                    category=categories[index % len(categories)],
+                    color="black",
+                )
+                for index in range(items_per_owner)
+            ]
+            db.add_all(items)
+            db.flush()
+            db.add_all(
+                ClothingItemPhoto(item_id=item.id, image_url=item.image_url, angle_label=f"angle-{angle}")
+                for item in items
+                for angle in range(photos_per_item)
+            )
+            closets[owner.id] = [item.id for item in items]
+        db.commit()
+        return closets
+    finally:
+        db.close()
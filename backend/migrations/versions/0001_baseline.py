@@ -0,0 +1,155 @@
+"""Baseline schema
+
+Creates every table on an empty database. Databases created by the old
+startup ``create_all`` path are brought up to the same schema instead:
+missing tables, columns and indexes are added, existing ones are kept.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATEGORY = sa.Enum("TOP", "BOTTOM", "OUTERWEAR", "SHOES", "ACCESSORY", name="categoryenum")
+
+
+def _tables() -> dict[str, list[sa.Column]]:
+    # Built per call: Column objects can only be attached to one table.
+    return {
+        "users": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("full_name", sa.String(), nullable=False),
+            sa.Column("avatar_image_url", sa.String(), nullable=True),
+            sa.Column("closet_version", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("closet_updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        ],
+        "clothing_items": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("name", sa.String(), nullable=True),
+            sa.Column("image_url", sa.String(), nullable=False),
+            sa.Column("original_image_url", sa.String(), nullable=True),
+            sa.Column("content_hash", sa.String(), nullable=True),
+            sa.Column("category", CATEGORY, nullable=False),
+            sa.Column("color", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=False, server_default="ready"),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        ],
+        "clothing_item_photos": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("item_id", sa.Integer(), sa.ForeignKey("clothing_items.id"), nullable=False),
+            sa.Column("image_url", sa.String(), nullable=False),
+            sa.Column("original_image_url", sa.String(), nullable=True),
+            sa.Column("content_hash", sa.String(), nullable=True),
+            sa.Column("angle_label", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        ],
+        "outfits": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("top_id", sa.Integer(), sa.ForeignKey("clothing_items.id"), nullable=True),
+            sa.Column("bottom_id", sa.Integer(), sa.ForeignKey("clothing_items.id"), nullable=True),
+            sa.Column("shoes_id", sa.Integer(), sa.ForeignKey("clothing_items.id"), nullable=True),
+            sa.Column("accessory_id", sa.Integer(), sa.ForeignKey("clothing_items.id"), nullable=True),
+            sa.Column("generated_image_url", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=False, server_default="ready"),
+            sa.Column("cache_key", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        ],
+        "processing_jobs": [
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("kind", sa.String(), nullable=False),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("item_id", sa.Integer(), sa.ForeignKey("clothing_items.id"), nullable=True),
+            sa.Column("outfit_id", sa.Integer(), sa.ForeignKey("outfits.id"), nullable=True),
+            sa.Column("external_id", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("progress", sa.Integer(), nullable=False),
+            sa.Column("message", sa.String(), nullable=True),
+            sa.Column("error", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        ],
+        "closet_changes": [
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("item_id", sa.Integer(), sa.ForeignKey("clothing_items.id"), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        ],
+    }
+
+
+# (name, table, columns, unique)
+INDEXES = [
+    ("ix_users_id", "users", ["id"], False),
+    ("ix_users_email", "users", ["email"], True),
+    ("ix_clothing_items_id", "clothing_items", ["id"], False),
+    ("ix_clothing_items_content_hash", "clothing_items", ["content_hash"], False),
+    ("ix_clothing_items_owner_id_created_at", "clothing_items", ["owner_id", "created_at"], False),
+    ("ix_clothing_item_photos_id", "clothing_item_photos", ["id"], False),
+    ("ix_clothing_item_photos_content_hash", "clothing_item_photos", ["content_hash"], False),
+    ("ix_clothing_item_photos_item_id_created_at", "clothing_item_photos", ["item_id", "created_at"], False),
+    ("ix_outfits_id", "outfits", ["id"], False),
+    ("ix_outfits_cache_key", "outfits", ["cache_key"], False),
+    ("ix_outfits_owner_id_cache_key", "outfits", ["owner_id", "cache_key"], False),
+    ("ix_processing_jobs_external_id", "processing_jobs", ["external_id"], False),
+    ("ix_closet_changes_owner_id_id", "closet_changes", ["owner_id", "id"], False),
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    existing_tables = set(inspector.get_table_names())
+
+    for table_name, columns in _tables().items():
+        if table_name not in existing_tables:
+            op.create_table(table_name, *columns)
+            continue
+        # Pre-migration database: add the columns later releases introduced.
+        existing_columns = {column["name"] for column in inspector.get_columns(table_name)}
+        for column in columns:
+            if column.name not in existing_columns:
+                # SQLite cannot add a column with a non-constant default such as now().
+                default = column.server_default.arg if column.server_default is not None else None
+                op.add_column(
+                    table_name,
+                    sa.Column(
+                        column.name,
+                        column.type,
+                        nullable=column.nullable,
+                        server_default=default if isinstance(default, str) else None,
+                    ),
+                )
+
+    for index_name, table_name, columns, unique in INDEXES:
+        if table_name in existing_tables:
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+        else:
+            existing_indexes = set()
+        if index_name not in existing_indexes:
+            op.create_index(index_name, table_name, columns, unique=unique)
+
+
+def downgrade() -> None:
+    for index_name, table_name, _, _ in reversed(INDEXES):
+        op.drop_index(index_name, table_name=table_name)
+    for table_name in reversed(list(_tables())):
+        op.drop_table(table_name)
+    CATEGORY.drop(op.get_bind(), checkfirst=True)
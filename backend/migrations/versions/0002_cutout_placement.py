@@ -0,0 +1,37 @@
+"""Cutout placement columns
+
+Cropped cutouts record their offset and the uncropped canvas size so clients
+can position them. Existing rows keep NULLs: their cutouts are uncropped.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("clothing_items", "clothing_item_photos")
+COLUMNS = ("cutout_offset_x", "cutout_offset_y", "cutout_canvas_width", "cutout_canvas_height")
+
+
+def upgrade() -> None:
+    for table_name in TABLES:
+        for column_name in COLUMNS:
+            op.add_column(table_name, sa.Column(column_name, sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name) as batch:
+            for column_name in reversed(COLUMNS):
+                batch.drop_column(column_name)
@@ -0,0 +1,34 @@
+"""Blob access times
+
+Dedupe-cache hits are recorded per blob key instead of bumping the object's
+mtime, which S3 cannot do; orphan eviction reads them back. The table starts
+empty, so existing blobs rank by their write time until their next hit.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blob_access",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("last_used", sa.Float(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("blob_access")
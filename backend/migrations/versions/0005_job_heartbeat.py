@@ -0,0 +1,32 @@
+"""Job heartbeat
+
+Background jobs run in the API process that accepted them, which refreshes
+heartbeat_at while it works on them; the startup reaper only fails jobs
+whose heartbeat has lapsed, so one instance can't fail another's live work.
+Existing rows keep NULL and fall back to updated_at.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("processing_jobs", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("processing_jobs") as batch:
+        batch.drop_column("heartbeat_at")
@@ -0,0 +1,47 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# One throwaway database and blob directory per run, never the working tree's.
+_RUN_DIR = Path(tempfile.mkdtemp(prefix="cloakroom-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{_RUN_DIR / 'test.db'}"
+os.environ["UPLOAD_DIR"] = str(_RUN_DIR / "uploads")
+os.environ.setdefault("ENABLE_MOCK_VTON", "true")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.schema_version import upgrade_database  # noqa: E402
+
+upgrade_database()
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Every test starts with empty tables, its own UPLOAD_DIR and cold in-process caches."""
+    from app.database import Base, engine
+    from app.main import app
+    from app.services.storage import LocalStorage, storage
+    from app.services.tryon_cache import tryon_cache, tryon_layer_cache
+
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    if isinstance(storage, LocalStorage):
+        monkeypatch.setattr(storage, "root", str(upload_dir))
+    static_files = next(route.app for route in app.routes if getattr(route, "name", None) == "static")
+    monkeypatch.setattr(static_files, "directory", str(upload_dir))
+    monkeypatch.setattr(static_files, "all_directories", [str(upload_dir)])
+
+    for cache in (tryon_cache, tryon_layer_cache):
+        cache._entries.clear()
+    yield
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_RUN_DIR, ignore_errors=True)
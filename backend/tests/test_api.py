@@ -1,13 +1,14 @@
+import asyncio
 import io
 import os
 import sys
+import time
 from pathlib import Path
 
+import pytest
 from PIL import Image
 from fastapi.testclient import TestClient
 
-os.environ["DATABASE_URL"] = "sqlite:///./test_cloakroom.db"
-os.environ["ENABLE_MOCK_VTON"] = "true"
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from app.main import app  # noqa: E402
@@ -16,8 +17,8 @@ from app.main import app  # noqa: E402
 client = TestClient(app)
 
 
-def _sample_image_bytes() -> bytes:
-    image = Image.new("RGB", (120, 200), color=(200, 80, 120))
+def _sample_image_bytes(color: tuple[int, int, int] = (200, 80, 120)) -> bytes:
+    image = Image.new("RGB", (120, 200), color=color)
     stream = io.BytesIO()
     image.save(stream, format="JPEG")
     return stream.getvalue()
@@ -27,6 +28,15 @@ def test_healthcheck():
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "ok"
+    assert response.json()["segmentation_model"]["state"] in {"cold", "loading", "ready", "failed"}
+
+
+def test_segmentation_session_manager_validates_model_names():
+    from app.services.ml_service import SegmentationSessionManager
+
+    assert SegmentationSessionManager("isnet").model_name == "isnet-general-use"
+    with pytest.raises(ValueError):
+        SegmentationSessionManager("not-a-model")
 
 
 def test_bootstrap_upload_closet_tryon_flow():
@@ -91,3 +101,921 @@ def test_bootstrap_upload_closet_tryon_flow():
     tryon_payload = tryon.json()
     assert tryon_payload["outfit_id"] >= 1
     assert tryon_payload["generated_image_url"].startswith("http")
+
+
+def test_upload_reports_stage_timings_and_metrics():
+    from app.services.metrics import stage_seconds
+
+    bootstrap = client.post("/api/users/bootstrap", json={"email": "metrics@cloakroom.ai", "full_name": "Metrics"})
+    segment_count = stage_seconds.count(stage="segment")
+    upload = client.post(
+        "/api/upload/",
+        data={"owner_id": str(bootstrap.json()["id"])},
+        files={"file": ("item.jpg", _sample_image_bytes(color=(33, 66, 99)), "image/jpeg")},
+    )
+    assert upload.status_code == 200, upload.text
+    stages = {entry.split(";")[0] for entry in upload.headers["Server-Timing"].split(", ")}
+    assert {"decode", "segment", "encode", "categorize", "store", "db_commit", "total"} <= stages
+    assert stage_seconds.count(stage="segment") == segment_count + 1
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'cloakroom_http_request_duration_seconds_count{method="POST",route="/api/upload/",status="200"}' in metrics.text
+    assert 'cloakroom_cutout_cache_requests_total{result="miss"}' in metrics.text
+    assert "cloakroom_inference_pending 0" in metrics.text
+
+
+def test_upload_returns_429_when_inference_pool_is_saturated(monkeypatch):
+    from app.services.inference_pool import inference_executor
+
+    bootstrap = client.post(
+        "/api/users/bootstrap",
+        json={"email": "busy@cloakroom.ai", "full_name": "Busy User"},
+    )
+    user_id = bootstrap.json()["id"]
+
+    monkeypatch.setattr(inference_executor, "_pending", inference_executor.capacity)
+    upload = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("item.jpg", _sample_image_bytes(color=(10, 20, 30)), "image/jpeg")},
+    )
+    assert upload.status_code == 429
+    assert upload.headers["retry-after"]
+
+
+def test_inference_batches_never_exceed_the_capacity_that_admits_them():
+    from app.core.config import settings
+    from app.services.inference_pool import InferenceExecutor, inference_executor
+
+    # A multi-photo upload is one batch; the configured maximum must always fit.
+    assert settings.MAX_PHOTOS_PER_REQUEST <= inference_executor.capacity
+    small = InferenceExecutor(max_workers=1, queue_size=1)
+    with pytest.raises(ValueError, match="exceeds the inference capacity"):
+        asyncio.run(small.map(len, ["a", "b", "c"]))
+    assert small.pending == 0
+
+
+def test_async_upload_returns_job_and_completes_in_background():
+    bootstrap = client.post(
+        "/api/users/bootstrap",
+        json={"email": "async@cloakroom.ai", "full_name": "Async User"},
+    )
+    user_id = bootstrap.json()["id"]
+
+    upload = client.post(
+        "/api/upload/?mode=async",
+        data={"owner_id": str(user_id), "item_name": "Linen Shirt"},
+        files={"file": ("shirt.jpg", _sample_image_bytes(), "image/jpeg")},
+    )
+    assert upload.status_code == 202, upload.text
+    accepted = upload.json()
+    assert accepted["item"]["status"] == "processing"
+    assert accepted["status_url"] == f"/api/jobs/{accepted['job']['id']}"
+
+    # TestClient runs background tasks before returning, so the job is finished here.
+    job = client.get(accepted["status_url"])
+    assert job.status_code == 200
+    assert job.json()["status"] == "succeeded"
+    assert job.json()["progress"] == 100
+
+    events = client.get(f"{accepted['status_url']}/events")
+    assert events.status_code == 200
+    assert events.headers["content-type"].startswith("text/event-stream")
+    assert '"status": "succeeded"' in events.text
+
+    closet = client.get(f"/api/closet/{user_id}").json()
+    processed = next(item for item in closet if item["id"] == accepted["item"]["id"])
+    assert processed["status"] == "ready"
+    # The test environment has no segmentation model: the opaque fallback is kept out of the cutout cache.
+    assert processed["processed_url"].endswith("_unsegmented.png")
+    assert processed["photos"][0]["processed_url"] == processed["processed_url"]
+
+    assert client.get("/api/jobs/does-not-exist").status_code == 404
+
+
+def test_reuploading_identical_bytes_reuses_processed_blob(monkeypatch):
+    from app.core.config import settings
+    from app.services import ml_service
+    from app.services.blob_store import content_digest
+    from app.services.inference_pool import inference_executor
+
+    bootstrap = client.post(
+        "/api/users/bootstrap",
+        json={"email": "dedupe@cloakroom.ai", "full_name": "Dedupe User"},
+    )
+    user_id = bootstrap.json()["id"]
+    image_bytes = _sample_image_bytes((190, 40, 60))
+
+    def _upload(file_name: str):
+        response = client.post(
+            "/api/upload/",
+            data={"owner_id": str(user_id)},
+            files={"file": (file_name, image_bytes, "image/jpeg")},
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    # Without a segmentation model the opaque fallback is stored but not cached.
+    fallback = _upload("dup.jpg")
+    assert fallback["item"]["processed_url"].endswith("_unsegmented.png")
+    # Its key is the digest of the stored bytes, like every other immutable blob.
+    fallback_bytes = client.get(fallback["item"]["processed_url"]).content
+    assert fallback["item"]["processed_url"] == f"/static/{content_digest(fallback_bytes)}_unsegmented.png"
+
+    monkeypatch.setattr(ml_service, "_segmentation_mask", lambda image, _max_side: Image.new("L", image.size, 255))
+    first = _upload("dup.jpg")
+    assert f"_proc-{ml_service.cutout_version()}.png" in first["item"]["processed_url"]
+
+    async def _fail_if_called(*_args):
+        raise AssertionError("Repeat uploads must not run background removal again.")
+
+    monkeypatch.setattr(inference_executor, "run", _fail_if_called)
+    monkeypatch.setattr(inference_executor, "map", _fail_if_called)
+    second = _upload("dup-again.jpg")
+    assert second["item"]["processed_url"] == first["item"]["processed_url"]
+    assert second["item"]["id"] != first["item"]["id"]
+
+    # A different model or cutout setting must not reuse the cached cutout.
+    monkeypatch.setattr(settings, "CUTOUT_CROP", not settings.CUTOUT_CROP)
+    with pytest.raises(AssertionError, match="must not run background removal again"):
+        _upload("dup-after-config-change.jpg")
+
+
+def test_cropped_cutouts_report_their_placement_also_when_reused(monkeypatch):
+    from app.services import ml_service
+
+    def _box_mask(image, _max_side):
+        mask = Image.new("L", image.size, 0)
+        mask.paste(255, (20, 30, 100, 170))
+        return mask
+
+    monkeypatch.setattr(ml_service, "_segmentation_mask", _box_mask)
+    user_id = client.post(
+        "/api/users/bootstrap", json={"email": "placement@cloakroom.ai", "full_name": "Placement User"}
+    ).json()["id"]
+    image_bytes = _sample_image_bytes((30, 160, 90))
+
+    items = []
+    for _ in range(2):
+        upload = client.post(
+            "/api/upload/",
+            data={"owner_id": str(user_id)},
+            files={"file": ("cropped.jpg", image_bytes, "image/jpeg")},
+        )
+        assert upload.status_code == 200, upload.text
+        items.append(upload.json()["item"])
+
+    placement = {"offset_x": 20, "offset_y": 30, "canvas_width": 120, "canvas_height": 200}
+    # The second upload is a cache hit; its placement comes from the first item's rows.
+    for item in items:
+        assert item["placement"] == placement
+        assert item["photos"][0]["placement"] == placement
+    cutout = client.get(items[0]["processed_url"])
+    assert Image.open(io.BytesIO(cutout.content)).size == (80, 140)
+
+
+def test_orphan_eviction_keeps_referenced_and_recent_blobs(tmp_path, monkeypatch):
+    from app.core.config import settings
+    from app.database import SessionLocal
+    from app.models.domain import BlobAccess
+    from app.services.blob_store import evict_orphaned_blobs, evict_orphans, record_blob_use
+    from app.services.storage import LocalStorage, storage
+
+    store = LocalStorage(str(tmp_path))
+    for index, key in enumerate(["old_orphan.png", "new_orphan.png", "referenced.png"]):
+        asyncio.run(store.put(key, b"x" * 100))
+        os.utime(store.local_path(key), (1000 + index, 1000 + index))
+
+    evicted = asyncio.run(evict_orphans(store, {"referenced.png"}, max_orphan_bytes=100))
+    assert evicted == ["old_orphan.png"]
+    assert asyncio.run(store.exists("new_orphan.png"))
+    assert asyncio.run(store.exists("referenced.png"))
+
+    recent = {"new_orphan.png": time.time()}
+    assert asyncio.run(
+        evict_orphans(store, set(), max_orphan_bytes=0, grace_seconds=3600, last_used=recent)
+    ) == ["referenced.png"]
+
+    # Dedupe hits are recorded in the database, not on the object's mtime.
+    monkeypatch.setattr(settings, "BLOB_CACHE_MAX_ORPHAN_BYTES", 100)
+    monkeypatch.setattr(settings, "BLOB_ORPHAN_GRACE_SECONDS", 0)
+    for index, key in enumerate(["hit_orphan.png", "cold_orphan.png"]):
+        asyncio.run(storage.put(key, b"x" * 100))
+        os.utime(storage.local_path(key), (1000 + index, 1000 + index))
+    asyncio.run(record_blob_use("hit_orphan.png"))
+    assert os.stat(storage.local_path("hit_orphan.png")).st_mtime == 1000
+    assert asyncio.run(evict_orphaned_blobs()) == ["cold_orphan.png"]
+
+    monkeypatch.setattr(settings, "BLOB_CACHE_MAX_ORPHAN_BYTES", 0)
+    assert asyncio.run(evict_orphaned_blobs()) == ["hit_orphan.png"]
+    with SessionLocal() as db:
+        assert db.query(BlobAccess).count() == 0
+
+
+def test_items_expose_derivatives_generated_eagerly_or_on_first_request():
+    from app.services.storage import storage
+
+    bootstrap = client.post(
+        "/api/users/bootstrap",
+        json={"email": "thumbs@cloakroom.ai", "full_name": "Thumb User"},
+    )
+    user_id = bootstrap.json()["id"]
+    upload = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("thumb.jpg", _sample_image_bytes(color=(40, 160, 90)), "image/jpeg")},
+    )
+    item = upload.json()["item"]
+    assert item["thumbnail_url"].startswith("/api/derivatives/320/")
+    assert [entry.split(" ")[1] for entry in item["srcset"].split(", ")] == ["160w", "320w", "640w"]
+    assert item["photos"][0]["thumbnail_url"] == item["thumbnail_url"]
+
+    source_key = item["processed_url"].removeprefix("/static/")
+    derivative_path = storage.local_path(f"{Path(source_key).stem}_w320.webp")
+    assert os.path.exists(derivative_path)
+
+    # Simulate an item stored before derivatives existed.
+    os.remove(derivative_path)
+    thumbnail = client.get(item["thumbnail_url"])
+    assert thumbnail.status_code == 200
+    assert thumbnail.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(thumbnail.content)).width <= 320
+    assert os.path.exists(derivative_path)
+    assert thumbnail.headers["cache-control"].endswith("immutable")
+    revalidated = client.get(item["thumbnail_url"], headers={"If-None-Match": thumbnail.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    assert client.get(f"/api/derivatives/333/{source_key}").status_code == 404
+    assert client.get("/api/derivatives/320/missing_proc.png").status_code == 404
+
+
+def test_items_fall_back_to_the_full_cutout_without_derivative_widths(monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "DERIVATIVE_WIDTHS", "")
+    bootstrap = client.post(
+        "/api/users/bootstrap",
+        json={"email": "nothumbs@cloakroom.ai", "full_name": "No Thumb User"},
+    )
+    upload = client.post(
+        "/api/upload/",
+        data={"owner_id": str(bootstrap.json()["id"])},
+        files={"file": ("full.jpg", _sample_image_bytes(color=(90, 40, 160)), "image/jpeg")},
+    )
+    assert upload.status_code == 200
+    item = upload.json()["item"]
+    assert item["thumbnail_url"] == item["processed_url"]
+    assert item["srcset"] is None
+    assert item["photos"][0]["thumbnail_url"] == item["photos"][0]["processed_url"]
+
+
+def test_add_item_photos_processes_all_files_as_one_batch(monkeypatch):
+    from app.services.inference_pool import inference_executor
+    from app.services.ml_service import segment_garment
+
+    bootstrap = client.post(
+        "/api/users/bootstrap",
+        json={"email": "batch@cloakroom.ai", "full_name": "Batch User"},
+    )
+    user_id = bootstrap.json()["id"]
+    upload = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("front.jpg", _sample_image_bytes(color=(1, 2, 3)), "image/jpeg")},
+    )
+    item_id = upload.json()["item"]["id"]
+
+    batch_sizes = []
+    original_map = inference_executor.map
+
+    async def _recording_map(fn, items, *args):
+        if fn is segment_garment:
+            batch_sizes.append(len(items))
+        return await original_map(fn, items, *args)
+
+    monkeypatch.setattr(inference_executor, "map", _recording_map)
+
+    from app.services.storage import storage
+
+    writing, most_writing = 0, 0
+    original_put_stream = storage.put_stream
+
+    async def _tracking_put_stream(key, chunks, *args, **kwargs):
+        nonlocal writing, most_writing
+        writing += 1
+        most_writing = max(most_writing, writing)
+        await asyncio.sleep(0.01)
+        try:
+            return await original_put_stream(key, chunks, *args, **kwargs)
+        finally:
+            writing -= 1
+
+    monkeypatch.setattr(storage, "put_stream", _tracking_put_stream)
+    angles = [
+        ("files", (f"angle{index}.jpg", _sample_image_bytes(color=(index, 50, 60)), "image/jpeg"))
+        for index in range(4)
+    ]
+    response = client.post(f"/api/items/{item_id}/photos", files=angles, data={"angle_label": "side"})
+    assert response.status_code == 200, response.text
+    assert len(response.json()["photos"]) == 5
+    assert len({photo["processed_url"] for photo in response.json()["photos"]}) == 5
+    assert batch_sizes == [4]
+    assert most_writing == 4  # the originals are streamed to storage concurrently
+
+
+def test_uploads_over_the_size_or_decode_budget_are_rejected(monkeypatch):
+    from app.core.config import settings
+
+    bootstrap = client.post(
+        "/api/users/bootstrap",
+        json={"email": "limits@cloakroom.ai", "full_name": "Limits User"},
+    )
+    user_id = bootstrap.json()["id"]
+    image_bytes = _sample_image_bytes(color=(7, 140, 210))
+
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", len(image_bytes) - 1)
+    too_big = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("item.jpg", image_bytes, "image/jpeg")},
+    )
+    assert too_big.status_code == 413
+
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", len(image_bytes))
+    monkeypatch.setattr(settings, "DECODE_MEMORY_BUDGET_BYTES", 120 * 200 * 3 - 1)
+    too_many_pixels = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("item.jpg", image_bytes, "image/jpeg")},
+    )
+    assert too_many_pixels.status_code == 413
+
+    monkeypatch.setattr(settings, "DECODE_MEMORY_BUDGET_BYTES", 120 * 200 * 3)
+    accepted = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("item.jpg", image_bytes, "image/jpeg")},
+    )
+    assert accepted.status_code == 200, accepted.text
+
+    monkeypatch.setattr(settings, "MAX_PHOTOS_PER_REQUEST", 1)
+    photos = [("files", (f"angle{index}.jpg", image_bytes, "image/jpeg")) for index in range(2)]
+    response = client.post(f"/api/items/{accepted.json()['item']['id']}/photos", files=photos)
+    assert response.status_code == 400
+
+    # The whole body is capped before Starlette parses (and spools) any of it.
+    monkeypatch.setattr(settings, "MAX_REQUEST_BYTES", len(image_bytes) // 2)
+    too_big_body = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("item.jpg", image_bytes, "image/jpeg")},
+    )
+    assert too_big_body.status_code == 413
+
+    def chunked_body():
+        yield b"x" * len(image_bytes)
+
+    streamed = client.post(
+        "/api/upload/", content=chunked_body(), headers={"Content-Type": "multipart/form-data; boundary=b"}
+    )
+    assert streamed.status_code == 413
+
+
+def test_upload_routes_spool_files_past_the_configured_threshold(monkeypatch):
+    from starlette.formparsers import MultiPartParser
+
+    from app.api import upload as upload_api
+    from app.core.config import settings
+
+    user_id = client.post("/api/users/bootstrap", json={"email": "spool@cloakroom.ai", "full_name": "Spool"}).json()["id"]
+    monkeypatch.setattr(settings, "UPLOAD_SPOOL_MAX_MEMORY_BYTES", 64)
+    rolled = []
+    ingest_upload = upload_api.ingest_upload
+
+    async def _spy(upload, *args, **kwargs):
+        rolled.append(upload.file._rolled)
+        return await ingest_upload(upload, *args, **kwargs)
+
+    monkeypatch.setattr(upload_api, "ingest_upload", _spy)
+    response = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("item.jpg", _sample_image_bytes(), "image/jpeg")},
+    )
+    assert response.status_code == 200, response.text
+    assert rolled == [True]
+    # The threshold applies to the upload routes only, not to Starlette's parser globally.
+    assert MultiPartParser.max_file_size == 1024 * 1024
+
+
+def _tryon_user_and_item(email: str) -> tuple[int, int]:
+    bootstrap = client.post("/api/users/bootstrap", json={"email": email, "full_name": "Try-on User"})
+    user_id = bootstrap.json()["id"]
+    upload = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("top.jpg", _sample_image_bytes(), "image/jpeg")},
+    )
+    return user_id, upload.json()["item"]["id"]
+
+
+def test_startup_reaper_fails_work_interrupted_by_a_restart():
+    from datetime import datetime, timedelta, timezone
+
+    from app.database import SessionLocal
+    from app.models.domain import CategoryEnum, ClothingItem, Outfit
+    from app.services.jobs import beat_running_jobs, create_job, reap_interrupted_work, running_job
+
+    user_id, top_id = _tryon_user_and_item("reaper@cloakroom.ai")
+    long_ago = datetime.now(timezone.utc) - timedelta(hours=2)
+    db = SessionLocal()
+    try:
+        item = ClothingItem(
+            owner_id=user_id, image_url="/static/lost_orig.jpg", category=CategoryEnum.TOP, status="processing"
+        )
+        busy_item = ClothingItem(
+            owner_id=user_id, image_url="/static/busy_orig.jpg", category=CategoryEnum.TOP, status="processing"
+        )
+        outfit = Outfit(owner_id=user_id, top_id=top_id, status="pending")
+        db.add_all([item, busy_item, outfit])
+        db.flush()
+        upload_job = create_job(db, kind="upload", owner_id=user_id, item_id=item.id)
+        upload_job.status = "processing"
+        tryon_job = create_job(db, kind="tryon", owner_id=user_id, outfit_id=outfit.id)
+        fresh_job = create_job(db, kind="tryon", owner_id=user_id)
+        # Another instance's job: untouched for hours, but that instance keeps its heartbeat fresh.
+        busy_job = create_job(db, kind="upload", owner_id=user_id, item_id=busy_item.id)
+        busy_job.status = "processing"
+        db.flush()
+        for row in (item, busy_item, upload_job, tryon_job, busy_job):
+            row.updated_at = long_ago
+        for row in (upload_job, tryon_job, busy_job):
+            row.heartbeat_at = long_ago
+        db.commit()
+        item_id, outfit_id = item.id, outfit.id
+        job_ids = (upload_job.id, tryon_job.id, fresh_job.id, busy_job.id)
+        cursor = client.get(f"/api/closet/{user_id}/changes").json()["cursor"]
+
+        with running_job(busy_job.id):
+            assert asyncio.run(beat_running_jobs()) == 1
+        assert reap_interrupted_work(db, datetime.now(timezone.utc) - timedelta(minutes=30)) == 3
+    finally:
+        db.close()
+
+    upload_job, tryon_job, fresh_job, busy_job = (client.get(f"/api/jobs/{job_id}").json() for job_id in job_ids)
+    assert upload_job["status"] == tryon_job["status"] == "failed"
+    assert fresh_job["status"] == "pending"  # possibly still running in another worker
+    assert busy_job["status"] == "processing"
+    assert busy_job["updated_at"].startswith(long_ago.strftime("%Y-%m-%dT%H:%M"))  # a heartbeat isn't progress
+    assert client.get(f"/api/tryon/{outfit_id}").json()["status"] == "failed"
+    delta = client.get(f"/api/closet/{user_id}/changes?since={cursor}").json()
+    assert [(item["id"], item["status"]) for item in delta["items"]] == [(item_id, "failed")]
+
+
+def test_async_tryon_returns_pending_outfit_and_job():
+    user_id, item_id = _tryon_user_and_item("async-tryon@cloakroom.ai")
+
+    accepted = client.post("/api/tryon/?mode=async", json={"user_id": user_id, "top_id": item_id})
+    assert accepted.status_code == 202, accepted.text
+    payload = accepted.json()
+    assert payload["status"] == "pending"
+    assert payload["job"]["kind"] == "tryon"
+    assert payload["job"]["outfit_id"] == payload["outfit_id"]
+
+    # TestClient runs background tasks before returning, so the job is finished here.
+    job = client.get(payload["status_url"]).json()
+    assert job["status"] == "succeeded"
+    outfit = client.get(f"/api/tryon/{payload['outfit_id']}").json()
+    assert outfit["status"] == "ready"
+    assert outfit["generated_image_url"].startswith("http")
+
+
+def test_webhook_completes_tryon_submitted_to_provider(monkeypatch):
+    from app.core.config import settings
+    from app.services.vton_service import Prediction, vton_client
+
+    user_id, item_id = _tryon_user_and_item("webhook-tryon@cloakroom.ai")
+    monkeypatch.setattr(settings, "ENABLE_MOCK_VTON", False)
+    monkeypatch.setattr(settings, "VTON_WEBHOOK_BASE_URL", "https://api.example.com")
+    monkeypatch.setattr(settings, "VTON_WEBHOOK_SECRET", "webhook-secret")
+    submitted = []
+
+    async def _submit(user_avatar_url, garment_url, category, webhook_url=None):
+        submitted.append(webhook_url)
+        return Prediction("pred-1", "starting", None, None, None)
+
+    monkeypatch.setattr(vton_client, "submit", _submit)
+
+    payload = client.post("/api/tryon/?mode=async", json={"user_id": user_id, "top_id": item_id}).json()
+    job = client.get(payload["status_url"]).json()
+    assert job["status"] == "processing"
+    assert client.get(f"/api/tryon/{payload['outfit_id']}").json()["status"] == "pending"
+
+    callback_path = submitted[0].removeprefix("https://api.example.com")
+    assert client.post(f"/api/tryon/webhook/{job['id']}?token=forged", json={}).status_code == 404
+    completed = client.post(
+        callback_path,
+        json={"id": "pred-1", "status": "succeeded", "output": ["https://cdn.example.com/tryon.png"]},
+    )
+    assert completed.status_code == 200, completed.text
+
+    assert client.get(payload["status_url"]).json()["status"] == "succeeded"
+    outfit = client.get(f"/api/tryon/{payload['outfit_id']}").json()
+    assert outfit["status"] == "ready"
+    assert outfit["generated_image_url"] == "https://cdn.example.com/tryon.png"
+
+
+def test_webhook_that_beats_the_worker_is_not_reverted(monkeypatch):
+    from app.core.config import settings
+    from app.services.vton_service import Prediction, vton_client
+
+    user_id, item_id = _tryon_user_and_item("webhook-race@cloakroom.ai")
+    monkeypatch.setattr(settings, "ENABLE_MOCK_VTON", False)
+    monkeypatch.setattr(settings, "VTON_WEBHOOK_BASE_URL", "https://api.example.com")
+    monkeypatch.setattr(settings, "VTON_WEBHOOK_SECRET", "webhook-secret")
+
+    async def _submit(user_avatar_url, garment_url, category, webhook_url=None):
+        # The provider finishes and calls back before submit has even returned.
+        completed = await asyncio.to_thread(
+            client.post,
+            webhook_url.removeprefix("https://api.example.com"),
+            json={"id": "pred-race", "status": "succeeded", "output": ["https://cdn.example.com/race.png"]},
+        )
+        assert completed.status_code == 200, completed.text
+        return Prediction("pred-race", "starting", None, None, None)
+
+    monkeypatch.setattr(vton_client, "submit", _submit)
+
+    payload = client.post("/api/tryon/?mode=async", json={"user_id": user_id, "top_id": item_id}).json()
+    job = client.get(payload["status_url"]).json()
+    assert job["status"] == "succeeded"
+    assert job["progress"] == 100
+    outfit = client.get(f"/api/tryon/{payload['outfit_id']}").json()
+    assert outfit["status"] == "ready"
+    assert outfit["generated_image_url"] == "https://cdn.example.com/race.png"
+
+
+def test_overdue_webhook_falls_back_to_polling_the_provider(monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    from app.core.config import settings
+    from app.database import SessionLocal
+    from app.models.domain import ProcessingJob
+    from app.services.tryon_jobs import poll_overdue_webhook_jobs
+    from app.services.vton_service import Prediction, vton_client
+
+    user_id, item_id = _tryon_user_and_item("webhook-timeout@cloakroom.ai")
+    monkeypatch.setattr(settings, "ENABLE_MOCK_VTON", False)
+    monkeypatch.setattr(settings, "VTON_WEBHOOK_BASE_URL", "https://api.example.com")
+    monkeypatch.setattr(settings, "VTON_WEBHOOK_SECRET", "webhook-secret")
+    predictions = iter(["pred-done", "pred-stuck"])
+
+    async def _submit(user_avatar_url, garment_url, category, webhook_url=None):
+        return Prediction(next(predictions), "starting", None, None, None)
+
+    async def _fetch(prediction):
+        if prediction.id == "pred-done":
+            return Prediction(prediction.id, "succeeded", "https://cdn.example.com/polled.png", None, None)
+        return Prediction(prediction.id, "processing", None, None, None)
+
+    monkeypatch.setattr(vton_client, "submit", _submit)
+    monkeypatch.setattr(vton_client, "fetch", _fetch)
+    done = client.post("/api/tryon/?mode=async", json={"user_id": user_id, "top_id": item_id}).json()
+    # A different garment list, so the second try-on isn't deduplicated onto the first.
+    stuck = client.post(
+        "/api/tryon/?mode=async", json={"user_id": user_id, "top_id": item_id, "shoes_id": item_id}
+    ).json()
+
+    # Nothing is polled while the webhooks are still within the timeout.
+    assert asyncio.run(poll_overdue_webhook_jobs(60)) == 0
+
+    long_ago = datetime.now(timezone.utc) - timedelta(seconds=settings.VTON_MAX_WAIT_SECONDS + 60)
+    db = SessionLocal()
+    try:
+        db.query(ProcessingJob).filter(ProcessingJob.external_id == "pred-done").update({"updated_at": long_ago})
+        db.query(ProcessingJob).filter(ProcessingJob.external_id == "pred-stuck").update(
+            {"updated_at": long_ago, "created_at": long_ago}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    assert asyncio.run(poll_overdue_webhook_jobs(60)) == 2
+    assert client.get(done["status_url"]).json()["status"] == "succeeded"
+    assert client.get(f"/api/tryon/{done['outfit_id']}").json()["generated_image_url"] == "https://cdn.example.com/polled.png"
+    stuck_job = client.get(stuck["status_url"]).json()
+    assert stuck_job["status"] == "failed"
+    assert "did not finish" in stuck_job["error"]
+    assert client.get(f"/api/tryon/{stuck['outfit_id']}").json()["status"] == "failed"
+
+
+def test_repeat_tryon_is_served_from_cache_without_new_outfit(monkeypatch):
+    from app.api import tryon as tryon_api
+    from app.services import tryon_pipeline
+
+    user_id, item_id = _tryon_user_and_item("cached-tryon@cloakroom.ai")
+    first = client.post("/api/tryon/", json={"user_id": user_id, "top_id": item_id})
+    assert first.status_code == 200, first.text
+
+    async def _provider_must_not_be_called(**kwargs):
+        raise AssertionError("cached try-on reached the provider")
+
+    monkeypatch.setattr(tryon_pipeline, "generate_vton_image", _provider_must_not_be_called)
+    repeat = client.post("/api/tryon/", json={"user_id": user_id, "top_id": item_id})
+    assert repeat.status_code == 200, repeat.text
+    assert repeat.json()["outfit_id"] == first.json()["outfit_id"]
+    assert repeat.json()["message"] == "Try-on served from cache"
+
+    # The outfits table backs the in-process cache (e.g. after a restart).
+    tryon_api.tryon_cache._entries.clear()
+    async_repeat = client.post("/api/tryon/?mode=async", json={"user_id": user_id, "top_id": item_id})
+    assert async_repeat.status_code == 200
+    assert async_repeat.json()["outfit_id"] == first.json()["outfit_id"]
+    assert client.get("/health").json()["tryon_cache"]["hits"] >= 2
+
+
+def test_tryon_cache_follows_the_avatar_content_not_its_url(monkeypatch):
+    from app.services import tryon_pipeline
+
+    user_id, item_id = _tryon_user_and_item("avatar-tryon@cloakroom.ai")
+    calls = []
+
+    async def _fake_vton(user_avatar_url, garment_url, category):
+        calls.append(user_avatar_url)
+        return f"https://cdn.example.com/tryon-{len(calls)}.png"
+
+    monkeypatch.setattr(tryon_pipeline, "generate_vton_image", _fake_vton)
+
+    def _set_avatar(color):
+        response = client.put(
+            f"/api/users/{user_id}/avatar",
+            files={"file": ("avatar.png", _sample_image_bytes(color=color), "image/png")},
+        )
+        assert response.status_code == 200, response.text
+        return response.json()["avatar_image_url"]
+
+    avatar_url = _set_avatar((10, 20, 30))
+    first = client.post("/api/tryon/", json={"user_id": user_id, "top_id": item_id})
+    repeat = client.post("/api/tryon/", json={"user_id": user_id, "top_id": item_id})
+    assert repeat.json()["message"] == "Try-on served from cache"
+    assert len(calls) == 1 and calls[0].endswith(avatar_url)
+
+    # A new avatar photo is a cache miss.
+    _set_avatar((200, 100, 50))
+    replaced = client.post("/api/tryon/", json={"user_id": user_id, "top_id": item_id})
+    assert replaced.json()["message"] == "Try-on generated successfully"
+    assert replaced.json()["outfit_id"] != first.json()["outfit_id"]
+    assert len(calls) == 2
+
+    # An external avatar URL can change without the app knowing, so it is never cached.
+    client.post(
+        "/api/users/bootstrap",
+        json={"email": "external@cloakroom.ai", "full_name": "External", "avatar_image_url": "https://example.com/me.png"},
+    )
+    external_id, external_item_id = _tryon_user_and_item("external@cloakroom.ai")
+    for _ in range(2):
+        response = client.post("/api/tryon/", json={"user_id": external_id, "top_id": external_item_id})
+        assert response.json()["message"] == "Try-on generated successfully"
+    assert calls[-2:] == ["https://example.com/me.png"] * 2
+
+
+def test_multi_garment_tryon_chains_layers_and_reuses_shared_prefix(monkeypatch):
+    from app.services import tryon_pipeline
+
+    user_id, top_id = _tryon_user_and_item("layers@cloakroom.ai")
+    bottoms = []
+    for color in [(15, 25, 35), (45, 55, 65)]:
+        upload = client.post(
+            "/api/upload/",
+            data={"owner_id": str(user_id)},
+            files={"file": ("bottom.jpg", _sample_image_bytes(color=color), "image/jpeg")},
+        )
+        bottoms.append(upload.json()["item"]["id"])
+
+    calls = []
+
+    async def _fake_vton(user_avatar_url, garment_url, category):
+        calls.append((user_avatar_url, category))
+        return f"https://cdn.example.com/{len(calls)}.png"
+
+    monkeypatch.setattr(tryon_pipeline, "generate_vton_image", _fake_vton)
+    first = client.post(
+        "/api/tryon/", json={"user_id": user_id, "top_id": top_id, "bottom_id": bottoms[0], "shoes_id": bottoms[1]}
+    )
+    assert first.status_code == 200, first.text
+    # Top then bottom; the bottom is layered onto the top result. Shoes are not rendered by default.
+    assert [category for _, category in calls] == ["upper_body", "lower_body"]
+    assert calls[1][0] == "https://cdn.example.com/1.png"
+    assert first.json()["generated_image_url"] == "https://cdn.example.com/2.png"
+
+    second = client.post("/api/tryon/", json={"user_id": user_id, "top_id": top_id, "bottom_id": bottoms[1]})
+    assert second.status_code == 200, second.text
+    # Only the changed bottom is generated, on top of the cached "avatar + top" image.
+    assert calls[2:] == [("https://cdn.example.com/1.png", "lower_body")]
+
+    assert client.post("/api/tryon/", json={"user_id": user_id, "shoes_id": bottoms[0]}).status_code == 400
+    assert client.post("/api/tryon/", json={"user_id": user_id, "top_id": 999999}).status_code == 404
+
+
+def test_prefetch_queues_carousel_neighbours_of_the_current_outfit():
+    from app.services.tryon_prefetch import tryon_prefetcher
+
+    user_id, top_id = _tryon_user_and_item("prefetch@cloakroom.ai")
+    other_top = client.post(
+        "/api/upload/",
+        data={"owner_id": str(user_id)},
+        files={"file": ("top2.jpg", _sample_image_bytes(color=(90, 30, 160)), "image/jpeg")},
+    ).json()["item"]["id"]
+
+    response = client.post(
+        "/api/tryon/prefetch",
+        json={"user_id": user_id, "top_id": top_id, "carousels": {"top": [999999, top_id, other_top]}},
+    )
+    assert response.status_code == 200, response.text
+    # The unknown neighbour is skipped; the real one is queued for the (unstarted) workers.
+    assert response.json() == {"queued": 1, "cached": 0, "over_budget": 0, "cancelled": 0}
+    assert tryon_prefetcher.stats()["queued"] >= 1
+
+    assert client.delete(f"/api/tryon/prefetch/{user_id}").json() == {"cancelled": 1}
+    assert client.post("/api/tryon/prefetch", json={"user_id": 999999}).status_code == 404
+
+
+def test_closet_listing_pages_filters_and_revalidates_with_etag(monkeypatch):
+    bootstrap = client.post("/api/users/bootstrap", json={"email": "closet-pages@cloakroom.ai", "full_name": "Pager"})
+    user_id = bootstrap.json()["id"]
+    item_ids = []
+    for index, color in enumerate([(200, 30, 40), (20, 20, 20), (40, 90, 200)]):
+        upload = client.post(
+            "/api/upload/",
+            data={"owner_id": str(user_id), "item_name": f"Item {index}"},
+            files={"file": (f"item{index}.jpg", _sample_image_bytes(color=color), "image/jpeg")},
+        )
+        item_ids.append(upload.json()["item"]["id"])
+
+    first = client.get(f"/api/closet/{user_id}?limit=2&include_photos=false")
+    assert first.status_code == 200
+    assert [item["id"] for item in first.json()] == item_ids[::-1][:2]
+    assert all(item["photos"] == [] for item in first.json())
+    cursor = first.headers["X-Next-Cursor"]
+    last = client.get(f"/api/closet/{user_id}?limit=2&include_photos=false&after={cursor}")
+    assert [item["id"] for item in last.json()] == [item_ids[0]]
+    assert "X-Next-Cursor" not in last.headers
+
+    full = client.get(f"/api/closet/{user_id}")
+    assert len(full.json()) == 3 and full.json()[0]["photos"]
+    color = full.json()[0]["color"]
+    filtered = client.get(f"/api/closet/{user_id}", params={"color": color})
+    assert {item["color"] for item in filtered.json()} == {color}
+    category = full.json()[0]["category"]
+    assert all(
+        item["category"] == category
+        for item in client.get(f"/api/closet/{user_id}", params={"category": category}).json()
+    )
+
+    etag = full.headers["ETag"]
+    assert full.headers["Last-Modified"]
+    revalidated = client.get(f"/api/closet/{user_id}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    # Another variant of the same closet has its own validator.
+    assert first.headers["ETag"] != etag
+
+    client.patch(f"/api/items/{item_ids[0]}", json={"name": "Renamed"})
+    changed = client.get(f"/api/closet/{user_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+    # With expiring (presigned) asset URLs, validators also roll over with the URL window.
+    from app.services import closet as closet_service
+    from app.services.storage import storage
+
+    monkeypatch.setattr(storage, "url_lifetime_seconds", lambda: 3600)
+    monkeypatch.setattr(closet_service.time, "time", lambda: 1_800_000_000.0)
+    presigned = client.get(f"/api/closet/{user_id}")
+    presigned_etag = presigned.headers["ETag"]
+    assert presigned_etag != changed.headers["ETag"]
+    assert client.get(f"/api/closet/{user_id}", headers={"If-None-Match": presigned_etag}).status_code == 304
+    monkeypatch.setattr(closet_service.time, "time", lambda: 1_800_000_000.0 + 1800)
+    rolled_over = client.get(f"/api/closet/{user_id}", headers={"If-None-Match": presigned_etag})
+    assert rolled_over.status_code == 200
+    assert client.get(
+        f"/api/closet/{user_id}", headers={"If-Modified-Since": presigned.headers["Last-Modified"]}
+    ).status_code == 200
+
+
+def test_closet_changes_return_only_updates_and_tombstones_since_cursor():
+    bootstrap = client.post("/api/users/bootstrap", json={"email": "delta-sync@cloakroom.ai", "full_name": "Syncer"})
+    user_id = bootstrap.json()["id"]
+
+    def _upload(color: tuple[int, int, int]) -> int:
+        response = client.post(
+            "/api/upload/",
+            data={"owner_id": str(user_id)},
+            files={"file": ("item.jpg", _sample_image_bytes(color=color), "image/jpeg")},
+        )
+        return response.json()["item"]["id"]
+
+    kept, removed = _upload((10, 120, 30)), _upload((130, 20, 90))
+    snapshot = client.get(f"/api/closet/{user_id}/changes").json()
+    assert [item["id"] for item in snapshot["items"]] == [kept, removed]
+    cursor = snapshot["cursor"]
+    assert client.get(f"/api/closet/{user_id}/changes?since={cursor}").json()["items"] == []
+
+    client.patch(f"/api/items/{kept}", json={"name": "Renamed"})
+    assert client.delete(f"/api/items/{removed}").status_code == 204
+    assert client.delete(f"/api/items/{removed}").status_code == 404
+    added = _upload((60, 60, 200))
+
+    delta = client.get(f"/api/closet/{user_id}/changes?since={cursor}").json()
+    assert [item["id"] for item in delta["items"]] == [kept, added]
+    assert delta["items"][0]["name"] == "Renamed"
+    assert delta["deleted_item_ids"] == [removed]
+    assert delta["has_more"] is False
+
+    first_page = client.get(f"/api/closet/{user_id}/changes?since={cursor}&limit=1").json()
+    assert first_page["has_more"] is True
+    rest = client.get(f"/api/closet/{user_id}/changes?since={first_page['cursor']}").json()
+    assert rest["cursor"] == delta["cursor"]
+
+    assert removed not in [item["id"] for item in client.get(f"/api/closet/{user_id}").json()]
+    assert client.post("/api/tryon/", json={"user_id": user_id, "top_id": removed}).status_code == 404
+
+
+def test_item_batch_applies_every_operation_in_one_transaction():
+    from sqlalchemy import event
+
+    from app.database import async_engine
+
+    bootstrap = client.post("/api/users/bootstrap", json={"email": "batch@cloakroom.ai", "full_name": "Batcher"})
+    user_id = bootstrap.json()["id"]
+    uploaded = [
+        client.post(
+            "/api/upload/",
+            data={"owner_id": str(user_id)},
+            files={"file": ("item.jpg", _sample_image_bytes(color=(15, 15 + index * 40, 70)), "image/jpeg")},
+        ).json()["item"]
+        for index in range(4)
+    ]
+    ids = [item["id"] for item in uploaded]
+    cursor = client.get(f"/api/closet/{user_id}/changes").json()["cursor"]
+
+    # A failing operation rejects the whole batch before anything is written.
+    rejected = client.post(
+        "/api/items/batch",
+        json={
+            "owner_id": user_id,
+            "operations": [{"op": "update", "item_id": ids[0], "name": "Lost"}, {"op": "delete", "item_id": 999999}],
+        },
+    )
+    assert rejected.status_code == 404
+    assert rejected.json()["detail"].startswith("Operation 1:")
+
+    statements = []
+
+    def _count(_connection, _cursor, statement, *_args):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _count)
+    try:
+        response = client.post(
+            "/api/items/batch",
+            json={
+                "owner_id": user_id,
+                "operations": [
+                    {"op": "update", "item_id": ids[0], "name": "  Linen shirt "},
+                    {"op": "update", "item_id": ids[1], "category": "outerwear", "color": "Navy"},
+                    {"op": "update", "item_id": ids[2], "name": "Gone anyway"},
+                    {"op": "delete", "item_id": ids[2]},
+                    {"op": "delete", "item_id": ids[3]},
+                    {"op": "create", "photo_id": uploaded[0]["photos"][0]["id"], "name": "Second shirt"},
+                ],
+            },
+        )
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", _count)
+    assert response.status_code == 200, response.text
+    body = response.json()
+
+    assert [item["id"] for item in body["items"][:2]] == ids[:2]
+    assert body["items"][0]["name"] == "Linen shirt"
+    assert (body["items"][1]["category"], body["items"][1]["color"]) == ("outerwear", "navy")
+    created = body["items"][2]
+    assert created["name"] == "Second shirt"
+    assert created["processed_url"] == uploaded[0]["processed_url"]
+    assert [photo["processed_url"] for photo in created["photos"]] == [uploaded[0]["processed_url"]]
+    assert body["deleted_item_ids"] == ids[2:]
+    # Owner check, item and photo loads, create sources, one bulk update, two deletes,
+    # item and photo inserts, version bump and change log: the same for any batch size.
+    assert len(statements) == 11, "\n".join(statements)
+    # The owner row is locked before change ids are allocated, so they commit in order.
+    assert statements[-2].startswith("UPDATE users") and statements[-1].startswith("INSERT INTO closet_changes")
+
+    closet = {item["id"]: item for item in client.get(f"/api/closet/{user_id}").json()}
+    assert set(closet) == {ids[0], ids[1], created["id"]}
+    assert not set(ids[2:]) & set(closet)
+    assert closet[ids[0]]["name"] == "Linen shirt"
+    delta = client.get(f"/api/closet/{user_id}/changes?since={cursor}").json()
+    assert [item["id"] for item in delta["items"]] == [ids[0], ids[1], created["id"]]
+    assert delta["deleted_item_ids"] == ids[2:]
@@ -0,0 +1,61 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.assets import AssetStaticFiles
+
+
+def _static_client(tmp_path) -> TestClient:
+    app = FastAPI()
+    app.mount("/static", AssetStaticFiles(directory=tmp_path), name="static")
+    return TestClient(app)
+
+
+def test_static_blobs_are_immutable_and_revalidate_by_key_etag(tmp_path):
+    (tmp_path / "abc_proc.png").write_bytes(b"0123456789")
+    client = _static_client(tmp_path)
+
+    response = client.get("/static/abc_proc.png")
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    etag = response.headers["etag"]
+    assert etag.startswith('"') and not etag.startswith('W/')
+
+    # Rewriting the same content moves the mtime; the validator stays the same.
+    (tmp_path / "abc_proc.png").touch()
+    revalidated = client.get("/static/abc_proc.png", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+    assert revalidated.headers["cache-control"].endswith("immutable")
+
+    partial = client.get("/static/abc_proc.png", headers={"Range": "bytes=2-5"})
+    assert partial.status_code == 206
+    assert partial.content == b"2345"
+    assert partial.headers["content-range"] == "bytes 2-5/10"
+    assert client.get("/static/abc_proc.png", headers={"Range": "bytes=-3"}).content == b"789"
+    unsatisfiable = client.get("/static/abc_proc.png", headers={"Range": "bytes=20-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == "bytes */10"
+
+    assert client.get("/static/missing_proc.png").status_code == 404
+
+
+def test_precompressed_variant_is_served_to_clients_that_accept_it(tmp_path):
+    body = b"<svg>" + b"garment " * 200 + b"</svg>"
+    (tmp_path / "abc_orig.svg").write_bytes(body)
+    (tmp_path / "abc_orig.svg.gz").write_bytes(gzip.compress(body))
+    client = _static_client(tmp_path)
+
+    compressed = client.get("/static/abc_orig.svg", headers={"Accept-Encoding": "br;q=0, gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.content == body  # decoded by the client
+
+    identity = client.get("/static/abc_orig.svg", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["vary"] == "Accept-Encoding"
+    assert identity.headers["etag"] != compressed.headers["etag"]
+    assert identity.content == body
@@ -0,0 +1,27 @@
+from app.services.metrics import MetricsRegistry, server_timing_header
+
+
+def test_registry_renders_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("demo_requests_total", "Requests.", ("route",))
+    latency = registry.histogram("demo_seconds", "Latency.", ("stage",), buckets=(0.1, 1))
+    registry.callback("demo_queue_depth", "Queued jobs.", "gauge", lambda: [({}, 3)])
+
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    for seconds in (0.05, 0.5, 5):
+        latency.observe(seconds, stage="decode")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_requests_total counter" in lines
+    assert 'demo_requests_total{route="/a\\"b"} 3' in lines
+    assert 'demo_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="decode",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="decode",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="decode"} 3' in lines
+    assert "demo_queue_depth 3" in lines
+
+
+def test_server_timing_sums_repeated_stages():
+    header = server_timing_header([("store", 0.002), ("segment", 0.04), ("store", 0.001)], 0.05)
+    assert header == "store;dur=3.0, segment;dur=40.0, total;dur=50.0"
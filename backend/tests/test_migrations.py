@@ -0,0 +1,47 @@
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import Base
+from app.schema_version import ALEMBIC_INI, SCHEMA_REVISION, SchemaVersionError, check_schema_version, upgrade_database
+
+
+def test_schema_revision_matches_the_alembic_head():
+    assert ScriptDirectory.from_config(Config(str(ALEMBIC_INI))).get_current_head() == SCHEMA_REVISION
+
+
+def test_migrations_build_the_model_schema(tmp_path):
+    url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    engine = create_engine(url)
+    with pytest.raises(SchemaVersionError):
+        check_schema_version(engine)
+
+    upgrade_database(url)
+    check_schema_version(engine)
+    with engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+
+
+def test_migrations_upgrade_a_database_from_the_old_startup_path(tmp_path):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, full_name VARCHAR NOT NULL)"))
+        connection.execute(
+            text(
+                "CREATE TABLE clothing_items (id INTEGER PRIMARY KEY, owner_id INTEGER NOT NULL, "
+                "image_url VARCHAR NOT NULL, category VARCHAR(9) NOT NULL)"
+            )
+        )
+        connection.execute(text("INSERT INTO users (id, full_name) VALUES (1, 'Legacy')"))
+
+    upgrade_database(url)
+
+    check_schema_version(engine)
+    columns = {column["name"] for column in inspect(engine).get_columns("clothing_items")}
+    assert {"status", "content_hash", "deleted_at"} <= columns
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT closet_version FROM users WHERE id = 1")).scalar() == 0
@@ -0,0 +1,180 @@
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app.services import ml_service
+
+
+def _encode(image: Image.Image, image_format: str = "JPEG") -> bytes:
+    stream = io.BytesIO()
+    image.save(stream, format=image_format)
+    return stream.getvalue()
+
+
+def test_remove_background_segments_downscaled_copy_and_caps_output(monkeypatch):
+    seen_sizes = []
+
+    def _fake_remove(image, session=None, only_mask=False):
+        assert only_mask
+        seen_sizes.append(image.size)
+        return Image.new("L", image.size, color=128)
+
+    monkeypatch.setattr(ml_service, "remove", _fake_remove)
+    monkeypatch.setattr(ml_service.session_manager, "get", lambda: object())
+    monkeypatch.setattr(ml_service.settings, "SEGMENTATION_MAX_SIDE", 256)
+    monkeypatch.setattr(ml_service.settings, "OUTPUT_MAX_SIDE", 600)
+
+    processed = Image.open(io.BytesIO(ml_service.remove_background(_encode(Image.new("RGB", (1600, 1200), "navy")))))
+
+    assert max(seen_sizes[0]) <= 256
+    assert processed.mode == "RGBA"
+    assert max(processed.size) <= 600
+    # The low-resolution mask is upsampled and applied to the full output.
+    assert processed.getchannel("A").getextrema() == (128, 128)
+
+
+def test_remove_background_falls_back_to_opaque_cutout_when_model_unavailable(monkeypatch):
+    def _unavailable():
+        raise RuntimeError("model not downloaded")
+
+    monkeypatch.setattr(ml_service.session_manager, "get", _unavailable)
+
+    processed = Image.open(io.BytesIO(ml_service.remove_background(_encode(Image.new("RGB", (80, 60), "red")))))
+    assert processed.size == (80, 60)
+    assert processed.getchannel("A").getextrema() == (255, 255)
+
+
+def _cutout(shape_boxes: list[tuple[int, int, int, int]], color: str, size: tuple[int, int] = (200, 200)) -> bytes:
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    for box in shape_boxes:
+        image.paste(color, box)
+    return _encode(image, "PNG")
+
+
+def test_cutouts_are_classified_in_one_batch_with_dominant_color():
+    trousers = _cutout([(60, 10, 140, 50), (60, 10, 96, 190), (104, 10, 140, 190)], "navy")
+    sneaker = _cutout([(20, 80, 180, 130)], "white")
+
+    garments = [ml_service.describe_cutout(image_bytes) for image_bytes in (trousers, sneaker)]
+
+    assert ml_service.classify_garments([garment.features for garment in garments]) == ["bottom", "shoes"]
+    assert [garment.color for garment in garments] == ["navy", "white"]
+
+
+def test_cutout_without_silhouette_gets_default_category():
+    opaque = ml_service.describe_cutout(_encode(Image.new("RGB", (80, 60), "red"), "PNG"))
+    assert ml_service.classify_garments([opaque.features]) == ["top"]
+    assert opaque.color == "red"
+
+
+def test_missing_classifier_model_falls_back_to_the_silhouette_head(monkeypatch, tmp_path):
+    from app.services.classifier import GarmentClassifier
+
+    classifier = GarmentClassifier(str(tmp_path / "missing.onnx"), ["top", "bottom"])
+    monkeypatch.setattr(ml_service, "garment_classifier", classifier)
+    monkeypatch.setattr(ml_service.session_manager, "warm_up", lambda: False)
+
+    ml_service.warm_up()  # also the process-pool initializer: must not raise
+    assert classifier.backend == "silhouette"
+    assert "missing.onnx" in classifier.error
+
+    trousers = _cutout([(60, 10, 140, 50), (60, 10, 96, 190), (104, 10, 140, 190)], "navy")
+    garment = ml_service.describe_cutout(trousers)
+    assert ml_service.classify_garments([garment.features]) == ["bottom"]
+
+
+def test_cutouts_are_cropped_to_the_garment_and_encoded_in_the_configured_format(monkeypatch):
+    def _box_mask(image, _max_side):
+        mask = Image.new("L", image.size, 0)
+        mask.paste(255, (30, 40, 90, 150))
+        return mask
+
+    monkeypatch.setattr(ml_service, "_segmentation_mask", _box_mask)
+    monkeypatch.setattr(ml_service.settings, "CUTOUT_FORMAT", "webp")
+    photo = _encode(Image.new("RGB", (120, 200), "olive"))
+
+    garment = ml_service.segment_garment(photo)
+
+    cutout = Image.open(io.BytesIO(garment.image_bytes))
+    assert cutout.format == "WEBP" and ml_service.cutout_extension() == ".webp"
+    assert cutout.size == (60, 110)
+    assert garment.placement == ml_service.CutoutPlacement(30, 40, 120, 200)
+
+    monkeypatch.setattr(ml_service.settings, "CUTOUT_CROP", False)
+    uncropped = ml_service.segment_garment(photo)
+    assert Image.open(io.BytesIO(uncropped.image_bytes)).size == (120, 200)
+    assert uncropped.placement is None
+
+
+
+def test_process_workers_are_pinned_to_the_parents_classifier_choice(monkeypatch, tmp_path):
+    from app.services.classifier import GarmentClassifier
+    from app.services.inference_pool import InferenceExecutor
+
+    classifier = GarmentClassifier(str(tmp_path / "missing.onnx"), ["top", "bottom"])
+    monkeypatch.setattr(ml_service, "garment_classifier", classifier)
+    executor = InferenceExecutor(kind="process", max_workers=1, queue_size=0)
+    try:
+        pool = executor._get_pool()  # workers are only spawned on first submit
+        assert classifier.backend == "silhouette"
+        assert pool._initargs == (None,)
+    finally:
+        executor.shutdown()
+
+    # A worker pinned to a model it can't load fails rather than answering from the heuristic.
+    worker_classifier = GarmentClassifier(None, ["top", "bottom"])
+    worker_classifier.pin(str(tmp_path / "missing.onnx"))
+    assert not worker_classifier.warm_up()
+    with pytest.raises(FileNotFoundError):
+        worker_classifier.prepare(Image.new("RGBA", (40, 40), (0, 0, 0, 255)))
+    assert worker_classifier.describe()["backend"] == "onnx"
+    assert GarmentClassifier(None, ["top"]).describe()["heuristic"] is True
+
+# Starts and stops the app on the main thread as uvicorn does, with a segmentation
+# import on an inference thread in between, then lets the interpreter exit.
+_STARTUP_SHUTDOWN_PROBE = """
+import asyncio, importlib
+import httpx
+from app.main import app
+from app.services.inference_pool import inference_executor
+
+async def main():
+    async with app.router.lifespan_context(app):
+        await inference_executor.run(importlib.import_module, "rembg")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://probe") as client:
+            assert (await client.get("/health")).status_code == 200
+
+asyncio.run(main())
+print("shutdown complete")
+"""
+
+
+@pytest.mark.skipif(importlib.util.find_spec("rembg") is None, reason="rembg is not installed")
+def test_app_process_exits_after_startup_and_shutdown_with_the_ml_stack_loaded():
+    env = {
+        **os.environ,
+        "INFERENCE_EXECUTOR": "thread",
+        "PRELOAD_SEGMENTATION_MODEL": "false",  # no model download; the import is what matters
+        "BLOB_EVICTION_INTERVAL_SECONDS": "0",
+        "STALE_JOB_SECONDS": "0",
+    }
+    try:
+        result = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SHUTDOWN_PROBE],
+            cwd=Path(__file__).resolve().parents[1],
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=90,
+        )
+    except subprocess.TimeoutExpired:
+        pytest.fail("the app process did not exit after lifespan shutdown")
+    assert result.returncode == 0, result.stderr
+    assert "shutdown complete" in result.stdout
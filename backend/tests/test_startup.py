@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("resource")  # RSS probe is POSIX-only
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+
+from bench_startup import measure_import  # noqa: E402
+
+# The full ML stack costs ~190 MB on import; an API-only process stays well below this.
+IMPORT_RSS_BUDGET_MB = 200
+
+
+def test_importing_the_api_does_not_load_the_ml_stack():
+    startup = measure_import()
+
+    assert startup["heavy_modules"] == []
+    assert startup["max_rss_mb"] < IMPORT_RSS_BUDGET_MB
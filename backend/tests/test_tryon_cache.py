@@ -0,0 +1,56 @@
+import asyncio
+
+from app.services.tryon_cache import CachedTryOn, TryOnResultCache, tryon_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_concurrent_identical_tryons_share_one_generation():
+    cache = TryOnResultCache(max_entries=8, ttl_seconds=60)
+    generations = []
+
+    async def generate():
+        generations.append(1)
+        await asyncio.sleep(0.01)
+        return CachedTryOn(7, "https://cdn.example.com/7.png")
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.get_or_generate("key", generate) for _ in range(5)))
+        repeat = await cache.get_or_generate("key", generate)
+        return results, repeat
+
+    results, repeat = asyncio.run(scenario())
+    assert len(generations) == 1
+    assert [cached for _, cached in results].count(False) == 1
+    assert repeat == (CachedTryOn(7, "https://cdn.example.com/7.png"), True)
+    assert cache.stats()["hit_rate"] == round(5 / 6, 4)
+
+
+def test_entries_expire_after_ttl_and_evict_least_recently_used():
+    clock = FakeClock()
+    cache = TryOnResultCache(max_entries=2, ttl_seconds=10, clock=clock)
+    cache.put("a", CachedTryOn(1, "a.png"))
+    cache.put("b", CachedTryOn(2, "b.png"))
+    assert cache.get("a") is not None  # "a" is now the most recently used
+    cache.put("c", CachedTryOn(3, "c.png"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    clock.now = 11
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+
+
+def test_cache_key_depends_on_garment_order_content_and_model_version():
+    garments = [("top", 1, "hash-top"), ("bottom", 2, "hash-bottom")]
+    key = tryon_cache_key(5, "avatar.png", garments, "v1")
+    assert key == tryon_cache_key(5, "avatar.png", list(garments), "v1")
+    assert key != tryon_cache_key(5, "avatar.png", garments[::-1], "v1")
+    assert key != tryon_cache_key(5, "avatar.png", [("top", 1, "other"), garments[1]], "v1")
+    assert key != tryon_cache_key(5, "avatar.png", garments, "v2")
@@ -0,0 +1,90 @@
+import asyncio
+
+from app.services import tryon_pipeline
+from app.services.tryon_cache import tryon_layer_cache
+from app.services.tryon_pipeline import GarmentLayer
+from app.services.tryon_prefetch import TryOnPrefetcher, carousel_neighbours
+
+
+def _layers(top_id: int, bottom_id: int) -> list[GarmentLayer]:
+    return [
+        GarmentLayer("top", top_id, f"t{top_id}", f"https://cdn.example.com/top-{top_id}.png", "upper_body"),
+        GarmentLayer("bottom", bottom_id, f"b{bottom_id}", f"https://cdn.example.com/bottom-{bottom_id}.png", "lower_body"),
+    ]
+
+
+def test_carousel_neighbours_are_one_swipe_away_nearest_first():
+    selection = {"top": 2, "bottom": 20}
+    carousels = {"top": [1, 2, 3, 4], "bottom": [10, 20]}
+
+    assert carousel_neighbours(selection, carousels, radius=1) == [
+        {"top": 3, "bottom": 20},
+        {"top": 1, "bottom": 20},
+        {"top": 2, "bottom": 10},
+    ]
+    assert carousel_neighbours(selection, carousels, radius=2)[-1] == {"top": 4, "bottom": 20}
+
+
+def test_prefetcher_renders_queued_outfits_into_layer_cache_within_budget(monkeypatch):
+    calls = []
+
+    async def _fake_vton(user_avatar_url, garment_url, category):
+        calls.append(garment_url)
+        return f"{user_avatar_url}+{garment_url.rsplit('/', 1)[-1]}"
+
+    monkeypatch.setattr(tryon_pipeline, "generate_vton_image", _fake_vton)
+    prefetcher = TryOnPrefetcher(workers=1, max_queued_per_user=8, budget_per_hour=3, reserved_slots=0)
+    user_id = 9101
+
+    async def scenario():
+        prefetcher.start()
+        try:
+            # A newer carousel state replaces what was still queued.
+            stale = prefetcher.schedule(user_id, "avatar.png", "avatar-hash", [_layers(9, 9)])
+            outcome = prefetcher.schedule(user_id, "avatar.png", "avatar-hash", [_layers(1, 1), _layers(1, 2), _layers(1, 3), _layers(2, 1)])
+            while prefetcher.stats()["queued"] or prefetcher.stats()["running"]:
+                await asyncio.sleep(0.01)
+            repeat = prefetcher.schedule(user_id, "avatar.png", "avatar-hash", [_layers(1, 2)])
+            return stale, outcome, repeat
+        finally:
+            await prefetcher.aclose()
+
+    stale, outcome, repeat = asyncio.run(scenario())
+    assert stale.queued == 1
+    assert (outcome.queued, outcome.over_budget, outcome.cancelled) == (3, 1, 1)
+    # The shared "avatar + top 1" prefix is generated once for all three outfits.
+    assert calls.count("https://cdn.example.com/top-1.png") == 1
+    assert len(calls) == 4
+    assert prefetcher.stats()["generated"] == 3
+    assert repeat.cached == 1 and repeat.queued == 0
+
+    full_key = tryon_pipeline.tryon_cache_key(
+        user_id, "avatar-hash", tryon_pipeline.layer_identity(_layers(1, 2)), tryon_pipeline.settings.VTON_MODEL_VERSION
+    )
+    assert tryon_layer_cache.get(full_key) == "avatar.png+top-1.png+bottom-2.png"
+
+
+def test_cancel_drops_queued_prefetches():
+    prefetcher = TryOnPrefetcher(workers=0, max_queued_per_user=8, budget_per_hour=30, reserved_slots=1)
+    prefetcher.schedule(9102, "avatar.png", "avatar-hash", [_layers(1, 1), _layers(1, 2)])
+
+    assert prefetcher.cancel(9102) == 2
+    assert prefetcher.cancel(9102) == 0
+    assert prefetcher.stats()["queued"] == 0
+
+
+def test_prefetches_dropped_for_budget_are_counted():
+    import time
+
+    from app.services.metrics import tryon_prefetches_skipped
+
+    prefetcher = TryOnPrefetcher(workers=0, max_queued_per_user=8, budget_per_hour=2, reserved_slots=0)
+    skipped = tryon_prefetches_skipped.value(reason="over_budget")
+    outcome = prefetcher.schedule(9103, "avatar.png", "avatar-hash", [_layers(3, 1), _layers(3, 2), _layers(3, 3)])
+    assert outcome.over_budget == 1
+    assert tryon_prefetches_skipped.value(reason="over_budget") == skipped + 1
+
+    # The hour's budget is spent by other prefetches while these are still queued.
+    prefetcher._started_at[9103].extend([time.monotonic()] * 2)
+    assert prefetcher._next_task() is None
+    assert tryon_prefetches_skipped.value(reason="over_budget") == skipped + 2
@@ -0,0 +1,169 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.vton_service import Prediction, VtonClient, VtonUnavailableError
+
+
+class MockProvider:
+    """Local stand-in for the VTON provider that replays scripted status codes."""
+
+    def __init__(self, statuses: list[int] | None = None, delay: float = 0):
+        self.statuses = list(statuses or [])
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert request.headers["Authorization"] == "Bearer test-key"
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status != 200:
+            return httpx.Response(status)
+        return httpx.Response(200, json={"output": ["https://cdn.example.com/result.png"]})
+
+
+def _client(provider: MockProvider, **kwargs) -> VtonClient:
+    options = {"backoff_seconds": 0, "transport": httpx.MockTransport(provider)}
+    options.update(kwargs)
+    return VtonClient("https://vton.example.com/predictions", "test-key", "v1", **options)
+
+
+def test_retries_throttled_and_failed_calls_then_succeeds():
+    provider = MockProvider([429, 429])
+    client = _client(provider)
+
+    async def scenario():
+        try:
+            return await client.generate("avatar.png", "garment.png", "upper_body")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(scenario()) == "https://cdn.example.com/result.png"
+    assert provider.calls == 3
+    assert client.circuit.state == "closed"
+
+
+def test_prediction_is_not_resubmitted_once_the_provider_may_have_started_it():
+    provider = MockProvider([503])
+    refused = {"count": 0}
+    polls = []
+
+    def _flaky(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST" and refused["count"] < 2:
+            refused["count"] += 1
+            raise httpx.ConnectError("connection refused", request=request)
+        if request.method == "POST":
+            raise httpx.ReadTimeout("no response", request=request)
+        polls.append(request)
+        return httpx.Response(503)
+
+    client = _client(provider)
+    flaky = _client(MockProvider(), transport=httpx.MockTransport(_flaky))
+
+    async def scenario():
+        try:
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.generate("a.png", "g.png", "upper_body")
+            with pytest.raises(httpx.ReadTimeout):
+                await flaky.generate("a.png", "g.png", "upper_body")
+            with pytest.raises(httpx.HTTPStatusError):
+                await flaky.fetch(Prediction("p1", "processing", None, None, None))
+        finally:
+            await client.aclose()
+            await flaky.aclose()
+
+    asyncio.run(scenario())
+    # A 5xx or a lost response may hide a running prediction; refused connections never reached it.
+    assert provider.calls == 1
+    assert refused["count"] == 2
+    # Polling is idempotent and retries 5xx until the attempts run out.
+    assert len(polls) == flaky.max_retries + 1
+
+
+def test_concurrent_calls_share_one_pool_and_respect_the_limit():
+    provider = MockProvider(delay=0.02)
+    client = _client(provider, max_concurrency=2)
+
+    async def scenario():
+        try:
+            await asyncio.gather(*(client.generate("a.png", f"g{index}.png", "upper_body") for index in range(6)))
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+    assert provider.calls == 6
+    assert provider.max_in_flight == 2
+
+
+def test_circuit_opens_after_repeated_failures_and_fails_fast():
+    provider = MockProvider([500] * 2)
+    client = _client(provider, max_retries=1, circuit_failure_threshold=2, circuit_reset_seconds=60)
+
+    async def scenario():
+        try:
+            for _ in range(2):
+                with pytest.raises(httpx.HTTPStatusError):
+                    await client.generate("a.png", "g.png", "upper_body")
+            with pytest.raises(VtonUnavailableError):
+                await client.generate("a.png", "g.png", "upper_body")
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+    assert provider.calls == 2  # submissions are not retried on 5xx
+    assert client.circuit.state == "open"
+
+
+def test_circuit_half_opens_after_reset_and_closes_on_success():
+    provider = MockProvider([500])
+    client = _client(provider, max_retries=0, circuit_failure_threshold=1, circuit_reset_seconds=0)
+
+    async def scenario():
+        try:
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.generate("a.png", "g.png", "upper_body")
+            return await client.generate("a.png", "g.png", "upper_body")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(scenario()) == "https://cdn.example.com/result.png"
+    assert client.circuit.state == "closed"
+
+
+def test_generate_polls_a_pending_prediction_until_it_finishes():
+    states = iter(["processing", "succeeded"])
+
+    def provider(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            return httpx.Response(
+                201, json={"id": "p1", "status": "starting", "urls": {"get": "https://vton.example.com/predictions/p1"}}
+            )
+        assert request.url.path == "/predictions/p1"
+        status = next(states)
+        output = ["https://cdn.example.com/p1.png"] if status == "succeeded" else None
+        return httpx.Response(200, json={"id": "p1", "status": status, "output": output})
+
+    client = VtonClient(
+        "https://vton.example.com/predictions",
+        "test-key",
+        "v1",
+        poll_interval=0,
+        transport=httpx.MockTransport(provider),
+    )
+
+    async def scenario():
+        try:
+            return await client.generate("a.png", "g.png", "upper_body")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(scenario()) == "https://cdn.example.com/p1.png"
@@ -19,6 +19,20 @@ struct ClothingItemDTO: Codable {
     }
 }
 
+struct ClosetChangesDTO: Codable {
+    let cursor: Int
+    let hasMore: Bool
+    let items: [ClothingItemDTO]
+    let deletedItemIds: [Int]
+
+    enum CodingKeys: String, CodingKey {
+        case cursor
+        case hasMore = "has_more"
+        case items
+        case deletedItemIds = "deleted_item_ids"
+    }
+}
+
 struct UploadResponseDTO: Codable {
     let item: ClothingItemDTO
     let message: String
@@ -113,6 +127,28 @@ class APIClient {
         .resume()
     }
 
+    /// Items changed since `since` (0 for a full snapshot); pass the returned cursor to the next call.
+    func fetchClosetChanges(ownerId: Int, since: Int, completion: @escaping (Result<ClosetChangesDTO, Error>) -> Void) {
+        guard let url = URL(string: baseURL + "/api/closet/\(ownerId)/changes?since=\(since)") else { return }
+        URLSession.shared.dataTask(with: url) { data, _, error in
+            if let error {
+                completion(.failure(error))
+                return
+            }
+            guard let data else {
+                completion(.failure(NSError(domain: "Network", code: 0, userInfo: [NSLocalizedDescriptionKey: "No response data"])))
+                return
+            }
+            do {
+                let decoded = try JSONDecoder().decode(ClosetChangesDTO.self, from: data)
+                completion(.success(decoded))
+            } catch {
+                completion(.failure(error))
+            }
+        }
+        .resume()
+    }
+
     func generateTryOn(
         userId: Int,
         topId: Int?,
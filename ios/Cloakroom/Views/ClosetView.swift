@@ -7,6 +7,7 @@ struct ClosetView: View {
 
     @State private var syncStatus: String = ""
     @State private var isSyncing = false
+    @AppStorage("closetSyncCursor") private var syncCursor: Int = 0
 
     var body: some View {
         NavigationView {
@@ -70,23 +71,45 @@ struct ClosetView: View {
     private func syncCloset() {
         isSyncing = true
         syncStatus = ""
+        syncChanges(since: syncCursor)
+    }
 
-        APIClient.shared.fetchCloset(ownerId: 1) { result in
+    /// Applies server changes page by page; only items changed since the last sync are transferred.
+    private func syncChanges(since: Int) {
+        APIClient.shared.fetchClosetChanges(ownerId: 1, since: since) { result in
             DispatchQueue.main.async {
-                isSyncing = false
                 switch result {
-                case .success(let remoteItems):
-                    for item in remoteItems {
+                case .success(let changes):
+                    for item in changes.items {
                         upsertLocalItem(item)
                     }
+                    for serverId in changes.deletedItemIds {
+                        deleteLocalItem(serverId: serverId)
+                    }
+                    syncCursor = changes.cursor
+                    if changes.hasMore {
+                        syncChanges(since: changes.cursor)
+                        return
+                    }
+                    isSyncing = false
                     syncStatus = "Closet synced."
                 case .failure(let error):
+                    isSyncing = false
                     syncStatus = "Sync failed: \(error.localizedDescription)"
                 }
             }
         }
     }
 
+    private func deleteLocalItem(serverId: Int) {
+        let descriptor = FetchDescriptor<ClothingItem>(
+            predicate: #Predicate { $0.serverId == serverId }
+        )
+        if let existing = try? modelContext.fetch(descriptor).first {
+            modelContext.delete(existing)
+        }
+    }
+
     private func upsertLocalItem(_ item: ClothingItemDTO) {
         let descriptor = FetchDescriptor<ClothingItem>(
             predicate: #Predicate { $0.serverId == item.id }
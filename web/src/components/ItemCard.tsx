@@ -11,7 +11,10 @@ interface ItemCardProps {
 }
 
 export function ItemCard({ item, disabled = false, onRename, onAddPhotos }: ItemCardProps): React.JSX.Element {
-  const processedImageSrc = useMemo(() => toAssetUrl(item.processed_url), [item.processed_url]);
+  const processedImageSrc = useMemo(
+    () => toAssetUrl(item.thumbnail_url ?? item.processed_url),
+    [item.thumbnail_url, item.processed_url],
+  );
   const originalImageSrc = useMemo(() => toAssetUrl(item.original_url), [item.original_url]);
   const [imageSrc, setImageSrc] = useState(processedImageSrc);
   const [nameDraft, setNameDraft] = useState(item.name ?? "");
@@ -118,7 +121,7 @@ export function ItemCard({ item, disabled = false, onRename, onAddPhotos }: Item
             {item.photos.slice(0, 6).map((photo) => (
               <Image
                 key={photo.id}
-                src={toAssetUrl(photo.processed_url)}
+                src={toAssetUrl(photo.thumbnail_url ?? photo.processed_url)}
                 alt={photo.angle_label ? `${photo.angle_label} angle` : `Angle ${photo.id}`}
                 className="angle-image"
                 width={100}
@@ -12,6 +12,8 @@ export interface ClothingItemPhoto {
   item_id: number;
   original_url: string | null;
   processed_url: string;
+  thumbnail_url: string | null;
+  srcset: string | null;
   angle_label: string | null;
   created_at: string;
 }
@@ -22,9 +24,13 @@ export interface ClothingItem {
   name: string | null;
   original_url: string | null;
   processed_url: string;
+  thumbnail_url: string | null;
+  srcset: string | null;
   category: Category;
   color: string | null;
+  status: "processing" | "ready" | "failed";
   created_at: string;
+  updated_at?: string | null;
   photos: ClothingItemPhoto[];
 }
 
@@ -44,6 +50,7 @@ export interface TryOnRequest {
 export interface TryOnResponse {
   outfit_id: number;
   generated_image_url: string;
+  status?: "pending" | "ready" | "failed";
   message: string;
 }
 